@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Benchmarks the SpatialDataLibrary keywords against synthetic data.
+
+Polygon, line and point tables of each requested size are generated inside
+the database (so even 10M rows load quickly) with a controlled proportion of
+slivers and of features lying well away from the rest. Every keyword is then
+timed against them and the results written as JSON, which can be compared
+with an earlier run to spot regressions.
+
+A disposable PostGIS is enough, for example:
+
+    docker run -d -p 5432:5432 -e POSTGRES_PASSWORD=bench postgis/postgis
+    python benchmarks/spatial_benchmark.py \\
+        --connect-string "database='postgres', user='postgres', \\
+                          password='bench', host='localhost'" \\
+        --sizes 10000,100000 --output bench.json
+    python benchmarks/spatial_benchmark.py ... --compare bench.json
+
+No server is needed to benchmark SpatiaLite (mod_spatialite must be
+installed), the file being created again unless --skip-generate is given:
+
+    python benchmarks/spatial_benchmark.py --spatial-file bench.sqlite \\
+        --sizes 10000 --output bench-spatialite.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from SpatialDataLibrary import SpatialDataLibrary, __version__
+
+SRID = 27700
+CELL = 100
+# Far enough from the grid that these never touch the probe geometries
+DISJOINT_OFFSET = 10000000
+
+SHAPES = {
+    'polygons': ('POLYGON', '''
+        CASE WHEN r < {sliver_ratio}
+            THEN ST_MakeEnvelope(x, y, x + 90, y + 0.5, {srid})
+            ELSE ST_MakeEnvelope(x, y, x + 50, y + 50, {srid})
+        END'''),
+    'lines': ('LINESTRING', '''
+        ST_SetSRID(ST_MakeLine(ST_MakePoint(x, y),
+                               ST_MakePoint(x + 50, y + 50)), {srid})'''),
+    'points': ('POINT', '''
+        ST_SetSRID(ST_MakePoint(x + 25, y + 25), {srid})'''),
+}
+
+# The same shapes built with SpatiaLite functions
+SPATIALITE_SHAPES = {
+    'polygons': ('POLYGON', '''
+        CASE WHEN r < {sliver_ratio}
+            THEN BuildMbr(x, y, x + 90, y + 0.5, {srid})
+            ELSE BuildMbr(x, y, x + 50, y + 50, {srid})
+        END'''),
+    'lines': ('LINESTRING', '''
+        MakeLine(MakePoint(x, y, {srid}),
+                 MakePoint(x + 50, y + 50, {srid}))'''),
+    'points': ('POINT', '''
+        MakePoint(x + 25, y + 25, {srid})'''),
+}
+
+
+def table_name(shape, rows):
+    return 'bench_{}_{}'.format(shape, rows)
+
+
+def generate(library, schema, rows, sliver_ratio, disjoint_ratio, seed):
+    """
+    Creates one table per shape with `rows` features.
+    """
+    side = int(rows ** 0.5) + 1
+    for shape, (geometry_type, expression) in sorted(SHAPES.items()):
+        table = table_name(shape, rows)
+        expression = expression.format(sliver_ratio=sliver_ratio, srid=SRID)
+        library.execute_sql_string('DROP TABLE IF EXISTS "{}"."{}"'.format(
+                                   schema, table))
+        library.execute_sql_string(
+            'CREATE TABLE "{}"."{}" (id integer PRIMARY KEY, '
+            'category integer)'.format(schema, table))
+        library.execute_sql_string(
+            "SELECT AddGeometryColumn('{}', '{}', 'wkb_geometry', {}, '{}', "
+            "2)".format(schema, table, SRID, geometry_type))
+        library.execute_sql_string('''
+            SELECT setseed({seed});
+            INSERT INTO "{schema}"."{table}" (id, category, wkb_geometry)
+            SELECT n, n % 10, {expression}
+            FROM (
+                SELECT
+                    n,
+                    r,
+                    (n % {side}) * {cell}
+                        + CASE WHEN d < {disjoint_ratio}
+                          THEN {offset} ELSE 0 END AS x,
+                    (n / {side}) * {cell} AS y
+                FROM (
+                    SELECT n, random() AS r, random() AS d
+                    FROM generate_series(1, {rows}) AS n
+                ) AS series
+            ) AS cells'''.format(seed=seed, schema=schema, table=table,
+                                 expression=expression, side=side, cell=CELL,
+                                 disjoint_ratio=disjoint_ratio,
+                                 offset=DISJOINT_OFFSET, rows=rows))
+        library.execute_sql_string(
+            'CREATE INDEX "{1}_geom_idx" ON "{0}"."{1}" USING GIST '
+            '(wkb_geometry); ANALYZE "{0}"."{1}"'.format(schema, table))
+
+
+def _hashed_random(multiplier, seed):
+    """
+    Returns SQLite for a number from 0 to 1 derived from the row number n.
+
+    SQLite's random() can't be seeded, so the data would differ between
+    runs.
+    """
+    return '(((n * {}) + {}) % 4294967296) / 4294967296.0'.format(
+           multiplier, int(seed * 4294967296))
+
+
+def generate_spatialite(library, rows, sliver_ratio, disjoint_ratio, seed):
+    """
+    Creates one table per shape with `rows` features in a SpatiaLite
+    database, as generate() does for PostGIS.
+    """
+    side = int(rows ** 0.5) + 1
+    for shape, (geometry_type, expression) in sorted(
+            SPATIALITE_SHAPES.items()):
+        table = table_name(shape, rows)
+        expression = expression.format(sliver_ratio=sliver_ratio, srid=SRID)
+        library.execute_sql_string(
+            'CREATE TABLE "{}" (id integer PRIMARY KEY, '
+            'category integer)'.format(table))
+        library.execute_sql_string(
+            "SELECT AddGeometryColumn('{}', 'wkb_geometry', {}, '{}', "
+            "'XY')".format(table, SRID, geometry_type))
+        library.execute_sql_string('''
+            WITH RECURSIVE series(n) AS (
+                SELECT 1
+                UNION ALL
+                SELECT n + 1 FROM series WHERE n < {rows}
+            )
+            INSERT INTO "{table}" (id, category, wkb_geometry)
+            SELECT n, n % 10, {expression}
+            FROM (
+                SELECT
+                    n,
+                    r,
+                    (n % {side}) * {cell}
+                        + CASE WHEN d < {disjoint_ratio}
+                          THEN {offset} ELSE 0 END AS x,
+                    (n / {side}) * {cell} AS y
+                FROM (
+                    SELECT n, {r} AS r, {d} AS d
+                    FROM series
+                ) AS series
+            ) AS cells'''.format(table=table, expression=expression,
+                                 side=side, cell=CELL,
+                                 disjoint_ratio=disjoint_ratio,
+                                 offset=DISJOINT_OFFSET, rows=rows,
+                                 r=_hashed_random(2654435761, seed),
+                                 d=_hashed_random(2246822519, seed)))
+        library.execute_sql_string(
+            "SELECT CreateSpatialIndex('{}', 'wkb_geometry')".format(table))
+        # For the estimated extents
+        library.execute_sql_string(
+            "SELECT UpdateLayerStatistics('{}', 'wkb_geometry')".format(
+                table))
+
+
+def cases(dialect, schema, rows, probes):
+    """
+    Yields (label, table, callable) for every keyword benchmarked.
+
+    Tables in queries are written as `dialect` expects, e.g. without the
+    schema for SpatiaLite.
+    """
+    polygons = table_name('polygons', rows)
+    lines = table_name('lines', rows)
+    points = table_name('points', rows)
+    side = (int(rows ** 0.5) + 1) * CELL
+    extent = '0,0,{0},{0}'.format(side)
+    area = 'POLYGON((0 0, {0} 0, {0} {0}, 0 {0}, 0 0))'.format(side)
+    probe = 'POINT(25 25)'
+    outside = 'POINT(-1000 -1000)'
+    query = 'SELECT * FROM {} WHERE category = 1'.format(
+            dialect.table(schema, polygons))
+    single = 'SELECT wkb_geometry FROM {} WHERE id = 1'.format(
+             dialect.table(schema, polygons))
+
+    def keyword(name, table, *args, **kwargs):
+        options = ', '.join('{}={}'.format(k, v)
+                            for k, v in sorted(kwargs.items())
+                            if k != 'schema')
+        label = '{}({})'.format(name, options) if options else name
+        return (label, table,
+                lambda library: getattr(library, name)(*args, **kwargs))
+
+    def staged(library):
+        # Staging and dropping included, to compare with the query keywords
+        handle = library.stage_query(query)
+        checks = (lambda: library.table_contains_no_slivers(handle),
+                  lambda: library.table_extent_should_equal(handle, extent),
+                  lambda: library.should_intersect_whole_table(area, handle))
+        failures = []
+        try:
+            for check in checks:
+                try:
+                    check()
+                except AssertionError as e:
+                    # Each check is timed whether or not an earlier failed
+                    failures.append(str(e).split('\n')[0])
+        finally:
+            library.drop_staged_queries(handle)
+        if failures:
+            raise AssertionError('; '.join(failures))
+
+    def sampled(name, table, *args, **kwargs):
+        def function(library):
+            library.set_sampling(10, seed=1)
+            try:
+                getattr(library, name)(*args, **kwargs)
+            finally:
+                library.set_sampling()
+        return ('{}(sampled)'.format(name), table, function)
+
+    yield keyword('get_geometry_column', polygons, polygons, schema=schema)
+    yield keyword('get_table_SRID', polygons, polygons, schema=schema)
+    yield keyword('get_query_SRID', polygons, query, 'wkb_geometry')
+    yield keyword('prefetch_spatial_metadata', None, schema)
+    for table in (polygons, lines, points):
+        yield keyword('table_extent_should_equal', table, table, extent,
+                      schema=schema)
+        yield keyword('get_table_spatial_profile', table, table,
+                      schema=schema)
+        yield keyword('should_intersect_table', table, probe, table,
+                      schema=schema)
+        yield keyword('should_not_intersect_table', table, outside, table,
+                      schema=schema)
+        yield keyword('should_intersect_whole_table', table, area, table,
+                      schema=schema)
+        yield keyword('should_all_intersect_table', table, probes, table,
+                      schema=schema)
+        yield keyword('should_none_intersect_table', table, [outside], table,
+                      schema=schema)
+    yield keyword('cache_table_geometries', polygons, polygons, schema=schema)
+    yield ('should_all_intersect_table(cached)', polygons,
+           lambda library: library.should_all_intersect_table(
+               probes, polygons, schema=schema))
+    yield keyword('clear_table_geometry_cache', polygons, polygons,
+                  schema=schema)
+    yield keyword('table_contains_no_slivers', polygons, polygons,
+                  schema=schema)
+    yield keyword('table_should_have_no_overlaps', polygons, polygons,
+                  schema=schema, key_column='id')
+    yield keyword('table_geometries_should_be_valid', polygons, polygons,
+                  schema=schema)
+    yield keyword('extents_should_equal', None,
+                  dict((table, extent) for table in (polygons, lines, points)),
+                  schema=schema)
+    yield keyword('extents_should_equal', None,
+                  dict((table, extent) for table in (polygons, lines, points)),
+                  schema=schema, estimated=True, tolerance=CELL)
+    yield keyword('table_extents_should_equal_by_group', polygons, polygons,
+                  'category', dict((str(n), extent) for n in range(10)),
+                  schema=schema)
+    yield keyword('every_feature_should_intersect', points, points, polygons,
+                  schema=schema, key_column='id')
+    yield keyword('every_feature_should_be_within', points, points, polygons,
+                  schema=schema, key_column='id')
+    yield keyword('no_feature_should_intersect', lines, lines, polygons,
+                  schema=schema, key_column='id')
+    yield keyword('table_geometries_should_match_reference', polygons,
+                  polygons, polygons, 'id', schema=schema)
+    yield keyword('get_table_compactness_histogram', polygons, polygons,
+                  schema=schema)
+    yield keyword('query_contains_no_slivers', polygons, query)
+    yield keyword('data_extent_should_equal', polygons, query, extent)
+    yield keyword('get_query_spatial_profile', polygons, query)
+    yield keyword('should_intersect_query', polygons, probe, query)
+    yield keyword('should_not_intersect_query', polygons, outside, query)
+    yield keyword('should_intersect_whole_query', polygons, area, query)
+    yield keyword('should_all_intersect_query', polygons, probes, query)
+    yield keyword('should_none_intersect_query', polygons, [outside], query)
+    yield keyword('table_contains_no_slivers', polygons, polygons,
+                  schema=schema, chunks=16)
+    yield keyword('should_intersect_whole_table', points, area, points,
+                  schema=schema, chunks=16)
+    yield keyword('table_should_have_no_overlaps', polygons, polygons,
+                  schema=schema, key_column='id', chunks=16)
+    yield keyword('table_geometries_should_be_valid', polygons, polygons,
+                  schema=schema, chunks=16)
+    # The generated slivers are more compact than this factor, so the check
+    # passes and after the first repeat only the chunk hashing is timed
+    yield keyword('table_contains_no_slivers', polygons, polygons,
+                  schema=schema, factor=0.01, incremental=True,
+                  chunk_key='id')
+    yield ('stage_query', polygons,
+           lambda library: library.drop_staged_queries(
+               library.stage_query(query)))
+    yield ('stage_query+checks', polygons, staged)
+    if dialect.tablesample('SYSTEM', 10, 1) is not None:
+        yield sampled('table_contains_no_slivers', polygons, polygons,
+                      schema=schema)
+        yield sampled('should_intersect_whole_table', polygons, area,
+                      polygons, schema=schema)
+        yield sampled('should_not_intersect_table', polygons, outside,
+                      polygons, schema=schema)
+    yield keyword('get_geometry', polygons, single)
+    yield keyword('get_geometry', polygons, single, binary=False)
+    yield keyword('should_intersect', None, probe, area)
+    yield keyword('should_not_intersect', None, outside, area)
+    yield keyword('schema_should_pass_spatial_checks', None, schema,
+                  geometry=area)
+
+
+def time_case(library, function, repeat):
+    """
+    Runs `function` `repeat` times, returning timings and the outcome.
+    """
+    timings = []
+    outcome = 'PASS'
+    for _ in range(repeat):
+        library.reset_SQL_statistics()
+        start = time.time()
+        try:
+            function(library)
+        except AssertionError as e:
+            # Expected for data with slivers or disjoint features, the time
+            # taken is what matters
+            outcome = 'FAIL: {}'.format(str(e).split('\n')[0])
+        except Exception as e:
+            outcome = 'ERROR: {}'.format(e)
+            library._dbconnection.rollback()
+        timings.append(time.time() - start)
+    statistics = library.get_SQL_statistics()
+    return {
+        'min': min(timings),
+        'median': sorted(timings)[len(timings) // 2],
+        'max': max(timings),
+        'outcome': outcome,
+        'statements': sum(s['count'] for s in statistics),
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Prints cases whose median is `threshold` times slower than baseline.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = dict((r['id'], r) for r in baseline['results'])
+    regressions = 0
+    for result in results['results']:
+        old = previous.get(result['id'])
+        if not old or not old['median']:
+            continue
+        ratio = result['median'] / old['median']
+        flag = ''
+        if ratio >= threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print('{:>7.2f}x {}{}'.format(ratio, result['id'], flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--connect-string',
+                        help='psycopg2 arguments as used by Connect To '
+                             'Database Using Custom Params')
+    target.add_argument('--spatial-file',
+                        help='SpatiaLite database to benchmark instead, as '
+                             'used by Connect To Spatial File')
+    parser.add_argument('--schema', default='public')
+    parser.add_argument('--sizes', default='10000',
+                        help='comma separated row counts per table')
+    parser.add_argument('--sliver-ratio', type=float, default=0.01)
+    parser.add_argument('--disjoint-ratio', type=float, default=0.01)
+    parser.add_argument('--probes', type=int, default=1000,
+                        help='geometries used by the batch keywords')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=float, default=0.42)
+    parser.add_argument('--skip-generate', action='store_true',
+                        help='reuse tables from an earlier run')
+    parser.add_argument('--output', help='write JSON results here')
+    parser.add_argument('--compare', help='JSON results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='slow down counted as a regression')
+    args = parser.parse_args(argv)
+
+    # For the incremental checks, fresh so their first repeat checks
+    # every row
+    state_directory = tempfile.mkdtemp()
+    library = SpatialDataLibrary(instrument=True, state_file=os.path.join(
+                                 state_directory, 'state.sqlite'))
+    if args.spatial_file:
+        new_file = not args.skip_generate
+        if new_file and os.path.exists(args.spatial_file):
+            os.remove(args.spatial_file)
+        library.connect_to_spatial_file(args.spatial_file)
+        if new_file:
+            library.execute_sql_string('SELECT InitSpatialMetadata(1)')
+    else:
+        library.connect_to_database_using_custom_params('psycopg2',
+                                                        args.connect_string)
+    results = {
+        'version': __version__,
+        'backend': library._dialect.name,
+        'python': platform.python_version(),
+        'started': datetime.utcnow().isoformat(),
+        'arguments': vars(args),
+        'results': [],
+    }
+    try:
+        for rows in [int(size) for size in args.sizes.split(',')]:
+            if not args.skip_generate:
+                start = time.time()
+                if args.spatial_file:
+                    generate_spatialite(library, rows, args.sliver_ratio,
+                                        args.disjoint_ratio, args.seed)
+                else:
+                    generate(library, args.schema, rows, args.sliver_ratio,
+                             args.disjoint_ratio, args.seed)
+                print('Generated {} rows per table in {:.1f}s'.format(
+                      rows, time.time() - start))
+            library.clear_spatial_metadata_cache()
+            probes = ['POINT({} {})'.format(i * CELL + 25, 25)
+                      for i in range(args.probes)]
+            for label, table, function in cases(library._dialect,
+                                                args.schema, rows, probes):
+                timing = time_case(library, function, args.repeat)
+                timing.update({
+                    'id': '{}[{}]{}'.format(label, rows,
+                                            ':' + table if table else ''),
+                    'keyword': label,
+                    'table': table,
+                    'rows': rows,
+                })
+                results['results'].append(timing)
+                print('{:>9.3f}s {:>5} stmts {} {}'.format(
+                      timing['median'], timing['statements'], timing['id'],
+                      '' if timing['outcome'] == 'PASS'
+                      else timing['outcome'][:60]))
+    finally:
+        library.disconnect_from_database()
+        shutil.rmtree(state_directory, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,12 +10,29 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import hashlib
+import random
 import re
+import threading
+from math import ceil, erf, sqrt
+
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
 
 from DatabaseLibrary import DatabaseLibrary
 
 from robot.api import logger
 from robot.libraries.BuiltIn import BuiltIn
+from robot.utils import timestr_to_secs
+
+from .cache import CachedTable, GeometryCache
+from .dialects import GeoPackageDialect, PostGISDialect, SpatiaLiteDialect
+from .geometry import Geometry, UnsupportedGeometry, wkt_intersects
+from .instrumentation import KeywordListener, StatementLog
+from .prepared import PreparedStatements
+from .state import ValidationState
 
 builtin = BuiltIn()
 
@@ -23,16 +40,789 @@ __version__ = '0.1'
 
 SCHEMA = 'public'
 GEOMETRY_COLUMN = 'wkb_geometry'
+SAMPLE_SIZE = 10
+# Key values per chunk hashed by incremental checks
+HASH_CHUNK_SIZE = 10000
+# Bytes of geometries held by Cache Table Geometries
+GEOMETRY_CACHE_SIZE = 256 * 1024 * 1024
+# Statements kept prepared per connection
+STATEMENT_CACHE_SIZE = 100
+
+EXTENT_LABELS = ('MinX', 'MinY', 'MaxX', 'MaxY')
+
+
+def _is_true(value):
+    """
+    Interprets Robot Framework arguments such as 'False' or 'no' as booleans.
+    """
+    if isinstance(value, basestring):
+        return value.strip().upper() not in ('', 'FALSE', 'NO', 'OFF', '0',
+                                             'NONE')
+    return bool(value)
+
+
+def _sliver_factor(value):
+    """
+    Returns a compactness `factor` argument as a float, checking that it is
+    between 0 and 1.
+    """
+    factor = float(value)
+    if not 0 < factor < 1:
+        raise ValueError('factor must be between 0 and 1, not {}'.format(
+                         value))
+    return factor
+
+
+def _normal_quantile(p):
+    """
+    Returns z such that a standard normal variable is below z with
+    probability `p`.
+    """
+    low, high = -10.0, 10.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        if 0.5 * (1 + erf(middle / sqrt(2))) < p:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def _upper_confidence_bound(failures, total, confidence):
+    """
+    Returns the one-sided Wilson score upper bound of a failure rate.
+    """
+    z = _normal_quantile(confidence)
+    rate = float(failures) / total
+    denominator = 1 + z * z / total
+    centre = rate + z * z / (2 * total)
+    spread = z * sqrt(rate * (1 - rate) / total + z * z / (4 * total * total))
+    return min(1.0, (centre + spread) / denominator)
+
+
+class SpatialProfile(object):
+    """
+    Summary of a table or query built by a single aggregate scan.
+
+    Returned by `Get Table Spatial Profile` and `Get Query Spatial Profile`,
+    attributes can be used directly in tests, e.g. ${profile.row_count}:
+        row_count       - number of rows
+        null_count      - number of rows with a NULL geometry
+        extent          - (MinX, MinY, MaxX, MaxY) or None if no geometries
+        srids           - sorted list of distinct SRIDs
+        geometry_types  - dict of geometry type to number of rows
+        sliver_count    - number of polygons less compact than `factor`
+        factor          - compactness factor used to count slivers
+    """
+    def __init__(self, source, factor):
+        self.source = source
+        self.factor = factor
+        self.row_count = 0
+        self.null_count = 0
+        self.extent = None
+        self.srids = []
+        self.geometry_types = {}
+        self.sliver_count = 0
+
+    def add_group(self, geometry_type, srid, rows, xmin, ymin, xmax, ymax,
+                  slivers):
+        """
+        Merges one (geometry type, SRID) group of the profile query.
+        """
+        self.row_count += rows
+        if geometry_type is None:
+            self.null_count += rows
+            return
+        self.geometry_types[geometry_type] = (
+            self.geometry_types.get(geometry_type, 0) + rows)
+        if srid not in self.srids:
+            self.srids.append(srid)
+            self.srids.sort()
+        self.sliver_count += slivers
+        if xmin is None:
+            return
+        if self.extent is None:
+            self.extent = (xmin, ymin, xmax, ymax)
+        else:
+            self.extent = (min(self.extent[0], xmin),
+                           min(self.extent[1], ymin),
+                           max(self.extent[2], xmax),
+                           max(self.extent[3], ymax))
+
+    def __repr__(self):
+        return ('SpatialProfile(rows={}, nulls={}, extent={}, srids={}, '
+                'types={}, slivers={})'.format(self.row_count,
+                                               self.null_count, self.extent,
+                                               self.srids,
+                                               self.geometry_types,
+                                               self.sliver_count))
+
+
+class CompactnessHistogram(object):
+    """
+    Distribution of the compactness of the polygons of a table or query.
+
+    Compactness is the Polsby-Popper score, the area of a polygon divided by
+    that of a circle with the same perimeter, so 1 for a circle and near 0
+    for a sliver. Returned by `Get Table Compactness Histogram` and `Get
+    Query Compactness Histogram`, attributes can be used directly in tests:
+        source          - the table (schema, table) or query
+        buckets         - number of equal width buckets from 0 to 1
+        counts          - list of the number of polygons in each bucket
+        polygon_count   - number of polygons
+    """
+    def __init__(self, source, buckets):
+        self.source = source
+        self.buckets = buckets
+        self.counts = [0] * buckets
+        self.polygon_count = 0
+
+    def add_bucket(self, bucket, count):
+        # A perfect circle falls just past the last bucket
+        bucket = max(0, min(int(bucket), self.buckets - 1))
+        self.counts[bucket] += count
+        self.polygon_count += count
+
+    def count_below(self, factor):
+        """
+        Returns the number of polygons less compact than `factor`, exact
+        when `factor` is a multiple of the bucket width.
+        """
+        return sum(self.counts[:int(round(float(factor) * self.buckets))])
+
+    def percentile(self, percent):
+        """
+        Returns the compactness below which `percent` of polygons fall,
+        interpolated within its bucket, or None if there are none.
+        """
+        if not self.polygon_count:
+            return None
+        target = self.polygon_count * float(percent) / 100
+        cumulative = 0
+        for bucket, count in enumerate(self.counts):
+            if count and cumulative + count >= target:
+                return (bucket + (target - cumulative) / count) / self.buckets
+            cumulative += count
+        return 1.0
+
+    def __repr__(self):
+        return ('CompactnessHistogram(polygons={}, percentiles={})'.format(
+                self.polygon_count,
+                ', '.join('{}%: {}'.format(p, None if self.percentile(p)
+                                           is None else
+                                           round(self.percentile(p), 4))
+                          for p in (1, 5, 25, 50, 75, 95, 99))))
+
+
+class StagedQuery(str):
+    """
+    Handle for a query copied into a temporary table by `Stage Query`.
+
+    It is a SELECT of the whole table, so can be passed as the `statement`
+    of *Query keywords, and is also accepted as the `table` of *Table
+    keywords.
+    """
+    def __new__(cls, schema, table, geometry_column, statement):
+        staged = str.__new__(cls, statement)
+        staged.schema = schema
+        staged.table = table
+        staged.geometry_column = geometry_column
+        return staged
+
 
 class SpatialDataLibrary(DatabaseLibrary):
     """
     Unless overridden, the following are default values:
         SCHEMA = 'public'
         GEOMETRY_COLUMN = 'wkb_geometry'
+        SAMPLE_SIZE = 10
+
+    When a check fails because of rows it shouldn't have found, the number
+    of failing rows is reported and at most `sample_size` of them are
+    logged. This can be set when importing the library, for example:
+        | Library | SpatialDataLibrary | sample_size=50 |
+    and overridden by the `sample_size` argument of individual keywords.
+
+    With `local_predicates` enabled `Should Intersect` and `Should Not
+    Intersect` are evaluated in-process rather than by the database, see
+    `Set Local Predicates`:
+        | Library | SpatialDataLibrary | local_predicates=True |
+
+    With `instrument` enabled the time taken and rows returned by every
+    statement the library issues are recorded, see `Set SQL
+    Instrumentation`. If `statistics_file` is given (ending .json or .csv)
+    the records are written there at the end of the run:
+        | Library | SpatialDataLibrary | instrument=True | explain_threshold=10s | statistics_file=${OUTPUT_DIR}/sql.json |
+
+    As well as PostGIS, SpatiaLite databases and GeoPackages can be checked
+    directly, see `Connect To Spatial File`.
+
+    With a `state_file` the table checks can be run incrementally, only
+    checking rows changed since they last passed. The file is a SQLite
+    database created if it doesn't exist, see `Table Contains No Slivers`:
+        | Library | SpatialDataLibrary | state_file=${CURDIR}/validation.db |
+
+    Tables held in memory by `Cache Table Geometries` take up to
+    `geometry_cache_size` bytes in all, 256MB by default:
+        | Library | SpatialDataLibrary | geometry_cache_size=1073741824 |
+
+    Metadata lookups and the probes of the intersection keywords are run
+    with the geometry, SRID and names bound as parameters. With PostGIS they
+    are prepared once per connection and the `statement_cache_size` most
+    recently used are kept, see `Get Prepared Statement Statistics`. Set it
+    to 0 where prepared statements can't be used, e.g. behind a connection
+    pooler:
+        | Library | SpatialDataLibrary | statement_cache_size=0 |
     """
-    def __init__(self):
+    def __init__(self, sample_size=SAMPLE_SIZE, local_predicates=False,
+                 instrument=False, explain_threshold=None,
+                 statistics_file=None, state_file=None,
+                 geometry_cache_size=GEOMETRY_CACHE_SIZE,
+                 statement_cache_size=STATEMENT_CACHE_SIZE):
         self._schema = None
         self._geometry_column = None
+        self._sample_size = int(sample_size)
+        self._local_predicates = _is_true(local_predicates)
+        self._geometry_column_cache = {}
+        self._srid_cache = {}
+        self._column_cache = {}
+        self._prefetched_schemas = set()
+        self._connection_args = None
+        self._workers = []
+        self._staged = []
+        self._dialect = PostGISDialect()
+        self._spatial_index_cache = {}
+        self._sampling = None
+        self._statement_log = StatementLog()
+        self._state = ValidationState(state_file) if state_file else None
+        self._geometry_cache = GeometryCache(geometry_cache_size)
+        self._statements = PreparedStatements(statement_cache_size)
+        self.set_sql_instrumentation(instrument, explain_threshold)
+        self.ROBOT_LIBRARY_LISTENER = KeywordListener(self._statement_log,
+                                                      statistics_file)
+
+
+    def _clear_metadata_cache(self):
+        self._geometry_column_cache.clear()
+        self._srid_cache.clear()
+        self._column_cache.clear()
+        self._prefetched_schemas.clear()
+        self._spatial_index_cache.clear()
+
+
+    def _clear_connection_state(self):
+        """
+        Drops everything that is only valid for the current connection.
+        """
+        self._clear_metadata_cache()
+        self._close_workers()
+        # Temporary tables go with the connection
+        del self._staged[:]
+        self._geometry_cache.clear()
+        self._statements.clear()
+        self._connection_args = None
+        self._dialect = PostGISDialect()
+
+
+    def connect_to_database(self, *args, **kwargs):
+        self._clear_connection_state()
+        result = DatabaseLibrary.connect_to_database(self, *args, **kwargs)
+        self._connection_args = ('connect_to_database', args, kwargs)
+        return result
+    connect_to_database.__doc__ = DatabaseLibrary.connect_to_database.__doc__
+
+
+    def connect_to_database_using_custom_params(self, *args, **kwargs):
+        self._clear_connection_state()
+        result = DatabaseLibrary.connect_to_database_using_custom_params(
+            self, *args, **kwargs)
+        self._connection_args = ('connect_to_database_using_custom_params',
+                                 args, kwargs)
+        return result
+    connect_to_database_using_custom_params.__doc__ = (
+        DatabaseLibrary.connect_to_database_using_custom_params.__doc__)
+
+
+    def connect_to_spatial_file(self, path, extension='mod_spatialite'):
+        """
+        Connects to a SpatiaLite database or GeoPackage file
+
+        The SpatiaLite `extension` is loaded into an in-process SQLite
+        connection, so no database server is needed:
+        | Connect To Spatial File | ${CURDIR}/delivery.gpkg |
+        | Table Extent Should Equal | buildings | 100000,300000,200000,400000 |
+        | Table Contains No Slivers | buildings |
+        | Disconnect From Database | |
+
+        Files containing "gpkg_contents" are treated as GeoPackages, for
+        which the R-tree spatial indexes are used by the intersection
+        keywords and the bounds in "gpkg_contents" for estimated extents
+        (see `Table Extent Should Equal`). Otherwise the SpatiaLite metadata
+        tables and SpatialIndex are used.
+
+        Tables are referred to without a schema, the default `schema` of
+        keywords is ignored.
+        """
+        import sqlite3
+        self._clear_connection_state()
+        # Worker connections are opened here but used by other threads
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.enable_load_extension(True)
+        connection.load_extension(extension)
+        tables = set(row[0] for row in connection.execute(
+                     "SELECT name FROM sqlite_master WHERE type = 'table'"))
+        if 'gpkg_contents' in tables:
+            # Lets SpatiaLite functions read GeoPackage geometry blobs
+            connection.execute('SELECT EnableGpkgAmphibiousMode()')
+            self._dialect = GeoPackageDialect()
+        else:
+            self._dialect = SpatiaLiteDialect()
+        self._dbconnection = connection
+        self._connection_args = ('connect_to_spatial_file', (path, extension),
+                                 {})
+        logger.info('Connected to {} as {}'.format(path, self._dialect.name))
+
+
+    def disconnect_from_database(self, *args, **kwargs):
+        try:
+            self.drop_staged_queries()
+        except Exception as e:
+            logger.debug('Error dropping staged queries: {}'.format(e))
+        self._clear_connection_state()
+        return DatabaseLibrary.disconnect_from_database(self, *args, **kwargs)
+    disconnect_from_database.__doc__ = (
+        DatabaseLibrary.disconnect_from_database.__doc__)
+
+
+    def _instrument(self, statement, function, *args, **kwargs):
+        """
+        Calls `function`, recording `statement` if instrumentation is on.
+
+        Only for statements generated by the library: slow ones are explained
+        with ANALYZE, running them again.
+        """
+        return self._statement_log.run(statement, function, args, kwargs,
+                                       explain=self.__explain_analyze)
+
+
+    def __instrument_keyword(self, statement, function, *args, **kwargs):
+        """
+        As _instrument, for statements given to the DatabaseLibrary
+        keywords. These may have side effects so are only explained, not
+        run again.
+        """
+        return self._statement_log.run(statement, function, args, kwargs,
+                                       explain=self.__explain)
+
+
+    def __explain(self, statement, analyze=False):
+        statement = statement.strip().rstrip(';')
+        if not re.match(r'(SELECT|WITH)\b', statement, re.I):
+            return None
+        explain = self._dialect.explain(statement, analyze)
+        if explain is None:
+            return None
+        rows = DatabaseLibrary.query(self, explain)
+        return '\n'.join(row[0] for row in rows)
+
+
+    def __explain_analyze(self, statement):
+        return self.__explain(statement, analyze=True)
+
+
+    def _query(self, statement):
+        return self._instrument(statement, DatabaseLibrary.query, self,
+                                statement)
+
+
+    def _description(self, statement):
+        return self._instrument(statement, DatabaseLibrary.description, self,
+                                statement)
+
+
+    def _execute_sql_string(self, statement):
+        return self._instrument(statement, DatabaseLibrary.execute_sql_string,
+                                self, statement)
+
+
+    def query(self, selectStatement, *args, **kwargs):
+        return self.__instrument_keyword(selectStatement,
+                                         DatabaseLibrary.query, self,
+                                         selectStatement, *args, **kwargs)
+    query.__doc__ = DatabaseLibrary.query.__doc__
+
+
+    def description(self, selectStatement, *args, **kwargs):
+        return self.__instrument_keyword(selectStatement,
+                                         DatabaseLibrary.description, self,
+                                         selectStatement, *args, **kwargs)
+    description.__doc__ = DatabaseLibrary.description.__doc__
+
+
+    def execute_sql_string(self, sqlString, *args, **kwargs):
+        return self.__instrument_keyword(sqlString,
+                                         DatabaseLibrary.execute_sql_string,
+                                         self, sqlString, *args, **kwargs)
+    execute_sql_string.__doc__ = DatabaseLibrary.execute_sql_string.__doc__
+
+
+    def describe_table(self, table, *args, **kwargs):
+        return self._instrument('-- describe table {}'.format(table),
+                                DatabaseLibrary.describe_table, self, table,
+                                *args, **kwargs)
+    describe_table.__doc__ = DatabaseLibrary.describe_table.__doc__
+
+
+    def describe_data(self, statement, *args, **kwargs):
+        return self.__instrument_keyword(statement,
+                                         DatabaseLibrary.describe_data, self,
+                                         statement, *args, **kwargs)
+    describe_data.__doc__ = DatabaseLibrary.describe_data.__doc__
+
+
+    def call_function(self, function, *args):
+        return self.__instrument_keyword('SELECT {}({});'.format(
+                                         function,
+                                         ', '.join(str(a) for a in args)),
+                                         DatabaseLibrary.call_function, self,
+                                         function, *args)
+    call_function.__doc__ = DatabaseLibrary.call_function.__doc__
+
+
+    def query_should_return_rows(self, statement, *args, **kwargs):
+        return self.__instrument_keyword(
+            statement, DatabaseLibrary.query_should_return_rows, self,
+            statement, *args, **kwargs)
+    query_should_return_rows.__doc__ = (
+        DatabaseLibrary.query_should_return_rows.__doc__)
+
+
+    def query_should_not_return_rows(self, statement, *args, **kwargs):
+        return self.__instrument_keyword(
+            statement, DatabaseLibrary.query_should_not_return_rows, self,
+            statement, *args, **kwargs)
+    query_should_not_return_rows.__doc__ = (
+        DatabaseLibrary.query_should_not_return_rows.__doc__)
+
+
+    def _get_single_result(self, statement, *args, **kwargs):
+        return self._instrument(statement, DatabaseLibrary._get_single_result,
+                                self, statement, *args, **kwargs)
+
+
+    def __query_prepared(self, statement, parameters):
+        """
+        Returns the rows of `statement` run with `parameters` bound to its
+        placeholders (see the dialect's parameter()).
+
+        Where the database supports it the statement is prepared the first
+        time and run by name after that.
+        """
+        cursor = self._dbconnection.cursor()
+        try:
+            if self._statements.limit and self._dialect.prepared_statements:
+                name, new, evicted = self._statements.lookup(statement)
+                for old in evicted:
+                    cursor.execute(self._dialect.deallocate(old))
+                if new:
+                    try:
+                        cursor.execute(self._dialect.prepare(name, statement))
+                    except Exception:
+                        self._statements.forget(statement)
+                        raise
+                sql = self._dialect.execute_prepared(name, len(parameters))
+            else:
+                sql, parameters = self._dialect.unprepared(statement,
+                                                           parameters)
+
+            def run():
+                cursor.execute(sql, parameters)
+                return cursor.fetchall()
+            # Not explained, the placeholders would need values
+            return self._statement_log.run(statement, run)
+        finally:
+            cursor.close()
+            # As DatabaseLibrary's query(), so a failed statement doesn't
+            # leave the transaction aborted. Prepared statements are kept.
+            self._dbconnection.rollback()
+
+
+    def get_prepared_statement_statistics(self):
+        """
+        Returns counts of the statements prepared on the connection
+
+        A dictionary of the number currently `prepared`, the `limit` set by
+        `statement_cache_size` (see library import), lookups finding one
+        already prepared (`hits`) or not (`misses`) and the number
+        deallocated to stay within the limit (`evictions`). Counts are reset
+        with `Reset SQL Statistics`:
+        | ${statements} | Get Prepared Statement Statistics |
+        | Should Be True | ${statements['hits']} > ${statements['misses']} |
+
+        Only PostGIS statements are prepared by the library, sqlite3 keeps
+        those of SpatiaLite itself.
+        """
+        return self._statements.statistics()
+
+
+    def set_sql_instrumentation(self, enabled=True, explain_threshold=None):
+        """
+        Turns recording of the SQL issued by the library on or off
+
+        For every statement the running keyword, a fingerprint (the
+        statement with literals replaced by '?'), the time taken and the
+        number of rows returned are recorded. If `explain_threshold` (a
+        Robot Framework time) is given, the plans of SELECTs taking at least
+        that long are kept, noting any sequential scans. Those the library
+        generates are run again with EXPLAIN (ANALYZE, BUFFERS), those given
+        to keywords such as `Query` are only explained, as they may have side
+        effects. Returns whether it was already enabled:
+        | Set SQL Instrumentation | | |
+        | Set SQL Instrumentation | explain_threshold=5 seconds | |
+        | Table Contains No Slivers | my_areas | |
+        | Log SQL Statistics | | |
+        | Export SQL Statistics | ${OUTPUT_DIR}/sql.csv | |
+
+        Note that the plans of the library's own statements are captured by
+        running them a second time. Plans are only captured with PostGIS.
+        """
+        previous = self._statement_log.enabled
+        self._statement_log.enabled = _is_true(enabled)
+        if explain_threshold in (None, '', 'None'):
+            self._statement_log.explain_threshold = None
+        else:
+            self._statement_log.explain_threshold = timestr_to_secs(
+                explain_threshold)
+        return previous
+
+
+    def get_SQL_statistics(self):
+        """
+        Returns the recorded statements grouped by fingerprint
+
+        Each item is a dictionary with the fingerprint and its `id`, the
+        `keywords` that issued it, `count`, total and maximum `elapsed`
+        seconds, total `rows`, `errors` and whether a captured plan showed a
+        sequential scan (`seq_scan`). Slowest statements come first:
+        | ${stats} | Get SQL Statistics |
+        | Should Be True | ${stats[0]['elapsed']} < 60 |
+        """
+        return self._statement_log.summary()
+
+
+    def log_SQL_statistics(self, limit=20):
+        """
+        Logs the slowest `limit` statement fingerprints
+
+        | Log SQL Statistics | |
+        | Log SQL Statistics | limit=5 |
+        """
+        lines = []
+        for total in self._statement_log.summary()[:int(limit)]:
+            lines.append('{:>10.3f}s {:>6} calls {:>9} rows{} [{}] {}'.format(
+                         total['elapsed'], total['count'], total['rows'],
+                         ' SEQ SCAN' if total['seq_scan'] else '',
+                         ', '.join(str(k) for k in total['keywords']),
+                         total['fingerprint']))
+        logger.info('\n'.join(lines) or 'No statements recorded')
+
+
+    def export_SQL_statistics(self, path, format=None):
+        """
+        Writes every recorded statement to `path` as JSON or CSV
+
+        The format is taken from the extension of `path` unless `format` is
+        given. JSON output also contains the summary from `Get SQL
+        Statistics`, CSV has one line per statement including any plan:
+        | Export SQL Statistics | ${OUTPUT_DIR}/sql.json | |
+        | Export SQL Statistics | ${OUTPUT_DIR}/sql.txt | format=csv |
+        """
+        self._statement_log.export(path, format)
+        logger.info('SQL statistics written to <a href="file://{0}">{0}</a>'
+                    .format(path), html=True)
+
+
+    def reset_SQL_statistics(self):
+        """
+        Discards all recorded statements
+
+        The counts of `Get Prepared Statement Statistics` are also reset.
+        """
+        self._statement_log.reset()
+        self._statements.reset()
+
+
+    def prefetch_spatial_metadata(self, schema=SCHEMA):
+        """
+        Caches the geometry column and SRID of every table in `schema`
+
+        A single query against "geometry_columns" is used, after which
+        `Get Geometry Column` and `Get Table SRID` are answered from the
+        cache for tables in `schema`, for example:
+        | Prefetch Spatial Metadata | | |
+        | Prefetch Spatial Metadata | my_schema | |
+
+        The cache lasts as long as the connection, it is cleared when
+        connecting or disconnecting and by `Clear Spatial Metadata Cache`.
+        Where a table has more than one geometry column the first one (by
+        name) is used as the table's geometry column.
+
+        """
+        rows = self.__query_prepared(self._dialect.geometry_columns(
+                                     self._dialect.parameter(1)), [schema])
+        for table, geometry_column, srid in rows:
+            self._geometry_column_cache.setdefault((schema, table),
+                                                   geometry_column)
+            if srid:
+                self._srid_cache[(schema, table, geometry_column)] = srid
+        self._prefetched_schemas.add(schema)
+        logger.debug('Cached metadata for {} geometry columns in {}'.format(
+                     len(rows), schema))
+
+
+    def clear_spatial_metadata_cache(self):
+        """
+        Empties the geometry column, SRID and column name cache
+
+        Use this after changing the structure of tables during a test run,
+        for example:
+        | Execute Sql String | ALTER TABLE my_table RENAME geom TO the_geom |
+        | Clear Spatial Metadata Cache | |
+
+        """
+        self._clear_metadata_cache()
+
+
+    def __staged_table(self, table, schema):
+        """
+        Returns (schema, table) for `table`, which may be a `Stage Query`
+        handle.
+        """
+        if isinstance(table, StagedQuery):
+            # Kept in the cache even after it has been cleared, as it can't
+            # be looked up
+            self._geometry_column_cache[(table.schema, table.table)] = (
+                table.geometry_column)
+            return table.schema, table.table
+        return schema, table
+
+
+    def stage_query(self, statement, geometry_column=GEOMETRY_COLUMN,
+                    name=None):
+        """
+        Copies the results of `statement` into an indexed temporary table
+
+        Returns a handle that can be used in place of the statement by
+        *Query keywords or the table by *Table keywords, so an expensive
+        query checked several times is only run once:
+        | ${areas} | Stage Query | SELECT * FROM my_areas WHERE type = 1 | |
+        | Query Contains No Slivers | ${areas} | | |
+        | Table Contains No Slivers | ${areas} | | |
+        | Should Intersect Whole Table | ${boundary} | ${areas} | |
+        | Table Extent Should Equal | ${areas} | 100000,300000,200000,400000 | |
+        | Drop Staged Queries | ${areas} | | |
+
+        With PostGIS a spatial index is built on `geometry_column` and the
+        table analysed. The table is named `name`, or numbered if not given.
+
+        Temporary tables are only visible to the connection that made them,
+        so staged queries can't be checked in chunks. They are dropped by
+        `Drop Staged Queries` or when disconnecting.
+        """
+        statement = statement.strip().rstrip(';')
+        if not name:
+            name = 'sdl_staged_{}'.format(len(self._staged) + 1)
+            while any(staged.table == name for staged in self._staged):
+                name += '_'
+        schema = self._dialect.temporary_schema
+        for sql in self._dialect.stage(name, statement, geometry_column):
+            self._execute_sql_string(sql)
+        table = self._dialect.table(schema, name)
+        staged = StagedQuery(schema, name, geometry_column,
+                             'SELECT * FROM {}'.format(table))
+        self._staged.append(staged)
+        logger.info('Staged {} rows into {}'.format(
+                    self._get_single_result('SELECT count(*) FROM {};'
+                                            .format(table)), table))
+        return staged
+
+
+    def drop_staged_queries(self, *staged):
+        """
+        Drops the temporary tables of `Stage Query` handles
+
+        Every staged query is dropped if none are given:
+        | Drop Staged Queries | ${areas} | ${buildings} |
+        | Drop Staged Queries | | |
+        """
+        staged = list(staged) or list(self._staged)
+        for handle in staged:
+            if not isinstance(handle, StagedQuery):
+                raise RuntimeError('Not a staged query: {}'.format(handle))
+            self._execute_sql_string('DROP TABLE IF EXISTS {}'.format(
+                                     self._dialect.table(handle.schema,
+                                                         handle.table)))
+            if handle in self._staged:
+                self._staged.remove(handle)
+            key = (handle.schema, handle.table)
+            self._geometry_column_cache.pop(key, None)
+            self._column_cache.pop(key, None)
+            for srid_key in list(self._srid_cache):
+                if srid_key[:2] == key:
+                    del self._srid_cache[srid_key]
+
+
+    def _get_workers(self, count):
+        """
+        Returns `count` libraries, each with its own database connection.
+
+        Workers are opened with the same arguments as the current connection
+        and kept until it is closed. They are given a copy of the metadata
+        cache so they don't need to look it up again, and the current
+        sampling.
+        """
+        if self._connection_args is None:
+            raise RuntimeError('Worker connections need a database connection'
+                               ' made with Connect To Database')
+        method, args, kwargs = self._connection_args
+        while len(self._workers) < count:
+            # The statement log and validation state are shared rather than
+            # opened again from the statistics and state files
+            worker = type(self)(
+                sample_size=self._sample_size,
+                local_predicates=self._local_predicates,
+                instrument=self._statement_log.enabled,
+                explain_threshold=self._statement_log.explain_threshold,
+                geometry_cache_size=self._geometry_cache.max_size,
+                statement_cache_size=self._statements.limit)
+            worker._statement_log = self._statement_log
+            worker._state = self._state
+            getattr(worker, method)(*args, **kwargs)
+            self._workers.append(worker)
+        workers = self._workers[:count]
+        for worker in workers:
+            # Sampling may have been set since the worker was opened
+            worker._sampling = self._sampling
+            worker._geometry_column_cache.update(self._geometry_column_cache)
+            worker._srid_cache.update(self._srid_cache)
+            worker._column_cache.update(self._column_cache)
+            worker._prefetched_schemas.update(self._prefetched_schemas)
+        return workers
+
+
+    def _close_workers(self, workers=None):
+        """
+        Closes `workers`, or all of them if not given.
+        """
+        if workers is None:
+            workers = self._workers
+        self._workers = [w for w in self._workers if w not in workers]
+        for worker in workers:
+            try:
+                worker.disconnect_from_database()
+            except Exception as e:
+                logger.debug('Error closing worker connection: {}'.format(e))
+
 
     def get_geometry_column(self, table, schema=SCHEMA,
                             default=GEOMETRY_COLUMN):
@@ -45,34 +835,59 @@ class SpatialDataLibrary(DatabaseLibrary):
 
         If nothing is found then GEOMETRY_COLUMN is returned.
 
+        Found names are cached for the life of the connection, see
+        `Prefetch Spatial Metadata`.
+
         """
+        schema, table = self.__staged_table(table, schema)
+        key = (schema, table)
+        if key in self._geometry_column_cache:
+            return self._geometry_column_cache[key]
+        if schema in self._prefetched_schemas:
+            return default
+        parameter = self._dialect.parameter
         try:
-            self.table_must_exist(table)
-            statement = '''
-                SELECT f_geometry_column
-                FROM geometry_columns
-                WHERE f_table_name = '{}';'''.format(table)
-            return self._get_single_result(statement)
+            rows = self.__query_prepared(self._dialect.geometry_columns(
+                                         parameter(1), parameter(2)),
+                                         [schema, table])
         except:
             return default
+        if not rows:
+            return default
+        geometry_column = rows[0][1]
+        self._geometry_column_cache[key] = geometry_column
+        return geometry_column
 
 
     def get_table_SRID(self, table, schema=SCHEMA,
                        geometry_column=GEOMETRY_COLUMN):
         """
         Finds the SRID for `table`
+
+        Found SRIDs are cached for the life of the connection, see
+        `Prefetch Spatial Metadata`.
         """
-        statement = "SELECT Find_SRID('{}','{}','{}')".format(schema, table,
-                                                        geometry_column)
+        schema, table = self.__staged_table(table, schema)
+        key = (schema, table, geometry_column)
+        if key in self._srid_cache:
+            return self._srid_cache[key]
+        parameter = self._dialect.parameter
+        statement = self._dialect.find_srid(parameter(1), parameter(2),
+                                            parameter(3))
         srid = None
         try:
-            srid = self._get_single_result(statement)
+            rows = self.__query_prepared(statement,
+                                         [schema, table, geometry_column])
+            srid = rows[0][0] if rows else None
             logger.debug('SRID returned: {}'.format(srid))
         except:
             pass
         if not srid:
-            srid = self.get_query_SRID('SELECT * FROM "{}"."{}"'.format(
-                                  schema, table), geometry_column)
+            srid = self.get_query_SRID('SELECT * FROM {}'.format(
+                                  self._dialect.table(schema, table)),
+                                  geometry_column)
+        if srid:
+            self._srid_cache[key] = srid
         return srid
 
 
@@ -88,7 +903,7 @@ class SpatialDataLibrary(DatabaseLibrary):
         return srid
 
 
-    def __format_source(self, source):
+    def __format_source(self, source, alias=None):
         """
         Formats the source for use in SQL statement.
 
@@ -96,42 +911,143 @@ class SpatialDataLibrary(DatabaseLibrary):
         the assumption is that it's something like a tuple.
         """
         if isinstance(source, basestring):
-            s = '({}) AS query'.format(source)
+            s = '({}) AS {}'.format(source, alias or 'query')
         else:
-            s = '"{0}"."{1}"'.format(*source)
+            s = self._dialect.table(*source)
+            if alias:
+                s += ' AS {}'.format(alias)
         return s
 
 
-    def __extent_should_equal(self, source, extent, geometry_column):
+    def __resolve_source(self, source, schema, geometry_column=None):
         """
+        Returns (source, geometry column) for a table name, `Stage Query`
+        handle or SELECT query.
+
+        Queries are returned as they are, tables as (schema, table). The
+        geometry column of a table is looked for unless given, that of a
+        query defaults to GEOMETRY_COLUMN.
+        """
+        if (not isinstance(source, StagedQuery) and
+                re.match(r'\s*(SELECT|WITH)\b', source, re.I)):
+            return (source.strip().rstrip(';'),
+                    geometry_column or GEOMETRY_COLUMN)
+        schema, table = self.__staged_table(source, schema)
+        if not geometry_column:
+            geometry_column = self.get_geometry_column(table, schema=schema)
+        return (schema, table), geometry_column
+
+
+    def __has_spatial_index(self, schema, table, geometry_column):
+        """
+        Whether an index has to be, and can be, named to be used.
+        """
+        key = (schema, table, geometry_column)
+        if key not in self._spatial_index_cache:
+            statement = self._dialect.spatial_index(schema, table,
+                                                    geometry_column)
+            found = False
+            if statement is not None:
+                try:
+                    found = bool(self._query(statement))
+                except Exception as e:
+                    logger.debug('Spatial index lookup failed: {}'.format(e))
+            self._spatial_index_cache[key] = found
+        return self._spatial_index_cache[key]
+
+
+    def __index_filter(self, source, geometry_column, geometry, alias=None):
+        """
+        Returns an SQL condition limiting a table `source` to rows whose
+        bounding boxes intersect `geometry` using the spatial index, where
+        the database needs to be told to. Otherwise returns '1 = 1'.
+        """
+        if isinstance(source, basestring):
+            return '1 = 1'
+        schema, table = source
+        if not self.__has_spatial_index(schema, table, geometry_column):
+            return '1 = 1'
+        return self._dialect.index_filter(schema, table, geometry_column,
+                                          geometry, alias)
+
+
+    def __parse_extent(self, extent):
+        """
+        Splits a MinX,MinY,MaxX,MaxY string into its four bounds.
         """
-        s = self.__format_source(source)
-        statement = 'SELECT ST_Extent("{}") FROM {};'.format(geometry_column,
-                                                             s)
         bounds = extent.split(',')
         if len(bounds) != 4:
             msg = 'Wrong number of points in extent: {}'.format(len(bounds))
             raise RuntimeError(msg)
-        table_extent = self._get_single_result(statement)
-        table_extent = table_extent[4:-1]  # Chop 'BOX(' and  ')'
-        table_extent = ','.join(table_extent.split(' '))
-        table_bounds = table_extent.split(',')
+        return bounds
+
+
+    def __extent_errors(self, bounds, actual_bounds, tolerance=0):
+        """
+        Returns messages for expected and actual MinX,MinY,MaxX,MaxY bounds
+        differing by more than `tolerance`.
+        """
         errors = []
-        for i in range(4):
+        for label, expected, actual in zip(EXTENT_LABELS, bounds,
+                                           actual_bounds):
+            error_msg = '{} values don\'t match'.format(label)
+            if tolerance:
+                if abs(float(expected) - float(actual)) > tolerance:
+                    errors.append('{}: {} != {} (tolerance {})'.format(
+                                  error_msg, expected, actual, tolerance))
+                continue
             try:
-                coord = 'X' if i % 2 else 'Y'
-                adj = 'Min' if i < 2 else 'Max'
-                error_msg = '{}{} values don\'t match'.format(adj, coord)
-                builtin.should_be_equal_as_numbers(bounds[i],
-                                                   table_bounds[i],
+                builtin.should_be_equal_as_numbers(expected, actual,
                                                    msg=error_msg, values=True)
             except AssertionError as ae:
                errors.append(str(ae))
+        return errors
+
 
+    def __compare_extent(self, bounds, actual_bounds, tolerance=0):
+        """
+        Compares expected and actual MinX,MinY,MaxX,MaxY bounds.
+        """
+        errors = self.__extent_errors(bounds, actual_bounds, tolerance)
         if len(errors):
             raise AssertionError('\n'.join(errors))
 
 
+    def __extents(self, statements):
+        """
+        Runs the extent `statements` as one UNION ALL, returning the
+        (MinX, MinY, MaxX, MaxY) of each or None where there is none.
+        """
+        union = '\nUNION ALL\n'.join(
+            'SELECT {0} AS n, extent_{0}.* FROM ({1}) AS extent_{0}'.format(
+                n, statement.strip().rstrip(';'))
+            for n, statement in enumerate(statements))
+        extents = [None] * len(statements)
+        for row in self._query(union + ';'):
+            if None not in row[1:]:
+                extents[int(row[0])] = tuple(row[1:])
+        return extents
+
+
+    def __extent_should_equal(self, source, extent, geometry_column,
+                              estimated=False, tolerance=0):
+        """
+        """
+        bounds = self.__parse_extent(extent)
+        table_bounds = None
+        if estimated and not isinstance(source, basestring):
+            table_bounds = self.__extents([self._dialect.estimated_extent(
+                source[0], source[1], geometry_column)])[0]
+            if table_bounds is not None:
+                logger.debug('Using estimated extent: {}'.format(
+                             table_bounds))
+        if table_bounds is None:
+            s = self.__format_source(source)
+            table_bounds = self._query(self._dialect.extent(geometry_column,
+                                                            s))[0]
+        self.__compare_extent(bounds, table_bounds, float(tolerance))
+
+
     def data_extent_should_equal(self, statement, extent,
                                  geometry_column=GEOMETRY_COLUMN):
         """
@@ -151,166 +1067,1586 @@ class SpatialDataLibrary(DatabaseLibrary):
         will always be "wkb_geometry" if not specified.
 
         """
-        statement = statement.rstrip(';')
-        self.__extent_should_equal(statement, extent, geometry_column)
+        statement = statement.rstrip(';')
+        self.__extent_should_equal(statement, extent, geometry_column)
+
+
+    def table_extent_should_equal(self, table, extent, schema=SCHEMA,
+                                  geometry_column=None, incremental=False,
+                                  watermark_column=None, estimated=False,
+                                  tolerance=0):
+        """
+
+        Checks that the bounding box of a given table matches that specified.
+
+        Bounding box must be specified as a comma separated string of the form
+        MinX,MinY,MaxX,MaxY, for example:
+
+        | Table Extent Should Equal | my_table | 100000,300000,200000,400000 |
+        | Table Extent Should Equal | my_table | 100000,300000,200000,400000 | geometry_column=my_geom |
+
+        Units are those used by the projection defined for the geometries
+        (metres for the above example, where the table is in EPSG:27700).
+
+        If no geometry column name is specified then it is looked for in the
+        database, if that fails then it defaults to GEOMETRY_COLUMN.
+
+        With `incremental` (and a `state_file`, see library import) the
+        extent is calculated from the one stored by the previous run and
+        that of rows whose `watermark_column` has increased since. As rows
+        are only added to it, the stored extent never shrinks when rows are
+        deleted or moved.
+        | Table Extent Should Equal | my_table | 100000,300000,200000,400000 | incremental=True | watermark_column=updated |
+
+        With `estimated` the extent is read from the table statistics or,
+        for a GeoPackage, the bounds recorded in gpkg_contents rather than
+        from the data, see `Extents Should Equal`. These are approximate or
+        written by whoever produced the data, so only use this with a
+        `tolerance` and where that is good enough. The bounds may differ
+        from those expected by up to `tolerance`:
+        | Table Extent Should Equal | my_table | 100000,300000,200000,400000 | estimated=True | tolerance=1000 |
+
+        """
+        schema, table = self.__staged_table(table, schema)
+        if not geometry_column:
+            geometry_column = self.get_geometry_column(table, schema=schema)
+        if _is_true(incremental):
+            if not watermark_column:
+                raise RuntimeError('Incremental extents need a '
+                                   'watermark_column')
+            self.__compare_extent(self.__parse_extent(extent),
+                                  self.__incremental_extent(
+                                      (schema, table), geometry_column,
+                                      watermark_column), float(tolerance))
+            return
+        self.__extent_should_equal((schema, table), extent, geometry_column,
+                                   _is_true(estimated), tolerance)
+
+
+    def extents_should_equal(self, extents, schema=SCHEMA,
+                             geometry_column=GEOMETRY_COLUMN, tolerance=0,
+                             estimated=False):
+        """
+        Checks the extents of many tables and queries at once
+
+        `extents` is a dictionary of table name or SELECT query to its
+        expected extent, in the MinX,MinY,MaxX,MaxY form taken by `Table
+        Extent Should Equal`. Tables are in `schema` and their geometry
+        columns are looked for in the database, queries use
+        `geometry_column`.
+
+        Every extent is calculated by a single UNION ALL statement and the
+        bounds may differ from those expected by up to `tolerance`. All the
+        sources that don't match are reported in one failure.
+
+        With `estimated` the extents of tables are read from the statistics
+        gathered by ANALYZE (ST_EstimatedExtent), from UpdateLayerStatistics
+        for SpatiaLite or from gpkg_contents for a GeoPackage. This is much
+        cheaper for large tables but only approximate, so should be used with
+        a `tolerance`. Extents of tables without statistics, and of queries,
+        are still calculated.
+
+        | ${extents} | Create Dictionary | my_areas=100000,300000,200000,400000 | my_points=100000,300000,150000,350000 |
+        | Extents Should Equal | ${extents} | schema=my_schema | |
+        | Extents Should Equal | ${extents} | tolerance=1000 | estimated=True |
+
+        """
+        tolerance = float(tolerance)
+        sources = []
+        for name in sorted(extents):
+            bounds = self.__parse_extent(extents[name])
+            source, column = self.__resolve_source(name, schema)
+            if isinstance(source, basestring):
+                column = geometry_column
+            sources.append((name, source, column, bounds))
+
+        found = [None] * len(sources)
+        if _is_true(estimated):
+            tables = [n for n, (_, source, _, _) in enumerate(sources)
+                      if not isinstance(source, basestring)]
+            if tables:
+                estimates = self.__extents([self._dialect.estimated_extent(
+                    sources[n][1][0], sources[n][1][1], sources[n][2])
+                    for n in tables])
+                for n, estimate in zip(tables, estimates):
+                    found[n] = estimate
+        missing = [n for n in range(len(sources)) if found[n] is None]
+        if missing:
+            exact = self.__extents([self._dialect.extent(
+                sources[n][2], self.__format_source(sources[n][1]))
+                for n in missing])
+            for n, extent in zip(missing, exact):
+                found[n] = extent
+
+        errors = []
+        for (name, _, _, bounds), actual in zip(sources, found):
+            if actual is None:
+                errors.append('{}: contains no geometries'.format(name))
+                continue
+            logger.debug('{} extent: {}'.format(name, actual))
+            errors.extend('{}: {}'.format(name, error) for error in
+                          self.__extent_errors(bounds, actual, tolerance))
+        if errors:
+            raise AssertionError('\n'.join(errors))
+
+
+    def table_extents_should_equal_by_group(self, table, group_column,
+                                            extents, schema=SCHEMA,
+                                            geometry_column=None,
+                                            tolerance=0):
+        """
+        Checks the extent of each group of rows in a table at once
+
+        `extents` is a dictionary of the values of `group_column` to the
+        expected extent of the rows with that value, in the MinX,MinY,MaxX,MaxY
+        form taken by `Table Extent Should Equal`. Values are compared as
+        text and groups not in `extents` aren't checked.
+
+        The extents of every group are calculated by a single grouped
+        statement and the bounds may differ from those expected by up to
+        `tolerance`. All the groups that don't match are reported in one
+        failure.
+
+        | ${extents} | Create Dictionary | north=100000,500000,400000,900000 | south=100000,0,400000,500000 |
+        | Table Extents Should Equal By Group | my_areas | region | ${extents} | tolerance=1 |
+
+        """
+        schema, table = self.__staged_table(table, schema)
+        if not geometry_column:
+            geometry_column = self.get_geometry_column(table, schema=schema)
+        tolerance = float(tolerance)
+        expected = dict(('{}'.format(group), self.__parse_extent(extent))
+                        for group, extent in extents.items())
+        rows = self._query('''
+            SELECT "{0}", {1}
+            FROM {2}
+            GROUP BY "{0}";'''.format(group_column,
+                                      self._dialect.extent_columns(
+                                          geometry_column),
+                                      self.__format_source((schema, table))))
+        found = dict(('{}'.format(row[0]), tuple(row[1:])) for row in rows)
+        errors = []
+        for group in sorted(expected):
+            actual = found.get(group)
+            if actual is None or None in actual:
+                errors.append('{}: contains no geometries'.format(group))
+                continue
+            errors.extend('{}: {}'.format(group, error) for error in
+                          self.__extent_errors(expected[group], actual,
+                                               tolerance))
+        unchecked = sorted(set(found) - set(expected))
+        if unchecked:
+            logger.debug('Groups not checked: {}'.format(
+                         ', '.join(unchecked)))
+        if errors:
+            raise AssertionError('\n'.join(errors))
+
+
+    def __describe_columns(self, source):
+        """
+        Returns the column names of `source`, cached per statement or table.
+
+        Queries are described from an empty result so the query itself
+        isn't run.
+        """
+        if source in self._column_cache:
+            return self._column_cache[source]
+        if isinstance(source, basestring):
+            # string is assumed to be query
+            columns = self._description('SELECT * FROM ({}) AS query LIMIT 0;'
+                                        .format(source.strip().rstrip(';')))
+        elif (isinstance(self._dialect, SpatiaLiteDialect) or
+                source[0] == self._dialect.temporary_schema):
+            # No information_schema, so describe an empty result instead
+            columns = self._description('SELECT * FROM {} LIMIT 0;'.format(
+                                        self.__format_source(source)))
+        else:
+            # expecting (schema, table)
+            columns = self.describe_table(source[1], schema=source[0])
+        names = [getattr(column, 'name', None) or column[0]
+                 for column in columns]
+        self._column_cache[source] = names
+        return names
+
+
+    def __row_srid(self, source, geometry_column):
+        """
+        Returns SQL for the SRID of the first geometry in `source`, used to
+        coerce geometries against queries without running them first to
+        look the SRID up.
+
+        It doesn't refer to the row being compared, so is evaluated once and
+        the geometry compared with stays constant for the spatial index.
+        """
+        return '''(
+                SELECT ST_SRID("{0}")
+                FROM {1}
+                WHERE "{0}" IS NOT NULL
+                LIMIT 1
+            )'''.format(geometry_column,
+                         self.__format_source(source, 'srid_query'))
+
+
+    def __remove_geometry_from_columns(self, source, geometry_column,
+                                       return_expr=False):
+        column_names = []
+        for name in self.__describe_columns(source):
+            if name != geometry_column.strip('" '):
+                column_names.append('"{}"'.format(name))
+        if not column_names:
+            column_names.append("'[only geometry column specified]' as message")
+        if return_expr:
+            result =  '''
+                , '''.join(column_names)
+        else:
+            result = column_names
+        return result
+
+
+    def __rows_should_exist(self, statement, message):
+        """
+        Fails with `message` unless `statement` returns at least one row.
+
+        Only the first row is looked for so passing checks stay cheap.
+        """
+        statement = statement.strip().rstrip(';')
+        if not self._get_single_result('SELECT EXISTS ({});'.format(
+                                       statement)):
+            raise AssertionError(message)
+
+
+    def __failing_rows(self, statement, sample_size=None):
+        """
+        Returns the number of rows `statement` returns and at most
+        `sample_size` of them.
+
+        Only the first row is looked for unless there are any.
+        """
+        statement = statement.strip().rstrip(';')
+        if not self._get_single_result('SELECT EXISTS ({});'.format(
+                                       statement)):
+            return 0, []
+        if sample_size is None:
+            sample_size = self._sample_size
+        sample_size = int(sample_size)
+        count = self._get_single_result(
+            'SELECT count(*) FROM ({}) AS failures;'.format(statement))
+        sample = []
+        if sample_size > 0:
+            sample = self._query('SELECT * FROM ({}) AS failures LIMIT {};'
+                                 .format(statement, sample_size))
+        return count, sample
+
+
+    def __rows_should_not_exist(self, statement, message, sample_size=None,
+                                chunking=None, condition=None, sampled=None):
+        """
+        Fails with `message` if `statement` returns any rows.
+
+        On failure the total is counted and at most `sample_size` rows are
+        fetched and logged rather than the whole result.
+
+        If `chunking` or `condition` are given `statement` must end with a
+        WHERE clause. It is extended with `condition` and to check one chunk
+        at a time, see __rows_should_not_exist_in_chunks.
+
+        If `sampled`, the FROM clause of a sample of the table checked, is
+        given the failure rate of the sample is checked instead.
+        """
+        if condition is not None:
+            statement = '{}\n AND ({})'.format(statement.strip().rstrip(';'),
+                                               condition)
+        if sampled is not None:
+            return self.__sampled_rows_should_not_exist(statement, message,
+                                                        sample_size, sampled)
+        if chunking is not None:
+            return self.__rows_should_not_exist_in_chunks(
+                statement, message, sample_size, **chunking)
+        count, sample = self.__failing_rows(statement, sample_size)
+        if not count:
+            return
+        if sample:
+            logger.info('First {} of {} failing rows:\n{}'.format(
+                        len(sample), count,
+                        '\n'.join(str(row) for row in sample)))
+        raise AssertionError('{}: {} rows, see log for details'.format(
+                             message, count))
+
+
+    def __validation_state(self):
+        if self._state is None:
+            raise RuntimeError('Incremental checks need a state_file, see '
+                               'library import')
+        return self._state
+
+
+    def __geometry_key(self, geometry):
+        """
+        Returns a short identifier of `geometry` for naming stored state.
+        """
+        if isinstance(geometry, Geometry):
+            geometry = geometry.hex()
+        return hashlib.md5(geometry.strip().encode('utf-8')).hexdigest()[:12]
+
+
+    def __incremental(self, source, geometry_column, check, incremental,
+                      watermark_column, chunk_key):
+        """
+        Returns (condition, save) limiting `check` of table `source` to rows
+        changed since it last passed, and a function to call once it has.
+
+        The condition is None if everything is to be checked.
+        """
+        if not _is_true(incremental):
+            return None, lambda: None
+        if self._sampling is not None:
+            raise RuntimeError('Sampled checks can\'t be incremental')
+        state = self.__validation_state()
+        s = self.__format_source(source)
+        key = '{}.{}'.format(*source)
+        if watermark_column:
+            name = '{} {} > {}'.format(check, geometry_column,
+                                       watermark_column)
+            current = self._get_single_result('SELECT max("{}") FROM {};'
+                                              .format(watermark_column, s))
+            previous = state.watermark(key, name)
+            condition = None
+            if previous is not None:
+                condition = '"{}" > {}'.format(watermark_column,
+                                               self._value_to_text(
+                                                   previous[0]))
+                logger.info('Checking rows with {} after {}'.format(
+                            watermark_column, previous[0]))
+            if current is None:
+                return condition, lambda: None
+            return condition, lambda: state.set_watermark(key, name,
+                                                          str(current))
+        if not chunk_key:
+            raise RuntimeError('Incremental checks need a watermark_column '
+                               'or an integer chunk_key')
+        name = '{} {} / {}'.format(check, geometry_column, chunk_key)
+        hashes = dict(self._query(self._dialect.chunk_hashes(
+                                  s, chunk_key, geometry_column,
+                                  HASH_CHUNK_SIZE)))
+        previous = state.chunk_hashes(key, name)
+        condition = None
+        if previous:
+            changed = sorted(chunk for chunk in hashes
+                             if previous.get(chunk) != hashes[chunk])
+            logger.info('{} of {} chunks of {} changed'.format(
+                        len(changed), len(hashes), chunk_key))
+            condition = '1 = 0'
+            if changed:
+                condition = '"{}" / {} IN ({})'.format(
+                            chunk_key, HASH_CHUNK_SIZE,
+                            ', '.join(str(chunk) for chunk in changed))
+        return condition, lambda: state.set_chunk_hashes(key, name, hashes)
+
+
+    def __incremental_extent(self, source, geometry_column,
+                             watermark_column):
+        """
+        Returns the extent of table `source` from the one stored by the last
+        run extended by that of rows with a greater `watermark_column`.
+        """
+        state = self.__validation_state()
+        s = self.__format_source(source)
+        key = '{}.{}'.format(*source)
+        name = 'extent {} > {}'.format(geometry_column, watermark_column)
+        current = self._get_single_result('SELECT max("{}") FROM {};'.format(
+                                          watermark_column, s))
+        previous = state.watermark(key, name)
+        changed = s
+        if previous is not None and previous[1] is not None:
+            changed = '(SELECT * FROM {} WHERE "{}" > {}) AS changed'.format(
+                      s, watermark_column, self._value_to_text(previous[0]))
+        bounds = tuple(self._query(self._dialect.extent(geometry_column,
+                                                        changed))[0])
+        if previous is not None and previous[1] is not None:
+            if bounds[0] is None:
+                bounds = previous[1]
+            else:
+                bounds = (min(bounds[0], previous[1][0]),
+                          min(bounds[1], previous[1][1]),
+                          max(bounds[2], previous[1][2]),
+                          max(bounds[3], previous[1][3]))
+        if current is not None and bounds[0] is not None:
+            state.set_watermark(key, name, str(current), bounds)
+        return bounds
+
+
+    def forget_validation_state(self, table=None, schema=SCHEMA):
+        """
+        Forgets what incremental checks stored for `table`, or every table
+
+        The next incremental check of the table checks every row:
+        | Forget Validation State | my_areas |
+        | Forget Validation State | |
+        """
+        state = self.__validation_state()
+        if table is None:
+            state.forget()
+        else:
+            schema, table = self.__staged_table(table, schema)
+            state.forget('{}.{}'.format(schema, table))
+
+
+    def __chunking(self, source, geometry_column, chunks, chunk_key, workers,
+                   fail_fast, alias=None):
+        """
+        Returns the `chunking` argument of `__rows_should_not_exist`, or None
+        if `source` isn't to be split.
+
+        `alias` qualifies the columns of `source` in the chunk conditions.
+        """
+        if chunks is None or int(chunks) < 2:
+            return None
+        if isinstance(source, basestring):
+            raise RuntimeError('Only tables can be checked in chunks')
+        if source[0] == self._dialect.temporary_schema:
+            raise RuntimeError('Staged queries can\'t be checked in chunks')
+        return {'source': source, 'geometry_column': geometry_column,
+                'chunks': int(chunks), 'chunk_key': chunk_key,
+                'workers': int(workers), 'fail_fast': _is_true(fail_fast),
+                'alias': alias}
+
+
+    def __chunk_filters(self, source, geometry_column, chunks, chunk_key,
+                        alias=None):
+        """
+        Returns conditions splitting the rows of a table `source` between
+        `chunks` chunks, each row being in exactly one.
+
+        With a numeric `chunk_key` column the rows are split into equal key
+        ranges, otherwise into a grid of tiles over the table extent with
+        each geometry assigned to the tile holding the lower left corner of
+        its bounding box.
+        """
+        s = self.__format_source(source)
+        if chunk_key:
+            low, high = self._query('SELECT min("{0}"), max("{0}") FROM {1};'
+                                    .format(chunk_key, s))[0]
+            if low is None:
+                return []
+            low, high = float(low), float(high)
+            bounds = [low + (high - low) * float(n) / chunks
+                      for n in range(1, chunks)]
+            key = '"{}"'.format(chunk_key)
+            if alias:
+                key = '{}.{}'.format(alias, key)
+            filters = ['{} < {!r} OR {} IS NULL'.format(key, bounds[0], key)]
+            for lower, upper in zip(bounds, bounds[1:]):
+                filters.append('{0} >= {1!r} AND {0} < {2!r}'.format(
+                               key, lower, upper))
+            filters.append('{} >= {!r}'.format(key, bounds[-1]))
+            return filters
+
+        xmin, ymin, xmax, ymax = self._query(self._dialect.extent(
+                                             geometry_column, s))[0]
+        if xmin is None:
+            return []
+        side = int(ceil(sqrt(chunks)))
+        # The outer edges are the extent itself, not values calculated from
+        # it, so no corner falls outside the grid through rounding
+        xs = ([xmin] + [xmin + (xmax - xmin) * float(n) / side
+                        for n in range(1, side)] + [xmax])
+        ys = ([ymin] + [ymin + (ymax - ymin) * float(n) / side
+                        for n in range(1, side)] + [ymax])
+        srid = self.get_table_SRID(source[1], schema=source[0],
+                                   geometry_column=geometry_column)
+        filters = []
+        for column in range(side):
+            for row in range(side):
+                bounds = (xs[column], ys[row], xs[column + 1], ys[row + 1])
+                envelope = self._dialect.envelope(*bounds, srid=srid)
+                filters.append('{}\n                AND {}'.format(
+                    self._dialect.tile_filter(geometry_column, envelope,
+                                              *bounds,
+                                              last_x=column == side - 1,
+                                              last_y=row == side - 1,
+                                              alias=alias),
+                    self.__index_filter(source, geometry_column, envelope,
+                                        alias)))
+        return filters
+
+
+    def __rows_should_not_exist_in_chunks(self, statement, message,
+                                          sample_size, source,
+                                          geometry_column, chunks, chunk_key,
+                                          workers, fail_fast, alias=None):
+        """
+        Runs `statement` for each chunk of `source` in parallel, logging the
+        result of every chunk as it finishes.
+
+        With `fail_fast` no further chunks are started once rows are found.
+        """
+        statement = statement.strip().rstrip(';')
+        if sample_size is None:
+            sample_size = self._sample_size
+        sample_size = int(sample_size)
+        filters = self.__chunk_filters(source, geometry_column, chunks,
+                                       chunk_key, alias)
+        if not filters:
+            return
+        pending = Queue()
+        for n, condition in enumerate(filters, 1):
+            pending.put((n, condition))
+        finished = Queue()
+        stop = threading.Event()
+
+        def run(worker):
+            try:
+                while not stop.is_set():
+                    try:
+                        n, condition = pending.get_nowait()
+                    except Empty:
+                        return
+                    try:
+                        result = worker.__failing_rows('{}\n AND ({})'.format(
+                                                       statement, condition),
+                                                       sample_size)
+                    except Exception as e:
+                        result = e
+                        worker._dbconnection.rollback()
+                    finished.put((n, result))
+                    if fail_fast and (isinstance(result, Exception) or
+                                      result[0]):
+                        stop.set()
+            finally:
+                finished.put(None)
+
+        threads = [threading.Thread(target=run, args=(worker,))
+                   for worker in self._get_workers(min(workers,
+                                                       len(filters)))]
+        for thread in threads:
+            thread.start()
+        # Robot Framework only logs from the main thread, so results are
+        # passed back here
+        count = 0
+        sample = []
+        errors = []
+        checked = 0
+        running = len(threads)
+        while running:
+            item = finished.get()
+            if item is None:
+                running -= 1
+                continue
+            n, result = item
+            checked += 1
+            if isinstance(result, Exception):
+                errors.append('Chunk {}: {}'.format(n, result))
+                logger.info('Chunk {}/{}: error {}'.format(n, len(filters),
+                                                           result))
+                continue
+            count += result[0]
+            sample.extend(result[1][:sample_size - len(sample)])
+            logger.info('Chunk {}/{}: {} failing rows'.format(
+                        n, len(filters), result[0]))
+        for thread in threads:
+            thread.join()
+
+        unchecked = ''
+        if checked < len(filters):
+            unchecked = ', {} of {} chunks not checked'.format(
+                        len(filters) - checked, len(filters))
+        if count:
+            if sample:
+                logger.info('First {} of {} failing rows:\n{}'.format(
+                            len(sample), count,
+                            '\n'.join(str(row) for row in sample)))
+            raise AssertionError('{}: {} rows{}, see log for details'.format(
+                                 message, count, unchecked))
+        if errors:
+            raise RuntimeError('{} chunks failed{}:\n{}'.format(
+                               len(errors), unchecked, '\n'.join(errors)))
+
+
+    def __contains_no_slivers(self, source, factor, geometry_column,
+                              query=False, sample_size=None, chunking=None,
+                              condition=None):
+        factor = _sliver_factor(factor)
+        column_expr = self.__remove_geometry_from_columns(source,
+                                                          geometry_column,
+                                                          return_expr=True)
+        sampled = self.__sampled_source(source, chunking)
+        s = sampled or self.__format_source(source)
+        statement = '''
+            SELECT
+                {2}
+            FROM {0}
+            WHERE
+                {3}
+                AND	ST_Area({1})/(
+                    (
+                        ST_Perimeter({1}) * ST_Perimeter({1})
+                    )/(
+                        4 * {4}
+                    )
+                ) < {5}'''.format(s, geometry_column, column_expr,
+                                  self._dialect.is_polygon(geometry_column),
+                                  self._dialect.pi(), factor)
+
+        self.__rows_should_not_exist(statement, 'Slivers found',
+                                     sample_size, chunking, condition,
+                                     sampled)
+
+
+
+    def query_contains_no_slivers(self, statement, factor=0.05,
+                                  geometry_column=GEOMETRY_COLUMN,
+                                  sample_size=None):
+        """
+        Tests whether the data returned by `statement` contains 'slivers'
+
+        If it does then an AssertionError is thrown and the rows containing
+        slivers are logged.
+
+        *Note*: the test will select only POLYGON and MULTIPOLYGON geometries
+        from the results: all others are ignored. All matching rows are checked
+        every time this test is run, even when one or more fails the test.
+
+        This test works by comparing the area of the geometry to that for an
+        circle with the same perimeter - the largest possible area for
+        that perimeter. If the area of a geometry is smaller than the 'ideal'
+        multiplied by the given `factor` then the test is failed.
+
+        By default `factor` is equal to _0.05_ i.e. all geometries are expected
+        to have an area more than 5% of the maximum. This should be tuned for a
+        given query if the data contains valid narrow geometries.
+
+        If no `geometry_column` is supplied then GEOMETRY_COLUMN is used.
+
+        On failure the number of slivers is reported and at most
+        `sample_size` of the rows are logged, defaulting to the value given
+        when importing the library.
+
+        Examples:
+        | Query Contains No Slivers | SELECT * FROM my_areas | | |
+        | Query Contains No Slivers | SELECT * FROM my_areas | factor=0.05 | |
+        | Query Contains No Slivers | SELECT * FROM my_areas | geometry_column=my_geom | |
+        | Query Contains No Slivers | SELECT * FROM my_areas | factor=0.05 | geometry_column=my_geom |
+
+        """
+        statement = statement.rstrip(';')
+        self.__contains_no_slivers(statement, factor, geometry_column,
+                                   query=True, sample_size=sample_size)
+
+
+    def table_contains_no_slivers(self, table, factor=0.05, schema=SCHEMA,
+                                  geometry_column=None, sample_size=None,
+                                  chunks=None, chunk_key=None, workers=4,
+                                  fail_fast=False, incremental=False,
+                                  watermark_column=None):
+        """
+        Tests whether the data in `table` contains 'slivers'
+
+        See `Query Contains No Slivers` for more information, with the
+        following changes:
+
+        If no `geometry_column` is supplied then it is searched for in the
+        database, if that fails then GEOMETRY_COLUMN is used.
+
+        Very large tables can be checked in `chunks` run in parallel by
+        `workers` connections, opened with the same arguments as the current
+        one. With a numeric `chunk_key` column the table is split into equal
+        ranges of its values, otherwise into a grid of about `chunks` tiles
+        over the table extent. Each row is checked in exactly one chunk, a
+        geometry crossing tiles belonging to the tile containing the lower
+        left corner of its bounding box. The result of each chunk is logged
+        as it finishes and with `fail_fast` no further chunks are started
+        once slivers are found.
+
+        Examples:
+        | Table Contains No Slivers | my_areas | | |
+        | Table Contains No Slivers | my_areas | factor=0.05 | |
+        | Table Contains No Slivers | my_areas | geometry_column=my_geom | |
+        | Table Contains No Slivers | my_areas | factor=0.05 | geometry_column=my_geom |
+        | Table Contains No Slivers | my_areas | chunks=64 | workers=8 |
+        | Table Contains No Slivers | my_areas | chunks=16 | chunk_key=id | fail_fast=True |
+
+        With `incremental` (and a `state_file`, see library import) only rows
+        changed since the check last passed with the same arguments are
+        checked. Changes are found either from a `watermark_column`, such as
+        a last modified timestamp or a serial, whose highest value is stored
+        when the check passes, or if there isn't one by hashing the
+        geometries in ranges of an integer `chunk_key` column (e.g. the
+        primary key) and comparing them with the hashes stored by the last
+        run. The first run checks the whole table.
+        | Table Contains No Slivers | my_areas | incremental=True | watermark_column=updated |
+        | Table Contains No Slivers | my_areas | incremental=True | chunk_key=id |
+
+        """
+        schema, table = self.__staged_table(table, schema)
+        if not geometry_column:
+            geometry_column = self.get_geometry_column(table, schema=schema)
+        condition, save = self.__incremental(
+            (schema, table), geometry_column,
+            'slivers {}'.format(float(factor)), incremental, watermark_column,
+            chunk_key)
+        self.__contains_no_slivers((schema, table), factor, geometry_column,
+                                   sample_size=sample_size,
+                                   chunking=self.__chunking(
+                                       (schema, table), geometry_column,
+                                       chunks, chunk_key, workers, fail_fast),
+                                   condition=condition)
+        save()
+
+
+    def table_should_have_no_overlaps(self, table, schema=SCHEMA,
+                                      geometry_column=None, key_column=None,
+                                      sample_size=None, chunks=None,
+                                      chunk_key=None, workers=4,
+                                      fail_fast=False):
+        """
+        Tests that no two features in `table` overlap
+
+        Features overlap when their interiors intersect, so features that
+        only touch along their boundaries pass. Pairs of features are found
+        with a join on the spatial index, comparing only those whose
+        bounding boxes intersect, and each pair is compared once.
+
+        On failure the number of overlapping pairs is reported and at most
+        `sample_size` pairs are logged, identified by `key_column` (the
+        database's own row identifier if not given).
+
+        If no `geometry_column` is supplied then it is searched for in the
+        database, if that fails then GEOMETRY_COLUMN is used.
+
+        Large tables can be checked in `chunks` as for `Table Contains No
+        Slivers`, each pair being checked in the chunk of its first feature.
+
+        Examples:
+        | Table Should Have No Overlaps | my_areas | | |
+        | Table Should Have No Overlaps | my_areas | key_column=id | |
+        | Table Should Have No Overlaps | my_areas | chunks=64 | workers=8 |
+
+        """
+        schema, table = self.__staged_table(table, schema)
+        if not geometry_column:
+            geometry_column = self.get_geometry_column(table, schema=schema)
+        source = (schema, table)
+        s = self.__format_source(source)
+        key = self._dialect.row_id
+        if key_column:
+            key = '"{}"'.format(key_column)
+        statement = '''
+            SELECT a.{2} AS feature, b.{2} AS overlaps
+            FROM {0} AS a
+            JOIN {0} AS b
+            ON {3}
+            AND {4}
+            WHERE a.{2} < b.{2}
+            AND ST_Relate(a."{1}", b."{1}", 'T********')'''.format(
+            s, geometry_column, key,
+            self._dialect.bbox_intersects('a."{}"'.format(geometry_column),
+                                          'b."{}"'.format(geometry_column)),
+            self.__index_filter(source, geometry_column,
+                                'a."{}"'.format(geometry_column), alias='b'))
+        self.__rows_should_not_exist(statement, 'Overlapping features found',
+                                     sample_size,
+                                     self.__chunking(source, geometry_column,
+                                                     chunks, chunk_key,
+                                                     workers, fail_fast,
+                                                     alias='a'))
+
+
+    def __geometries_should_be_valid(self, source, geometry_column,
+                                     sample_size=None, chunking=None):
+        column_expr = self.__remove_geometry_from_columns(source,
+                                                          geometry_column,
+                                                          return_expr=True)
+        s = self.__format_source(source)
+        statement = '''
+            SELECT
+                {2},
+                ST_IsValidReason("{1}") AS reason
+            FROM {0}
+            WHERE NOT ST_IsValid("{1}")'''.format(s, geometry_column,
+                                                   column_expr)
+        self.__rows_should_not_exist(statement, 'Invalid geometries found',
+                                     sample_size, chunking)
+
+
+    def query_geometries_should_be_valid(self, statement,
+                                         geometry_column=GEOMETRY_COLUMN,
+                                         sample_size=None):
+        """
+        Tests that the geometries returned by `statement` are valid
+
+        Geometries that are not valid, such as self-intersecting polygons,
+        fail the test. On failure the number of invalid geometries is
+        reported and at most `sample_size` of the rows are logged along with
+        the reason each is invalid.
+
+        If no `geometry_column` is supplied then GEOMETRY_COLUMN is used.
+
+        Examples:
+        | Query Geometries Should Be Valid | SELECT * FROM my_areas | |
+        | Query Geometries Should Be Valid | SELECT * FROM my_areas | geometry_column=my_geom |
+
+        """
+        statement = statement.rstrip(';')
+        self.__geometries_should_be_valid(statement, geometry_column,
+                                          sample_size=sample_size)
+
+
+    def table_geometries_should_be_valid(self, table, schema=SCHEMA,
+                                         geometry_column=None,
+                                         sample_size=None, chunks=None,
+                                         chunk_key=None, workers=4,
+                                         fail_fast=False):
+        """
+        Tests that the geometries in `table` are valid
+
+        See `Query Geometries Should Be Valid` for more information, with
+        the following changes:
+
+        If no `geometry_column` is supplied then it is searched for in the
+        database, if that fails then GEOMETRY_COLUMN is used.
+
+        Large tables can be checked in `chunks` as for `Table Contains No
+        Slivers`.
+
+        Examples:
+        | Table Geometries Should Be Valid | my_areas | |
+        | Table Geometries Should Be Valid | my_areas | chunks=64 | workers=8 |
+
+        """
+        schema, table = self.__staged_table(table, schema)
+        if not geometry_column:
+            geometry_column = self.get_geometry_column(table, schema=schema)
+        self.__geometries_should_be_valid(
+            (schema, table), geometry_column, sample_size=sample_size,
+            chunking=self.__chunking((schema, table), geometry_column, chunks,
+                                     chunk_key, workers, fail_fast))
+
+
+    def __reference_differences(self, table, reference, key_column, schema,
+                                reference_schema, geometry_column,
+                                reference_geometry_column, chunk_size):
+        """
+        Returns the keys added to, removed from and changed in `table`
+        compared with `reference`.
+
+        Both are hashed server-side in chunks of `chunk_size` values of the
+        integer `key_column`, only the rows of chunks whose hashes differ
+        are then hashed and fetched.
+        """
+        source, geometry_column = self.__resolve_source(table, schema,
+                                                        geometry_column)
+        reference, reference_geometry_column = self.__resolve_source(
+            reference, reference_schema or schema, reference_geometry_column)
+        chunk_size = int(chunk_size)
+        columns = [c for c in self.__remove_geometry_from_columns(
+                   source, geometry_column)
+                   if c.startswith('"') and c != '"{}"'.format(key_column)]
+        sides = ((self.__format_source(source), geometry_column),
+                 (self.__format_source(reference), reference_geometry_column))
+
+        chunks = [dict(self._query(self._dialect.chunk_hashes(
+                       s, key_column, column, chunk_size, columns)))
+                  for s, column in sides]
+        changed = sorted(chunk for chunk in set(chunks[0]) | set(chunks[1])
+                         if chunks[0].get(chunk) != chunks[1].get(chunk))
+        logger.info('{} of {} chunks of {} differ'.format(
+                    len(changed), len(set(chunks[0]) | set(chunks[1])),
+                    key_column))
+        if not changed:
+            return [], [], []
+
+        rows = []
+        for s, column in sides:
+            rows.append(dict(self._query('''
+                SELECT "{1}", {2}
+                FROM {0}
+                WHERE "{1}" / {3} IN ({4});'''.format(
+                s, key_column, self._dialect.row_hash(column, columns),
+                chunk_size, ', '.join(str(chunk) for chunk in changed)))))
+        added = sorted(set(rows[0]) - set(rows[1]))
+        removed = sorted(set(rows[1]) - set(rows[0]))
+        modified = sorted(key for key in set(rows[0]) & set(rows[1])
+                          if rows[0][key] != rows[1][key])
+        return added, removed, modified
+
+
+    def get_table_differences_from_reference(self, table, reference,
+                                             key_column, schema=SCHEMA,
+                                             reference_schema=None,
+                                             geometry_column=None,
+                                             reference_geometry_column=None,
+                                             chunk_size=HASH_CHUNK_SIZE):
+        """
+        Returns the features of `table` that differ from `reference`
+
+        See `Table Geometries Should Match Reference` for the arguments.
+
+        The result is a dictionary with the `key_column` values of features
+        'added' to (only in) `table`, 'removed' from it (only in
+        `reference`) and 'changed', each a sorted list:
+        | ${differences} | Get Table Differences From Reference | my_areas | my_areas_reference | id |
+        | Should Be Empty | ${differences['changed']} | | |
+
+        """
+        added, removed, changed = self.__reference_differences(
+            table, reference, key_column, schema, reference_schema,
+            geometry_column, reference_geometry_column, chunk_size)
+        return {'added': added, 'removed': removed, 'changed': changed}
+
+
+    def table_geometries_should_match_reference(self, table, reference,
+                                                key_column, schema=SCHEMA,
+                                                reference_schema=None,
+                                                geometry_column=None,
+                                                reference_geometry_column=None,
+                                                chunk_size=HASH_CHUNK_SIZE,
+                                                sample_size=None):
+        """
+        Tests that `table` holds the same features as `reference`
+
+        Features are matched by their integer `key_column` and must have the
+        same geometry, compared as WKB, and the same values in every other
+        column of `table`, which `reference` must also have. `table` and
+        `reference` can also be SELECT queries and `reference` is looked for
+        in `reference_schema`, `schema` if not given. Geometry columns of
+        tables are looked for in the database unless given, those of queries
+        default to GEOMETRY_COLUMN.
+
+        Rather than fetching either, each is hashed in the database in
+        chunks of `chunk_size` key values and only the chunks whose hashes
+        differ are compared feature by feature.
+
+        On failure the number of features added, removed and changed are
+        reported and at most `sample_size` keys of each are logged.
+
+        Examples:
+        | Table Geometries Should Match Reference | my_areas | my_areas_reference | id |
+        | Table Geometries Should Match Reference | my_areas | my_areas | id | reference_schema=published |
+
+        """
+        added, removed, changed = self.__reference_differences(
+            table, reference, key_column, schema, reference_schema,
+            geometry_column, reference_geometry_column, chunk_size)
+        if not (added or removed or changed):
+            return
+        if sample_size is None:
+            sample_size = self._sample_size
+        sample_size = int(sample_size)
+        for label, keys in (('added', added), ('removed', removed),
+                            ('changed', changed)):
+            if keys and sample_size > 0:
+                logger.info('First {} of {} {} features: {}'.format(
+                            min(sample_size, len(keys)), len(keys), label,
+                            ', '.join(str(key)
+                                      for key in keys[:sample_size])))
+        raise AssertionError('Features differ from reference: {} added, {} '
+                             'removed, {} changed, see log for details'
+                             .format(len(added), len(removed), len(changed)))
+
+
+    def __spatial_profile(self, source, geometry_column, factor):
+        factor = _sliver_factor(factor)
+        s = self.__format_source(source)
+        # Grouping by type and SRID keeps this to a single scan while still
+        # giving the histogram, SRIDs and per-group extents to merge
+        statement = '''
+            SELECT
+                GeometryType("{1}") AS geometry_type,
+                ST_SRID("{1}") AS srid,
+                count(*) AS rows,
+                {3},
+                sum(
+                    CASE WHEN {4}
+                         AND ST_Perimeter("{1}") > 0
+                    THEN
+                        CASE WHEN ST_Area("{1}")/(
+                                (
+                                    ST_Perimeter("{1}") * ST_Perimeter("{1}")
+                                )/(
+                                    4 * {5}
+                                )
+                            ) < {2}
+                        THEN 1 ELSE 0 END
+                    ELSE 0 END
+                ) AS slivers
+            FROM {0}
+            GROUP BY 1, 2
+            ;'''.format(s, geometry_column, factor,
+                         self._dialect.extent_columns(geometry_column),
+                         self._dialect.is_polygon('"{}"'.format(
+                                                  geometry_column)),
+                         self._dialect.pi())
+        profile = SpatialProfile(source, factor)
+        for row in self._query(statement):
+            profile.add_group(row[0], row[1], int(row[2]), row[3], row[4],
+                              row[5], row[6], int(row[7] or 0))
+        logger.info('Spatial profile: {}'.format(profile))
+        return profile
+
+
+    def get_query_spatial_profile(self, statement, factor=0.05,
+                                  geometry_column=GEOMETRY_COLUMN):
+        """
+        Profiles the data returned by `statement` in a single pass
+
+        The returned profile holds the extent, SRIDs, geometry type
+        histogram, row count, NULL geometry count and the number of slivers
+        (see `Query Contains No Slivers` for `factor`). It can be checked
+        with the `Profile ...` keywords without querying the database again,
+        for example:
+        | ${profile} | Get Query Spatial Profile | SELECT * FROM my_areas WHERE type = 1 |
+        | Profile Extent Should Equal | ${profile} | 100000,300000,200000,400000 |
+        | Profile SRID Should Be | ${profile} | 27700 |
+        | Profile Contains No Slivers | ${profile} | |
+        | Should Be Equal As Integers | ${profile.row_count} | 42 |
+
+        If no `geometry_column` is supplied then GEOMETRY_COLUMN is used.
+
+        """
+        statement = statement.rstrip(';')
+        return self.__spatial_profile(statement, geometry_column, factor)
+
+
+    def get_table_spatial_profile(self, table, factor=0.05, schema=SCHEMA,
+                                  geometry_column=None):
+        """
+        Profiles the data in `table` in a single pass
+
+        See `Get Query Spatial Profile` for more information, with the
+        following changes:
+
+        If no `geometry_column` is supplied then it is searched for in the
+        database, if that fails then GEOMETRY_COLUMN is used.
+
+        Examples:
+        | ${profile} | Get Table Spatial Profile | my_areas | |
+        | ${profile} | Get Table Spatial Profile | my_areas | factor=0.1 |
+
+        """
+        schema, table = self.__staged_table(table, schema)
+        if not geometry_column:
+            geometry_column = self.get_geometry_column(table, schema=schema)
+        return self.__spatial_profile((schema, table), geometry_column,
+                                      factor)
+
+
+    def profile_extent_should_equal(self, profile, extent):
+        """
+        Checks the extent recorded in `profile`
+
+        `extent` takes the same form as for `Table Extent Should Equal`:
+        | Profile Extent Should Equal | ${profile} | 100000,300000,200000,400000 |
+        """
+        bounds = self.__parse_extent(extent)
+        if profile.extent is None:
+            raise AssertionError('Profile contains no geometries')
+        self.__compare_extent(bounds, profile.extent)
+
+
+    def profile_SRID_should_be(self, profile, srid):
+        """
+        Checks that every geometry in `profile` uses `srid`
+
+        | Profile SRID Should Be | ${profile} | 27700 |
+        """
+        if profile.srids != [int(srid)]:
+            raise AssertionError('Expected SRID {} but found {}'.format(
+                                 srid, ', '.join(str(s) for s in
+                                                 profile.srids)))
+
+
+    def profile_geometry_types_should_be(self, profile, *geometry_types):
+        """
+        Checks that `profile` only contains the given geometry types
+
+        Types are those returned by GeometryType, NULL geometries are
+        ignored, see `Profile Contains No Null Geometries`:
+        | Profile Geometry Types Should Be | ${profile} | POLYGON | MULTIPOLYGON |
+        """
+        allowed = set(t.upper() for t in geometry_types)
+        unexpected = sorted(t for t in profile.geometry_types
+                            if t.upper() not in allowed)
+        if unexpected:
+            raise AssertionError('Unexpected geometry types found: {}'.format(
+                                 ', '.join('{} ({})'.format(
+                                           t, profile.geometry_types[t])
+                                           for t in unexpected)))
+
+
+    def profile_contains_no_null_geometries(self, profile):
+        """
+        Checks that no rows in `profile` have a NULL geometry
+
+        | Profile Contains No Null Geometries | ${profile} |
+        """
+        if profile.null_count:
+            raise AssertionError('{} NULL geometries found'.format(
+                                 profile.null_count))
+
+
+    def profile_contains_no_slivers(self, profile):
+        """
+        Checks that no slivers were counted in `profile`
+
+        The `factor` is the one given when the profile was created, see
+        `Query Contains No Slivers`:
+        | Profile Contains No Slivers | ${profile} |
+        """
+        if profile.sliver_count:
+            raise AssertionError('{} slivers found (factor {})'.format(
+                                 profile.sliver_count, profile.factor))
+
+
+    def __compactness_histogram(self, source, geometry_column, buckets):
+        buckets = int(buckets)
+        if buckets < 1:
+            raise ValueError('buckets must be at least 1, not {}'.format(
+                             buckets))
+        geometry = '"{}"'.format(geometry_column)
+        statement = '''
+            SELECT
+                {1} AS bucket,
+                count(*)
+            FROM {0}
+            WHERE {2}
+            AND ST_Perimeter({3}) > 0
+            GROUP BY 1
+            ;'''.format(self.__format_source(source),
+                         self._dialect.floor(
+                             '''4 * {0} * ST_Area({1})
+                                / (ST_Perimeter({1}) * ST_Perimeter({1}))
+                                * {2}'''.format(self._dialect.pi(), geometry,
+                                                 buckets)),
+                         self._dialect.is_polygon(geometry), geometry)
+        histogram = CompactnessHistogram(source, buckets)
+        for bucket, count in self._query(statement):
+            histogram.add_bucket(bucket, int(count))
+        logger.info('Compactness: {}'.format(histogram))
+        return histogram
+
+
+    def get_query_compactness_histogram(self, statement,
+                                        geometry_column=GEOMETRY_COLUMN,
+                                        buckets=1000):
+        """
+        Returns the distribution of the compactness of `statement` polygons
+
+        Compactness is as used to find slivers, see `Query Contains No
+        Slivers`. It is counted in a single pass in `buckets` equal ranges
+        from 0 to 1 and the percentiles are logged. The returned histogram
+        can be checked against several `factor` values without querying the
+        database again, exactly to the bucket width (0.001 by default):
+        | ${histogram} | Get Query Compactness Histogram | SELECT * FROM my_areas WHERE type = 1 |
+        | Histogram Sliver Count Should Be | ${histogram} | 0 | factor=0.02 |
+        | Histogram Sliver Count Should Be | ${histogram} | 12 | factor=0.05 |
+        | Histogram Percentile Should Be At Least | ${histogram} | 5 | 0.1 |
 
+        If no `geometry_column` is supplied then GEOMETRY_COLUMN is used.
 
-    def table_extent_should_equal(self, table, extent, schema=SCHEMA,
-                                  geometry_column=None):
         """
+        statement = statement.rstrip(';')
+        return self.__compactness_histogram(statement, geometry_column,
+                                            buckets)
 
-        Checks that the bounding box of a given table matches that specified.
 
-        Bounding box must be specified as a comma separated string of the form
-        MinX,MinY,MaxX,MaxY, for example:
+    def get_table_compactness_histogram(self, table, schema=SCHEMA,
+                                        geometry_column=None, buckets=1000):
+        """
+        Returns the distribution of the compactness of `table` polygons
 
-        | Table Extent Should Equal | my_table | 100000,300000,200000,400000 |
-        | Table Extent Should Equal | my_table | 100000,300000,200000,400000 | geometry_column=my_geom |
+        See `Get Query Compactness Histogram` for more information, with the
+        following changes:
 
-        Units are those used by the projection defined for the geometries
-        (metres for the above example, where the table is in EPSG:27700).
+        If no `geometry_column` is supplied then it is searched for in the
+        database, if that fails then GEOMETRY_COLUMN is used.
 
-        If no geometry column name is specified then it is looked for in the
-        database, if that fails then it defaults to GEOMETRY_COLUMN.
+        | ${histogram} | Get Table Compactness Histogram | my_areas |
+        | Histogram Sliver Count Should Be | ${histogram} | 0 | factor=0.05 |
 
         """
-
+        schema, table = self.__staged_table(table, schema)
         if not geometry_column:
             geometry_column = self.get_geometry_column(table, schema=schema)
-        self.__extent_should_equal((schema, table), extent, geometry_column)
+        return self.__compactness_histogram((schema, table), geometry_column,
+                                            buckets)
 
 
-    def __remove_geometry_from_columns(self, source, geometry_column,
-                                       return_expr=False):
-        if isinstance(source, basestring):
-            # string is assumed to be query
-            columns = self.describe_data(source)
-        else:
-            # expecting (schema, table)
-            columns = self.describe_table(source[1], schema=source[0])
-        column_names = []
-        for column in columns:
-            if column.name != geometry_column.strip('" '):
-                column_names.append('"{}"'.format(column.name))
-        if not column_names:
-            column_names.append("'[only geometry column specified]' as message")
-        if return_expr:
-            result =  '''
-                , '''.join(column_names)
-        else:
-            result = column_names
-        return result
+    def histogram_sliver_count_should_be(self, histogram, count,
+                                         factor=0.05):
+        """
+        Checks the number of polygons in `histogram` less compact than
+        `factor`
 
+        See `Get Query Compactness Histogram`:
+        | Histogram Sliver Count Should Be | ${histogram} | 0 | factor=0.05 |
+        """
+        found = histogram.count_below(_sliver_factor(factor))
+        if found != int(count):
+            raise AssertionError('Expected {} slivers but found {} (factor '
+                                 '{})'.format(count, found, factor))
 
-    def __contains_no_slivers(self, source, factor, geometry_column,
-                              query=False):
-        assert factor < 1
-        column_expr = self.__remove_geometry_from_columns(source,
-                                                          geometry_column,
-                                                          return_expr=True)
-        s = self.__format_source(source)
-        statement = '''
-            SELECT
-                {2}
-            FROM {0}
-            WHERE
-                ST_GeometryType({1}) IN ('ST_Polygon', 'ST_MultiPolygon')
-                AND	ST_Area({1})/(
-                    (
-                        ST_Perimeter({1}) * ST_Perimeter({1})
-                    )/(
-                        4 * pi()
-                    )
-                ) < 0.10
-            ;'''.format(s, geometry_column, column_expr)
 
-        try:
-            self.query_should_not_return_rows(statement)
-        except AssertionError:
-            raise AssertionError('Slivers found, see log for details')
+    def histogram_percentile_should_be_at_least(self, histogram, percent,
+                                                compactness):
+        """
+        Checks that no more than `percent` of the polygons in `histogram` are
+        less compact than `compactness`
 
+        See `Get Query Compactness Histogram`, e.g. at least 95% of polygons
+        have a compactness of 0.1 or more:
+        | Histogram Percentile Should Be At Least | ${histogram} | 5 | 0.1 |
+        """
+        value = histogram.percentile(percent)
+        if value is None:
+            raise AssertionError('Histogram contains no polygons')
+        if value < float(compactness):
+            raise AssertionError('{} percentile compactness is {:.4f}, below '
+                                 '{}'.format(percent, value, compactness))
 
 
-    def query_contains_no_slivers(self, statement, factor=0.05,
-                                  geometry_column=GEOMETRY_COLUMN):
+    def get_geometry(self, statement, binary=True):
         """
-        Tests whether the data returned by `statement` contains 'slivers'
-
-        If it does then an AssertionError is thrown and the rows containing
-        slivers are logged.
+        Returns a geometry
 
-        *Note*: the test will select only POLYGON and MULTIPOLYGON geometries
-        from the results: all others are ignored. All matching rows are checked
-        every time this test is run, even when one or more fails the test.
+        The `statement` **must** be a SELECT that returns a single row with
+        the geometry as its first column, for example:
 
-        This test works by comparing the area of the geometry to that for an
-        circle with the same perimeter - the largest possible area for
-        that perimeter. If the area of a geometry is smaller than the 'ideal'
-        multiplied by the given `factor` then the test is failed.
+        | ${the_geom} | Get Geometry | SELECT wkb_geometry FROM my_table WHERE id = 1 |
+        | Should Intersect Table | ${the_geom} | my_points |
 
-        By default `factor` is equal to _0.05_ i.e. all geometries are expected
-        to have an area more than 5% of the maximum. This should be tuned for a
-        given query if the data contains valid narrow geometries.
+        The geometry is fetched as EWKB through a server-side cursor and
+        returned as a compact geometry object holding the EWKB, its SRID and
+        bounding box. This can be passed to any keyword that takes a
+        geometry, which will send it back to the database as binary, and
+        becomes WKT when used as a string, e.g. with `Log` or `Catenate`.
 
-        If no `geometry_column` is supplied then GEOMETRY_COLUMN is used.
+        Set `binary` to False to have the database return WKT text instead:
 
-        Examples:
-        | Query Contains No Slivers | SELECT * FROM my_areas | | |
-        | Query Contains No Slivers | SELECT * FROM my_areas | factor=0.05 | |
-        | Query Contains No Slivers | SELECT * FROM my_areas | geometry_column=my_geom | |
-        | Query Contains No Slivers | SELECT * FROM my_areas | factor=0.05 | geometry_column=my_geom |
+        | ${wkt} | Get Geometry | SELECT wkb_geometry FROM my_table WHERE id = 1 | binary=False |
+        | Should Be Equal | ${wkt} | POINT(1 1) |
 
+        Returns None if the geometry is NULL.
         """
-        statement = statement.rstrip(';')
-        self.__contains_no_slivers(statement, factor, geometry_column,
-                                   query=True)
+        statement = statement.strip().rstrip(';')
+        if self._dialect.derived_column_aliases:
+            source = '({}) AS g(geom)'.format(statement)
+            geometry = 'g.geom'
+        else:
+            source = '({}) AS g'.format(statement)
+            geometry = 'g."{}"'.format(self.__describe_columns(statement)[0])
+        if _is_true(binary):
+            return self.__get_binary_geometry(source, geometry)
+        wkt_statement = 'SELECT ST_AsText({}) FROM {};'.format(geometry,
+                                                               source)
+        return self._get_single_result(wkt_statement)
 
 
-    def table_contains_no_slivers(self, table, factor=0.05, schema=SCHEMA,
-                                  geometry_column=None):
+    def __get_binary_geometry(self, source, geometry):
+        binary_statement = 'SELECT {} FROM {}'.format(
+                           self._dialect.as_binary(geometry), source)
+        cursor = None
+        if self._dialect.server_side_cursors:
+            try:
+                # A named cursor is held on the server, only the single row
+                # asked for is transferred
+                cursor = self._dbconnection.cursor(
+                    'spatialdatalibrary_geometry')
+            except TypeError:
+                pass
+        if cursor is None:
+            cursor = self._dbconnection.cursor()
+        try:
+            self._instrument(binary_statement, cursor.execute,
+                             binary_statement)
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+            # As DatabaseLibrary's query(), so the connection isn't left
+            # idle in a transaction holding locks and snapshots
+            self._dbconnection.rollback()
+        if row is None:
+            raise RuntimeError('No geometry returned by {}'.format(source))
+        return self.__row_geometry(row)
+
+
+    def __row_geometry(self, row):
         """
-        Tests whether the data in `table` contains 'slivers'
-
-        See `Query Contains No Slivers` for more information, with the
-        following changes:
+        Returns a Geometry from the `as_binary` columns of `row`.
+        """
+        if row[0] is None:
+            return None
+        if isinstance(self._dialect, SpatiaLiteDialect):
+            return Geometry.from_wkb(row[0], row[1])
+        return Geometry(row[0])
 
-        If no `geometry_column` is supplied then it is searched for in the
-        database, if that fails then GEOMETRY_COLUMN is used.
 
-        Examples:
-        | Table Contains No Slivers | my_areas | | |
-        | Table Contains No Slivers | my_areas | factor=0.05 | |
-        | Table Contains No Slivers | my_areas | geometry_column=my_geom | |
-        | Table Contains No Slivers | my_areas | factor=0.05 | geometry_column=my_geom |
+    def cache_table_geometries(self, table, schema=SCHEMA,
+                               geometry_column=None, check_modified=False):
+        """
+        Holds the geometries of `table` in memory to be tested locally
+
+        `Should Intersect Table`, `Should Not Intersect Table`, `Should All
+        Intersect Table` and `Should None Intersect Table` against the table
+        are then decided in-process, comparing the bounding boxes of its
+        geometries in an STR-tree and then exactly testing those that could
+        intersect. This is for checking many geometries against a modest
+        table across many test cases, where they can't be batched into one
+        keyword.
+
+        Only passing checks are decided in-process. If a check looks like
+        failing, or a geometry can't be compared in-process (see `Set Local
+        Predicates`), it is run by the database as usual so the failure is
+        reported in full.
+
+        Tables stay cached until `Clear Table Geometry Cache` or the next
+        connection. Together they are kept within `geometry_cache_size`
+        bytes (see library import), dropping the least recently used.
+
+        With `check_modified` the table is loaded again if it has changed
+        since, which is looked for before each check. For PostgreSQL this
+        uses the table statistics, which are updated shortly after changes
+        are committed. For SpatiaLite any change to the database counts.
+
+        | Cache Table Geometries | admin_areas | |
+        | Should Intersect Table | ${probe} | admin_areas |
+        | Cache Table Geometries | admin_areas | check_modified=True |
+        | Clear Table Geometry Cache | admin_areas | |
 
         """
+        schema, table = self.__staged_table(table, schema)
         if not geometry_column:
-            geometry_column = self.get_geometry_column(table)
-        self.__contains_no_slivers((schema, table), factor, geometry_column)
+            geometry_column = self.get_geometry_column(table, schema=schema)
+        self.__load_cached_table((schema, table), geometry_column,
+                                 _is_true(check_modified))
+
+
+    def __load_cached_table(self, source, geometry_column, check_modified):
+        key = source + (geometry_column,)
+        self._geometry_cache.discard(key)
+        signature = None
+        if check_modified:
+            rows = self._query(self._dialect.modification_signature(*source))
+            signature = tuple(rows[0]) if rows else ()
+        srid = self.get_table_SRID(source[1], schema=source[0],
+                                   geometry_column=geometry_column)
+        rows = self._query('''
+            SELECT {}
+            FROM {}
+            WHERE "{}" IS NOT NULL;'''.format(
+            self._dialect.as_binary('"{}"'.format(geometry_column)),
+            self.__format_source(source), geometry_column))
+        cached = CachedTable([self.__row_geometry(row) for row in rows],
+                             srid, signature)
+        if cached.size > self._geometry_cache.max_size:
+            logger.warn('{}.{} is too large to cache: {} bytes'.format(
+                        source[0], source[1], cached.size))
+            return None
+        for dropped in self._geometry_cache.put(key, cached):
+            logger.info('Dropped {}.{} from the geometry cache'.format(
+                        *dropped))
+        logger.info('Cached {} geometries of {}.{}, {} bytes'.format(
+                    cached.count, source[0], source[1], cached.size))
+        return cached
+
+
+    def __cached_table(self, source, geometry_column):
+        """
+        Returns the CachedTable of table `source`, or None.
+        """
+        key = source + (geometry_column,)
+        cached = self._geometry_cache.get(key)
+        if cached is None or cached.signature is None:
+            return cached
+        rows = self._query(self._dialect.modification_signature(*source))
+        if (tuple(rows[0]) if rows else ()) != cached.signature:
+            logger.info('{}.{} has changed, caching it again'.format(*source))
+            cached = self.__load_cached_table(source, geometry_column, True)
+        return cached
+
+
+    def __cached_intersects(self, geometry, source, geometry_column):
+        """
+        Returns whether `geometry` intersects a cached feature of table
+        `source`, or None if that can't be decided in-process.
+        """
+        cached = self.__cached_table(source, geometry_column)
+        if cached is None:
+            return None
+        try:
+            return cached.intersects(geometry)
+        except UnsupportedGeometry as e:
+            logger.debug('Checking in the database: {}'.format(e))
+            return None
+
+
+    def __cached_intersect_many(self, geometries, source, geometry_column,
+                                intersect=True):
+        """
+        Returns whether all `geometries` are known to intersect (or not,
+        without `intersect`) cached features of table `source`.
+        """
+        cached = self.__cached_table(source, geometry_column)
+        if cached is None:
+            return False
+        try:
+            return all(cached.intersects(geometry) == intersect
+                       for geometry in self.__read_geometries(geometries))
+        except UnsupportedGeometry as e:
+            logger.debug('Checking in the database: {}'.format(e))
+            return False
 
 
-    def get_geometry(self, statement):
+    def clear_table_geometry_cache(self, table=None, schema=SCHEMA):
         """
-        Returns a geometry in WKT format
+        Stops holding the geometries of `table`, or of every table, in memory
 
-        The `statement` **must** be a SELECT that returns a single row that
-        contains only the geometry column, for example:
+        See `Cache Table Geometries`:
+        | Clear Table Geometry Cache | admin_areas |
+        | Clear Table Geometry Cache | |
+        """
+        if table is None:
+            self._geometry_cache.clear()
+            return
+        schema, table = self.__staged_table(table, schema)
+        for key in self._geometry_cache.keys():
+            if key[:2] == (schema, table):
+                self._geometry_cache.discard(key)
 
-        | ${the_geom} | Get Geometry | SELECT wkb_geometry FROM my_table WHERE id = 1 |
+
+    def set_sampling(self, percent=None, method='SYSTEM', seed=None,
+                     confidence=0.95, max_failure_rate=0):
+        """
+        Checks a random sample of each table rather than every row
+
+        Applies to `Table Contains No Slivers`, `Should Intersect Whole
+        Table` and `Should Not Intersect Table` until turned off again by
+        giving no `percent`. About `percent` of the rows are sampled with
+        TABLESAMPLE (PostgreSQL 9.5 or later), by `method` SYSTEM (whole
+        pages, fastest) or BERNOULLI (individual rows, more even). The same
+        `seed` gives the same sample, if not given one is chosen and logged
+        so a run can be repeated.
+
+        The failure rate is estimated from the sample and logged with its
+        upper bound at `confidence`. With the default `max_failure_rate` of
+        0 any failing row in the sample fails the check. Otherwise the check
+        fails unless the upper bound is below `max_failure_rate`, so e.g.
+        "fewer than 0.1% slivers at 95% confidence" is:
+        | Set Sampling | 1 | max_failure_rate=0.001 | confidence=0.95 |
+        | Table Contains No Slivers | my_areas | |
+        | Set Sampling | 0.1 | method=BERNOULLI | seed=42 |
+        | Should Intersect Whole Table | ${boundary} | my_areas |
+        | Set Sampling | | |
+
+        Sampled checks can't also be chunked or incremental.
         """
-        re_result = re.search('SELECT (.*) FROM.*', statement, re.I)
-        geometry_column = re_result.group(1)
-        if geometry_column:
-            logger.debug('Geometry column found: {}'.format(geometry_column))
+        if percent is None or not _is_true(percent):
+            self._sampling = None
+            return
+        if method.upper() not in ('SYSTEM', 'BERNOULLI'):
+            raise RuntimeError('Unknown sampling method: {}'.format(method))
+        if seed is None or seed == '':
+            seed = random.randint(0, 2 ** 31 - 1)
+        self._sampling = {
+            'percent': float(percent),
+            'method': method.upper(),
+            'seed': int(seed),
+            'confidence': float(confidence),
+            'max_failure_rate': float(max_failure_rate),
+        }
+        logger.info('Sampling {percent}% of rows by {method} with seed '
+                    '{seed}'.format(**self._sampling))
+
+
+    def __sampled_source(self, source, chunking=None, alias=None):
+        """
+        Returns the FROM clause for a sample of table `source`, or None if
+        sampling is off.
+        """
+        if self._sampling is None or isinstance(source, basestring):
+            return None
+        if chunking is not None:
+            raise RuntimeError('Sampled checks can\'t be chunked')
+        clause = self._dialect.tablesample(self._sampling['method'],
+                                           self._sampling['percent'],
+                                           self._sampling['seed'])
+        if clause is None:
+            raise RuntimeError('Sampling is not supported by {}'.format(
+                               self._dialect.name))
+        return '{} {}'.format(self.__format_source(source, alias), clause)
+
+
+    def __sampled_rows_should_not_exist(self, statement, message,
+                                        sample_size, sampled):
+        """
+        Fails with `message` unless the rate of rows returned by
+        `statement` from the rows of `sampled` is acceptable.
+        """
+        failures, sample = self.__failing_rows(statement, sample_size)
+        total = self._get_single_result('SELECT count(*) FROM {};'.format(
+                                        sampled))
+        if not total:
+            raise RuntimeError('No rows sampled, increase the percentage')
+        confidence = self._sampling['confidence']
+        max_failure_rate = self._sampling['max_failure_rate']
+        rate = float(failures) / total
+        upper = _upper_confidence_bound(failures, total, confidence)
+        summary = ('{} of {} sampled rows, estimated rate {:.4%} with {:.0%} '
+                   'upper bound {:.4%}'.format(failures, total, rate,
+                                               confidence, upper))
+        logger.info(summary)
+        if max_failure_rate:
+            failed = upper >= max_failure_rate
         else:
-            raise RuntimeError('Geometry column not found in {}'.format(
-                               statement))
-        wkt_statement = ('SELECT ST_AsText({}) FROM ({}) g;'.format(
-                         geometry_column, statement.rstrip(';')))
-        return self._get_single_result(wkt_statement)
+            failed = failures > 0
+        if not failed:
+            return
+        if sample:
+            logger.info('First {} of {} failing sampled rows:\n{}'.format(
+                        len(sample), failures,
+                        '\n'.join(str(row) for row in sample)))
+        raise AssertionError('{}: {}'.format(message, summary))
+
+
+    def set_local_predicates(self, enabled=True):
+        """
+        Turns in-process evaluation of `Should Intersect` on or off
+
+        When enabled, WKT/EWKT geometries are parsed and compared in Python,
+        first by bounding box and then exactly, so no query is sent to the
+        database. Geometry types that can't be handled locally (e.g. curves)
+        are still passed to the database. Returns the previous setting:
+        | ${previous} | Set Local Predicates | | |
+        | Should Intersect | LINESTRING ( 2 0, 0 2 ) | LINESTRING ( 0 0, 0 2 ) |
+        | Set Local Predicates | ${previous} | |
+
+        Results match ST_Intersects except possibly for geometries that only
+        touch within floating point precision.
+        """
+        previous = self._local_predicates
+        self._local_predicates = _is_true(enabled)
+        return previous
 
 
     def __test_intersect(self, geometryA, geometryB):
+        if self._local_predicates:
+            try:
+                return wkt_intersects(geometryA, geometryB)
+            except UnsupportedGeometry as ug:
+                logger.debug('Using database for ST_Intersects: {}'.format(
+                             ug))
+        if (isinstance(geometryA, Geometry) or
+                isinstance(geometryB, Geometry) or
+                isinstance(self._dialect, SpatiaLiteDialect)):
+            # A geometry without an SRID takes that of the other, as when
+            # compared with rows
+            sridA = self.__geometry_srid(geometryA)
+            sridB = self.__geometry_srid(geometryB)
+            return self._get_single_result('SELECT ST_Intersects({}, {});'
+                                           .format(
+                                           self.__geometry_sql(geometryA,
+                                                               sridB),
+                                           self.__geometry_sql(geometryB,
+                                                               sridA)))
         return self.call_function('ST_Intersects',
                                   self._value_to_text(geometryA),
                                   self._value_to_text(geometryB))
@@ -347,48 +2683,151 @@ class SpatialDataLibrary(DatabaseLibrary):
 
         """
         if self.__test_intersect(geometryA, geometryB):
-            raise AssertionError('Geometries do not intersect')
+            raise AssertionError('Geometries intersect')
+
+
+    def __geometry_sql(self, geometry, srid=None):
+        """
+        Returns a SQL expression for a WKT/EWKT string or Geometry.
+
+        Geometries without an SRID of their own are given `srid`, unless it
+        is None.
+        """
+        if isinstance(geometry, Geometry):
+            return self._dialect.geometry_from_binary(geometry, srid)
+        geometry = geometry.strip()
+        if geometry[:5].upper() == 'SRID=':
+            # Not every database understands EWKT, so pass the SRID apart
+            prefix, _, geometry = geometry.partition(';')
+            srid = prefix[5:]
+        return self._dialect.geometry_from_text(
+            self._value_to_text(geometry.strip()), srid)
+
+
+    def __geometry_srid(self, geometry):
+        """
+        Returns the SRID of a WKT/EWKT string or Geometry, or None.
+        """
+        if isinstance(geometry, Geometry):
+            return geometry.srid
+        geometry = geometry.strip()
+        if geometry[:5].upper() == 'SRID=':
+            return geometry.partition(';')[0][5:]
+        return None
+
+
+    def __bound_geometry(self, geometry, srid):
+        """
+        Returns (SQL, parameters) for a WKT/EWKT string or Geometry bound as
+        the parameters of a statement, see __geometry_sql.
+
+        An SRID that is an SQL expression is left in the SQL.
+        """
+        parameter = self._dialect.parameter
+        if isinstance(geometry, Geometry):
+            if geometry.srid is not None:
+                srid = geometry.srid
+            parameters = [self._dialect.binary(geometry.wkb())]
+            build = self._dialect.geometry_from_wkb
+        else:
+            geometry = geometry.strip()
+            if geometry[:5].upper() == 'SRID=':
+                prefix, _, geometry = geometry.partition(';')
+                srid = prefix[5:]
+            parameters = [geometry.strip()]
+            build = self._dialect.geometry_from_text
+        if srid is None:
+            return build(parameter(1)), parameters
+        try:
+            parameters.append(int(srid))
+            srid = parameter(2)
+        except ValueError:
+            pass
+        return build(parameter(1), srid), parameters
+
+
+    def __any_rows_match(self, geometry, source, geometry_column, srid,
+                         predicate='ST_Intersects'):
+        """
+        Returns whether `predicate` is true of `geometry` and any row of
+        `source`, using a statement prepared once per source.
+        """
+        geom, parameters = self.__bound_geometry(geometry, srid)
+        index_filter = '1 = 1'
+        if predicate == 'ST_Intersects':
+            index_filter = self.__index_filter(source, geometry_column, geom)
+        statement = '''
+            SELECT EXISTS (
+                SELECT 1
+                FROM {0}
+                WHERE {1}("{2}", {3})
+                AND {4}
+            );'''.format(self.__format_source(source), predicate,
+                         geometry_column, geom, index_filter)
+        return bool(self.__query_prepared(statement, parameters)[0][0])
 
 
     def __test_intersect_rows(self, geometry, source, geometry_column, srid,
-                              return_rows=True):
+                              return_rows=True, sample_size=None,
+                              condition=None):
 
-        if geometry[5:].upper() != 'SRID=':
-            geometry = 'SRID={};{}'.format(srid, geometry)
-        geom = self._value_to_text(geometry)
+        geom = self.__geometry_sql(geometry, srid)
         column_expr = self.__remove_geometry_from_columns(source,
                                                           geometry_column,
                                                           return_expr=True)
-        s = self.__format_source(source)
+        sampled = None
+        if not return_rows:
+            sampled = self.__sampled_source(source)
+        if sampled is None and condition is None:
+            intersects = self.__any_rows_match(geometry, source,
+                                               geometry_column, srid)
+            if return_rows and not intersects:
+                raise AssertionError('Geometry does not intersect any rows')
+            if return_rows or not intersects:
+                return
+        s = sampled or self.__format_source(source)
         intersect_sql = '''
             SELECT {0}
             FROM {1}
-            WHERE ST_Intersects("{2}", ST_GeomFromText({3}))
-            ;'''.format(column_expr, s, geometry_column, geom)
+            WHERE ST_Intersects("{2}", {3})
+            AND {4}
+            ;'''.format(column_expr, s, geometry_column, geom,
+                         self.__index_filter(source, geometry_column, geom))
 
         if return_rows:
-            self.query_should_return_rows(intersect_sql)
+            self.__rows_should_exist(intersect_sql,
+                                     'Geometry does not intersect any rows')
         else:
-            self.query_should_not_return_rows(intersect_sql)
+            self.__rows_should_not_exist(intersect_sql,
+                                         'Geometry intersects rows',
+                                         sample_size, condition=condition,
+                                         sampled=sampled)
 
 
     def __test_no_disjoint_rows(self, geometry, source, geometry_column,
-                                srid):
+                                srid, sample_size=None, chunking=None,
+                                condition=None):
 
-        if geometry[5:].upper() != 'SRID=':
-            geometry = 'SRID={};{}'.format(srid, geometry)
-        geom = self._value_to_text(geometry)
+        geom = self.__geometry_sql(geometry, srid)
         column_expr = self.__remove_geometry_from_columns(source,
                                                           geometry_column,
                                                           return_expr=True)
-        s = self.__format_source(source)
+        sampled = self.__sampled_source(source, chunking)
+        if (sampled is None and chunking is None and condition is None and
+                not self.__any_rows_match(geometry, source, geometry_column,
+                                          srid, 'ST_Disjoint')):
+            return
+        s = sampled or self.__format_source(source)
         disjoint_sql = '''
             SELECT {0}
             FROM {1}
-            WHERE ST_Disjoint("{2}", ST_GeomFromText({3}))
-            ;'''.format(column_expr, s, geometry_column, geom)
+            WHERE ST_Disjoint("{2}", {3})'''.format(column_expr, s,
+                                                    geometry_column, geom)
 
-        self.query_should_not_return_rows(disjoint_sql)
+        self.__rows_should_not_exist(disjoint_sql,
+                                     'Geometry does not intersect all rows',
+                                     sample_size, chunking, condition,
+                                     sampled)
 
 
     def should_intersect_query(self, geometry, statement,
@@ -406,13 +2845,12 @@ class SpatialDataLibrary(DatabaseLibrary):
         The `geometry_column` must be the name of the column in the results
         of the query. If not specified this defaults to GEOMETRY_COLUMN.
 
-        A single SRID for the query is assumed and the first returned row will
-        be used to obtain one for coercing `geometry` (assuming `geometry`
-        doesn't contain one).
+        If `geometry` doesn't contain an SRID it is given that of the first
+        geometry in the query, found in the same statement.
 
         """
         statement = statement.rstrip(';')
-        srid = self.get_query_SRID(statement, geometry_column)
+        srid = self.__row_srid(statement, geometry_column)
         self.__test_intersect_rows(geometry, statement, geometry_column, srid)
 
 
@@ -438,8 +2876,12 @@ class SpatialDataLibrary(DatabaseLibrary):
         contain one).
 
         """
+        schema, table = self.__staged_table(table, schema)
         if not geometry_column:
             geometry_column = self.get_geometry_column(table, schema=schema)
+        if self.__cached_intersects(geometry, (schema, table),
+                                    geometry_column):
+            return
         srid = self.get_table_SRID(table, schema=schema,
                                    geometry_column=geometry_column)
         self.__test_intersect_rows(geometry, (schema, table), geometry_column,
@@ -447,7 +2889,8 @@ class SpatialDataLibrary(DatabaseLibrary):
 
 
     def should_intersect_whole_query(self, geometry, statement,
-                               geometry_column=GEOMETRY_COLUMN):
+                               geometry_column=GEOMETRY_COLUMN,
+                               sample_size=None):
         """
         Check that `geometry` intersects all `statement` features
 
@@ -461,19 +2904,25 @@ class SpatialDataLibrary(DatabaseLibrary):
         The `geometry_column` must be the name of the column in the results
         of the query. If not specified this defaults to GEOMETRY_COLUMN.
 
-        A single SRID for the query is assumed and the first returned row will
-        be used to obtain one for coercing `geometry` (assuming `geometry`
-        doesn't contain one).
+        If `geometry` doesn't contain an SRID it is given that of the first
+        geometry in the query, found in the same statement.
+
+        On failure the number of offending rows is reported and at most
+        `sample_size` of them are logged, defaulting to the value given when
+        importing the library.
 
         """
         statement = statement.rstrip(';')
-        srid = self.get_query_SRID(statement, geometry_column)
+        srid = self.__row_srid(statement, geometry_column)
         self.__test_no_disjoint_rows(geometry, statement, geometry_column,
-                                     srid)
+                                     srid, sample_size=sample_size)
 
 
     def should_intersect_whole_table(self, geometry, table, schema=SCHEMA,
-                               geometry_column=None):
+                               geometry_column=None, sample_size=None,
+                               chunks=None, chunk_key=None, workers=4,
+                               fail_fast=False, incremental=False,
+                               watermark_column=None):
         """
         Check that `geometry` intersects with every feature in `table`
 
@@ -493,17 +2942,41 @@ class SpatialDataLibrary(DatabaseLibrary):
         obtain one for coercing `geometry` (if `geometry` itself doesn't
         contain one).
 
+        On failure the number of offending rows is reported and at most
+        `sample_size` of them are logged, defaulting to the value given when
+        importing the library.
+
+        Very large tables can be checked in `chunks` run in parallel, see
+        `Table Contains No Slivers`:
+        | Should Intersect Whole Table | ${boundary} | my_points | chunks=64 | workers=8 |
+
+        Only rows changed since the check last passed can be checked with
+        `incremental`, see `Table Contains No Slivers`.
+
         """
+        schema, table = self.__staged_table(table, schema)
         if not geometry_column:
             geometry_column = self.get_geometry_column(table, schema=schema)
         srid = self.get_table_SRID(table, schema=schema,
                                    geometry_column=geometry_column)
+        condition, save = self.__incremental(
+            (schema, table), geometry_column,
+            'intersects whole {}'.format(self.__geometry_key(geometry)),
+            incremental, watermark_column, chunk_key)
         self.__test_no_disjoint_rows(geometry, (schema, table),
-                                     geometry_column, srid)
+                                     geometry_column, srid,
+                                     sample_size=sample_size,
+                                     chunking=self.__chunking(
+                                         (schema, table), geometry_column,
+                                         chunks, chunk_key, workers,
+                                         fail_fast),
+                                     condition=condition)
+        save()
 
 
     def should_not_intersect_query(self, geometry, statement,
-                                   geometry_column=GEOMETRY_COLUMN):
+                                   geometry_column=GEOMETRY_COLUMN,
+                                   sample_size=None):
         """
         Check that `geometry` doesn't intersect with any `statement` features
 
@@ -517,19 +2990,24 @@ class SpatialDataLibrary(DatabaseLibrary):
         The `geometry_column` must be the name of the column in the results
         of the query. If not specified this defaults to GEOMETRY_COLUMN.
 
-        A single SRID for the query is assumed and the first returned row will
-        be used to obtain one for coercing `geometry` (assuming `geometry`
-        doesn't contain one).
+        If `geometry` doesn't contain an SRID it is given that of the first
+        geometry in the query, found in the same statement.
+
+        On failure the number of offending rows is reported and at most
+        `sample_size` of them are logged, defaulting to the value given when
+        importing the library.
 
         """
         statement = statement.rstrip(';')
-        srid = self.get_query_SRID(statement, geometry_column)
+        srid = self.__row_srid(statement, geometry_column)
         self.__test_intersect_rows(geometry, statement, geometry_column, srid,
-                                   return_rows=False)
+                                   return_rows=False, sample_size=sample_size)
 
 
     def should_not_intersect_table(self, geometry, table, schema=SCHEMA,
-                                   geometry_column=None):
+                                   geometry_column=None, sample_size=None,
+                                   incremental=False, watermark_column=None,
+                                   chunk_key=None):
         """
         Check that `geometry` doesn't intersect with any features in `table`
 
@@ -549,13 +3027,500 @@ class SpatialDataLibrary(DatabaseLibrary):
         obtain one for coercing `geometry` (if `geometry` itself doesn't
         contain one).
 
+        On failure the number of offending rows is reported and at most
+        `sample_size` of them are logged, defaulting to the value given when
+        importing the library.
+
+        Only rows changed since the check last passed can be checked with
+        `incremental`, see `Table Contains No Slivers`.
+
         """
+        schema, table = self.__staged_table(table, schema)
         if not geometry_column:
             geometry_column = self.get_geometry_column(table, schema=schema)
+        if (not _is_true(incremental) and
+                self.__cached_intersects(geometry, (schema, table),
+                                         geometry_column) is False):
+            return
         srid = self.get_table_SRID(table, schema=schema,
                                    geometry_column=geometry_column)
+        condition, save = self.__incremental(
+            (schema, table), geometry_column,
+            'not intersects {}'.format(self.__geometry_key(geometry)),
+            incremental, watermark_column, chunk_key)
         self.__test_intersect_rows(geometry, (schema, table), geometry_column,
-                                   srid, return_rows=False)
+                                   srid, return_rows=False,
+                                   sample_size=sample_size,
+                                   condition=condition)
+        save()
+
+
+    def __read_geometries(self, geometries):
+        """
+        Returns a list of WKT/EWKT strings or Geometry objects.
+
+        A string is taken to be the path to a file with one geometry per
+        line, blank lines and lines starting with '#' are skipped.
+        """
+        if isinstance(geometries, basestring):
+            with open(geometries) as f:
+                geometries = [line.strip() for line in f]
+        return [g for g in geometries if isinstance(g, Geometry) or
+                (g.strip() and not g.strip().startswith('#'))]
+
+
+    def __test_intersect_many(self, geometries, source, geometry_column,
+                              srid, intersect=True, sample_size=None):
+        """
+        Tests all `geometries` against `source` in a single statement.
+
+        Each geometry becomes a row of a VALUES list which is probed against
+        `source` with EXISTS so the spatial index on `source` can be used.
+
+        If `srid` is None geometries without an SRID are given that of the
+        first geometry in `source`.
+        """
+        geometries = self.__read_geometries(geometries)
+        if not geometries:
+            raise RuntimeError('No geometries supplied')
+        values = """,
+                """.join('({}, {})'.format(n, self.__geometry_sql(g, srid))
+                         for n, g in enumerate(geometries, 1))
+        s = self.__format_source(source)
+        probe = 'probe.geom'
+        if srid is None:
+            probe = '''CASE WHEN ST_SRID(probe.geom) = 0
+                    THEN {}
+                    ELSE probe.geom END'''.format(self._dialect.set_srid(
+                                             'probe.geom',
+                                             self.__row_srid(
+                                                 source, geometry_column)))
+        statement = '''
+            WITH probe(n, geom) AS (VALUES
+                {0}
+            )
+            SELECT probe.n
+            FROM probe
+            WHERE {1} EXISTS (
+                SELECT 1
+                FROM {2}
+                WHERE ST_Intersects("{3}", {5})
+                AND {4}
+            )
+            ORDER BY probe.n
+            ;'''.format(values, 'NOT' if intersect else '', s,
+                         geometry_column,
+                         self.__index_filter(source, geometry_column,
+                                             'probe.geom'),
+                         probe)
+        failed = [row[0] for row in self._query(statement)]
+        if not failed:
+            return
+        if sample_size is None:
+            sample_size = self._sample_size
+        sample_size = int(sample_size)
+        if sample_size > 0:
+            logger.info('First {} of {} failing geometries:\n{}'.format(
+                        min(sample_size, len(failed)), len(failed),
+                        '\n'.join('{}: {}'.format(n, geometries[n - 1])
+                                  for n in failed[:sample_size])))
+        positions = ', '.join(str(n) for n in failed[:max(sample_size, 1)])
+        if len(failed) > max(sample_size, 1):
+            positions += ', ...'
+        raise AssertionError('{} of {} geometries {}: {}'.format(
+                             len(failed), len(geometries),
+                             'do not intersect' if intersect else 'intersect',
+                             positions))
+
+
+    def should_all_intersect_query(self, geometries, statement,
+                                   geometry_column=GEOMETRY_COLUMN,
+                                   sample_size=None):
+        """
+        Check that every one of `geometries` intersects a `statement` feature
+
+        `geometries` is a list of WKT/EWKT strings or the path to a file
+        containing one per line. All of them are tested in a single
+        statement, for example:
+        | @{probes} | Create List | POINT ( 1 1 ) | POINT ( 2 2 ) |
+        | Should All Intersect Query | ${probes} | SELECT * FROM my_areas WHERE type = 1 |
+        | Should All Intersect Query | ${CURDIR}/probes.wkt | SELECT * FROM my_areas WHERE type = 1 |
+
+        On failure the (1-based) positions of the geometries that don't
+        intersect are reported and at most `sample_size` of them are logged.
+
+        `geometry_column` and SRID coercion are as for
+        `Should Intersect Query`.
+
+        """
+        statement = statement.rstrip(';')
+        srid = None
+        self.__test_intersect_many(geometries, statement, geometry_column,
+                                   srid, sample_size=sample_size)
+
+
+    def should_all_intersect_table(self, geometries, table, schema=SCHEMA,
+                                   geometry_column=None, sample_size=None):
+        """
+        Check that every one of `geometries` intersects a `table` feature
+
+        See `Should All Intersect Query` for `geometries` and failures:
+        | Should All Intersect Table | ${probes} | my_areas |
+        | Should All Intersect Table | ${CURDIR}/probes.wkt | my_areas |
+
+        `geometry_column` and SRID coercion are as for
+        `Should Intersect Table`.
+
+        """
+        schema, table = self.__staged_table(table, schema)
+        if not geometry_column:
+            geometry_column = self.get_geometry_column(table, schema=schema)
+        if self.__cached_intersect_many(geometries, (schema, table),
+                                        geometry_column):
+            return
+        srid = self.get_table_SRID(table, schema=schema,
+                                   geometry_column=geometry_column)
+        self.__test_intersect_many(geometries, (schema, table),
+                                   geometry_column, srid,
+                                   sample_size=sample_size)
+
+
+    def should_none_intersect_query(self, geometries, statement,
+                                    geometry_column=GEOMETRY_COLUMN,
+                                    sample_size=None):
+        """
+        Check that none of `geometries` intersect any `statement` feature
+
+        See `Should All Intersect Query` for `geometries` and failures:
+        | Should None Intersect Query | ${probes} | SELECT * FROM my_areas WHERE type = 1 |
+
+        """
+        statement = statement.rstrip(';')
+        srid = None
+        self.__test_intersect_many(geometries, statement, geometry_column,
+                                   srid, intersect=False,
+                                   sample_size=sample_size)
+
+
+    def should_none_intersect_table(self, geometries, table, schema=SCHEMA,
+                                    geometry_column=None, sample_size=None):
+        """
+        Check that none of `geometries` intersect any `table` feature
+
+        See `Should All Intersect Query` for `geometries` and failures:
+        | Should None Intersect Table | ${probes} | my_areas |
+
+        """
+        schema, table = self.__staged_table(table, schema)
+        if not geometry_column:
+            geometry_column = self.get_geometry_column(table, schema=schema)
+        if self.__cached_intersect_many(geometries, (schema, table),
+                                        geometry_column, intersect=False):
+            return
+        srid = self.get_table_SRID(table, schema=schema,
+                                   geometry_column=geometry_column)
+        self.__test_intersect_many(geometries, (schema, table),
+                                   geometry_column, srid, intersect=False,
+                                   sample_size=sample_size)
+
+
+    def __test_features(self, source, target, schema, target_schema,
+                        geometry_column, target_geometry_column, predicate,
+                        exists, message, key_column, sample_size):
+        """
+        Fails with `message` if any feature of `source` has (`exists`) or
+        hasn't a feature of `target` for which `predicate` is true.
+
+        Features are matched with a single semi or anti join on the spatial
+        index of `target` and reported by `key_column`, or all their columns
+        other than the geometry.
+        """
+        source, geometry_column = self.__resolve_source(source, schema,
+                                                        geometry_column)
+        target, target_geometry_column = self.__resolve_source(
+            target, target_schema or schema, target_geometry_column)
+        a_geom = 'a."{}"'.format(geometry_column)
+        b_geom = 'b."{}"'.format(target_geometry_column)
+        if key_column:
+            columns = 'a."{}"'.format(key_column)
+        else:
+            columns = self.__remove_geometry_from_columns(source,
+                                                          geometry_column,
+                                                          return_expr=True)
+        # Geometries without an SRID are given that of the target features,
+        # found once rather than from the row compared with so the index of
+        # `target` can still be used
+        probe = '''CASE WHEN ST_SRID({0}) = 0
+                    THEN {1}
+                    ELSE {0} END'''.format(a_geom, self._dialect.set_srid(
+                                       a_geom, self.__row_srid(
+                                           target, target_geometry_column)))
+        sampled = self.__sampled_source(source, alias='a')
+        s = sampled or self.__format_source(source, 'a')
+        statement = '''
+            SELECT {0}
+            FROM {1}
+            WHERE {2} EXISTS (
+                SELECT 1
+                FROM {3}
+                WHERE {4}({5}, {6})
+                AND {7}
+            )'''.format(columns, s, '' if exists else 'NOT',
+                         self.__format_source(target, 'b'), predicate, probe,
+                         b_geom,
+                         self.__index_filter(target, target_geometry_column,
+                                             a_geom, alias='b'))
+        self.__rows_should_not_exist(statement, message, sample_size,
+                                     sampled=sampled)
+
+
+    def every_feature_should_intersect(self, source, target, schema=SCHEMA,
+                                       target_schema=None,
+                                       geometry_column=None,
+                                       target_geometry_column=None,
+                                       key_column=None, sample_size=None):
+        """
+        Check that every `source` feature intersects a `target` feature
+
+        `source` and `target` are each a table, looked for in `schema` and
+        `target_schema` (`schema` if not given), or a SELECT query. The
+        geometry columns of tables are looked for in the database unless
+        given and those of queries default to GEOMETRY_COLUMN.
+
+        All features are checked by a single statement using the spatial
+        index of `target`. On failure the number of features not
+        intersecting is reported and at most `sample_size` of them are
+        logged, by their `key_column` if given or else all their columns
+        other than the geometry. With `Set Sampling` a sample of a `source`
+        table is checked.
+
+        Examples:
+        | Every Feature Should Intersect | my_buildings | my_parcels | |
+        | Every Feature Should Intersect | SELECT * FROM my_points WHERE type = 1 | my_areas | key_column=id |
+
+        """
+        self.__test_features(source, target, schema, target_schema,
+                             geometry_column, target_geometry_column,
+                             'ST_Intersects', False,
+                             'Features not intersecting any target feature '
+                             'found', key_column, sample_size)
+
+
+    def no_feature_should_intersect(self, source, target, schema=SCHEMA,
+                                    target_schema=None, geometry_column=None,
+                                    target_geometry_column=None,
+                                    key_column=None, sample_size=None):
+        """
+        Check that no `source` feature intersects any `target` feature
+
+        See `Every Feature Should Intersect` for the arguments and failures:
+        | No Feature Should Intersect | my_roads | my_water_bodies | key_column=id |
+
+        """
+        self.__test_features(source, target, schema, target_schema,
+                             geometry_column, target_geometry_column,
+                             'ST_Intersects', True,
+                             'Features intersecting target features found',
+                             key_column, sample_size)
+
+
+    def every_feature_should_be_within(self, source, target, schema=SCHEMA,
+                                       target_schema=None,
+                                       geometry_column=None,
+                                       target_geometry_column=None,
+                                       key_column=None, sample_size=None):
+        """
+        Check that every `source` feature is within a `target` feature
+
+        Each feature must lie within a single `target` feature, not only
+        within several together. See `Every Feature Should Intersect` for the
+        arguments and failures:
+        | Every Feature Should Be Within | my_buildings | my_parcels | key_column=id |
+
+        """
+        self.__test_features(source, target, schema, target_schema,
+                             geometry_column, target_geometry_column,
+                             'ST_Within', False,
+                             'Features not within any target feature found',
+                             key_column, sample_size)
+
+
+    def __table_checks(self, worker, table, schema, geometry_column, slivers,
+                       factor, extents, geometry, sample_size):
+        """
+        Runs the requested checks for `table` using `worker`.
+
+        Returns a dict of check name to None (passed) or an error message.
+        """
+        checks = []
+        if slivers:
+            checks.append(('slivers', lambda: worker.table_contains_no_slivers(
+                table, factor=factor, schema=schema,
+                geometry_column=geometry_column, sample_size=sample_size)))
+        if extents and table in extents:
+            checks.append(('extent', lambda: worker.table_extent_should_equal(
+                table, extents[table], schema=schema,
+                geometry_column=geometry_column)))
+        if geometry:
+            checks.append(('intersects', lambda:
+                worker.should_intersect_whole_table(
+                    geometry, table, schema=schema,
+                    geometry_column=geometry_column,
+                    sample_size=sample_size)))
+        results = {}
+        for name, check in checks:
+            try:
+                check()
+                results[name] = None
+            except Exception as e:
+                results[name] = str(e) or e.__class__.__name__
+                # Leave the connection usable after errors such as timeouts
+                try:
+                    worker._dbconnection.rollback()
+                except Exception as e:
+                    raise RuntimeError('{} failed with "{}" and the '
+                                       'connection could not be rolled back:'
+                                       ' {}'.format(name, results[name], e))
+        return results
+
+
+    def schema_should_pass_spatial_checks(self, schema=SCHEMA, workers=4,
+                                          timeout=None, fail_fast=False,
+                                          slivers=True, factor=0.05,
+                                          extents=None, geometry=None,
+                                          sample_size=None):
+        """
+        Checks every spatial table in `schema` using parallel connections
+
+        Tables are those listed in "geometry_columns" for `schema` (see
+        `Prefetch Spatial Metadata`). They are shared between `workers`
+        threads, each with its own connection opened with the same arguments
+        as the current one. For each table:
+        - `Table Contains No Slivers` is run unless `slivers` is false
+        - `Table Extent Should Equal` is run if the table is a key in the
+          `extents` dictionary, with the value as the expected extent
+        - `Should Intersect Whole Table` is run with `geometry` if given
+
+        `timeout` is a Robot Framework time (e.g. '5 minutes') and is set as
+        the statement timeout of the worker connections, so a check taking
+        longer than that fails rather than holding up the run. SQLite has no
+        statement timeout, so it is ignored with a warning there. With
+        `fail_fast` no further tables are started after the first failure.
+
+        A report is returned as a dictionary of table name to a dictionary of
+        check name to None (passed) or the error message, tables not checked
+        because of `fail_fast` are left out. A worker connection that fails
+        (e.g. is closed by the server) stops that worker, the table it was
+        checking is reported with an "error" and tables left unchecked with
+        "not checked". If any check failed then a single failure listing
+        every failing table and check is raised.
+
+        Examples:
+        | Schema Should Pass Spatial Checks | | | |
+        | ${report} | Schema Should Pass Spatial Checks | my_schema | workers=8 |
+        | ${extents} | Create Dictionary | my_areas=100000,300000,200000,400000 | |
+        | Schema Should Pass Spatial Checks | my_schema | extents=${extents} | timeout=10 minutes |
+        | Schema Should Pass Spatial Checks | my_schema | geometry=${boundary} | fail_fast=True |
+
+        """
+        fail_fast = _is_true(fail_fast)
+        slivers = _is_true(slivers)
+        factor = float(factor)
+        self.prefetch_spatial_metadata(schema)
+        tables = sorted(table for (s, table) in self._geometry_column_cache
+                        if s == schema)
+        if not tables:
+            logger.warn('No spatial tables found in {}'.format(schema))
+            return {}
+        pending = Queue()
+        for table in tables:
+            pending.put(table)
+        report = {}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        set_timeout = reset_timeout = None
+        if timeout:
+            set_timeout = self._dialect.statement_timeout(
+                timestr_to_secs(timeout) * 1000)
+            reset_timeout = self._dialect.reset_statement_timeout()
+            if set_timeout is None:
+                logger.warn('Statement timeouts are not supported by {}, '
+                            'timeout ignored'.format(self._dialect.name))
+        # Errors of worker connections outside the checks of a table, logged
+        # from this thread as Robot Framework ignores messages from others
+        worker_errors = []
+        reset_errors = []
+        failed_workers = []
+
+        def run(worker):
+            table = None
+            try:
+                if set_timeout:
+                    worker.execute_sql_string(set_timeout)
+                while not stop.is_set():
+                    try:
+                        table = pending.get_nowait()
+                    except Empty:
+                        return
+                    results = self.__table_checks(
+                        worker, table, schema,
+                        self._geometry_column_cache[(schema, table)],
+                        slivers, factor, extents, geometry, sample_size)
+                    with lock:
+                        report[table] = results
+                    table = None
+                    if fail_fast and any(results.values()):
+                        stop.set()
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+                with lock:
+                    failed_workers.append(worker)
+                    if table is None:
+                        worker_errors.append(error)
+                    else:
+                        report[table] = {'error': error}
+                if fail_fast:
+                    stop.set()
+            finally:
+                if reset_timeout:
+                    try:
+                        worker.execute_sql_string(reset_timeout)
+                    except Exception as e:
+                        reset_errors.append(str(e))
+
+        threads = [threading.Thread(target=run, args=(worker,))
+                   for worker in self._get_workers(min(int(workers),
+                                                       len(tables)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for error in reset_errors:
+            logger.warn('Could not reset the statement timeout of a worker '
+                        'connection: {}'.format(error))
+        # Opened again if needed rather than reused broken
+        self._close_workers(failed_workers)
+        if not stop.is_set():
+            # Every worker connection failed before the tables ran out
+            for table in tables:
+                if table not in report:
+                    report[table] = {'not checked': 'no worker connection '
+                                                    'left'}
+
+        failures = ['{} worker connection: {}'.format(schema, error)
+                    for error in worker_errors]
+        for table in sorted(report):
+            for check, error in sorted(report[table].items()):
+                if error:
+                    failures.append('{}.{} {}: {}'.format(schema, table, check,
+                                                         error))
+        logger.info('Checked {} of {} tables in {}, {} failures'.format(
+                    len(report), len(tables), schema, len(failures)))
+        if failures:
+            raise AssertionError('Spatial checks failed:\n{}'.format(
+                                 '\n'.join(failures)))
+        return report
 
 
     ROBOT_LIBRARY_SCOPE = 'GLOBAL'
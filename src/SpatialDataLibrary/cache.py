@@ -0,0 +1,171 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Geometries of tables held in memory, so repeated probes of the same table
+can be answered without the database.
+"""
+
+from collections import OrderedDict
+from math import ceil, sqrt
+
+from .geometry import (UnsupportedGeometry, bboxes_intersect, geometry_parts,
+                       intersects, shape_bbox)
+
+# Entries per node of an STRtree
+NODE_CAPACITY = 16
+# Rough bytes held per feature besides its WKB: the object, its bounding box
+# and its place in the tree
+FEATURE_OVERHEAD = 200
+
+
+def _union(boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+class STRtree(object):
+    """
+    A read-only R-tree of items by bounding box, packed with the
+    Sort-Tile-Recursive algorithm.
+
+    `entries` are (bbox, item) pairs, bbox being (MinX, MinY, MaxX, MaxY).
+    """
+    def __init__(self, entries, capacity=NODE_CAPACITY):
+        level = list(entries)
+        self._depth = 0
+        while len(level) > capacity:
+            level = self._pack(level, capacity)
+            self._depth += 1
+        self._root = level
+
+    def _pack(self, entries, capacity):
+        """
+        Groups `entries` into nodes of `capacity`, sorted into vertical
+        slices by X and then along each slice by Y.
+        """
+        count = int(ceil(len(entries) / float(capacity)))
+        per_slice = int(ceil(sqrt(count))) * capacity
+        entries = sorted(entries, key=lambda e: e[0][0] + e[0][2])
+        nodes = []
+        for i in range(0, len(entries), per_slice):
+            column = sorted(entries[i:i + per_slice],
+                            key=lambda e: e[0][1] + e[0][3])
+            for j in range(0, len(column), capacity):
+                children = column[j:j + capacity]
+                nodes.append((_union([c[0] for c in children]), children))
+        return nodes
+
+    def query(self, bbox):
+        """
+        Returns the items whose bounding boxes intersect `bbox`.
+        """
+        found = []
+        stack = [(self._root, self._depth)]
+        while stack:
+            entries, depth = stack.pop()
+            for box, child in entries:
+                if bboxes_intersect(box, bbox):
+                    if depth:
+                        stack.append((child, depth - 1))
+                    else:
+                        found.append(child)
+        return found
+
+
+class CachedTable(object):
+    """
+    The Geometry objects of a table with the SRID `srid`, indexed by an
+    STRtree.
+
+    `signature` is whatever identifies the version of the table loaded, or
+    None if it isn't checked for changes.
+    """
+    def __init__(self, geometries, srid=None, signature=None):
+        self.srid = srid
+        self.signature = signature
+        self.count = len(geometries)
+        self.size = sum(len(g.ewkb) + FEATURE_OVERHEAD for g in geometries)
+        # Geometries without a bounding box are either empty, which never
+        # intersect, or of types that can't be compared in-process
+        self.complete = True
+        for geometry in geometries:
+            if geometry.bbox is None:
+                try:
+                    geometry.shape()
+                except UnsupportedGeometry:
+                    self.complete = False
+                    break
+        self._tree = STRtree([(g.bbox, g) for g in geometries
+                              if g.bbox is not None])
+
+    def intersects(self, geometry):
+        """
+        Returns whether WKT/EWKT or Geometry `geometry` intersects any of
+        the geometries.
+
+        Raises UnsupportedGeometry if that can't be decided in-process.
+        """
+        if not self.complete:
+            raise UnsupportedGeometry('Table has geometries that can\'t be '
+                                      'compared in-process')
+        srid, shape = geometry_parts(geometry)
+        if srid is not None and self.srid and srid != int(self.srid):
+            raise UnsupportedGeometry('Mixed SRIDs: {} and {}'.format(
+                                      srid, self.srid))
+        bbox = shape_bbox(shape)
+        if bbox is None:
+            return False
+        for candidate in self._tree.query(bbox):
+            if intersects(shape, candidate.shape()):
+                return True
+        return False
+
+
+class GeometryCache(object):
+    """
+    CachedTables by key, the least recently used being dropped to keep
+    their total size within `max_size` bytes.
+    """
+    def __init__(self, max_size):
+        self.max_size = int(max_size)
+        self._tables = OrderedDict()
+
+    @property
+    def size(self):
+        return sum(table.size for table in self._tables.values())
+
+    def get(self, key):
+        table = self._tables.pop(key, None)
+        if table is not None:
+            self._tables[key] = table
+        return table
+
+    def put(self, key, table):
+        """
+        Adds `table`, returning the keys of those dropped to make room.
+        """
+        self._tables.pop(key, None)
+        self._tables[key] = table
+        dropped = []
+        while self.size > self.max_size:
+            dropped.append(self._tables.popitem(last=False)[0])
+        return dropped
+
+    def discard(self, key):
+        self._tables.pop(key, None)
+
+    def keys(self):
+        return list(self._tables)
+
+    def clear(self):
+        self._tables.clear()
@@ -0,0 +1,522 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+SQL that differs between the spatial databases SpatialDataLibrary supports.
+
+Each dialect only builds SQL, running it is left to the library.
+"""
+
+import re
+import sqlite3
+
+PI = '3.141592653589793'
+
+
+def _column(name, alias=None):
+    if alias:
+        return '{}."{}"'.format(alias, name)
+    return '"{}"'.format(name)
+
+
+def _rowid(alias=None):
+    return '{}.ROWID'.format(alias) if alias else 'ROWID'
+
+
+def _tile_range(expression, low, high, inclusive=False):
+    return '{0} >= {1!r} AND {0} {2} {3!r}'.format(
+        expression, float(low), '<=' if inclusive else '<', float(high))
+
+
+class PostGISDialect(object):
+    """
+    PostgreSQL with PostGIS, the default.
+    """
+    name = 'postgis'
+    # Named cursors keep large results on the server
+    server_side_cursors = True
+    # Derived tables can be given column names, e.g. AS g(geom)
+    derived_column_aliases = True
+    temporary_schema = 'pg_temp'
+    # Identifies a row of any table
+    row_id = 'ctid'
+    # Statements can be prepared by name and kept for the session
+    prepared_statements = True
+
+    def table(self, schema, table):
+        return '"{}"."{}"'.format(schema, table)
+
+    def parameter(self, n):
+        """
+        Returns the placeholder for the `n`th (from 1) parameter of a
+        statement run by the library with bound parameters.
+        """
+        return '${}'.format(n)
+
+    def prepare(self, name, statement):
+        return 'PREPARE {} AS {}'.format(name, statement.strip().rstrip(';'))
+
+    def execute_prepared(self, name, count):
+        """
+        Returns SQL running prepared statement `name` with `count`
+        parameters bound by the driver.
+        """
+        if not count:
+            return 'EXECUTE {}'.format(name)
+        return 'EXECUTE {} ({})'.format(name, ', '.join(['%s'] * count))
+
+    def deallocate(self, name):
+        return 'DEALLOCATE {}'.format(name)
+
+    def unprepared(self, statement, parameters):
+        """
+        Returns (SQL, parameters) for the driver to run a statement with
+        placeholders directly.
+        """
+        statement = re.sub(r'\$(\d+)', r'%(p\1)s',
+                           statement.replace('%', '%%'))
+        return statement, dict(('p{}'.format(n), value)
+                               for n, value in enumerate(parameters, 1))
+
+    def binary(self, data):
+        """
+        Returns `data` ready to be bound as a binary parameter.
+        """
+        return bytearray(data)
+
+    def geometry_columns(self, schema, table=None):
+        """
+        Returns SQL giving (table, geometry column, SRID) rows.
+
+        `schema` and `table` are SQL values, quoted literals or placeholders.
+        """
+        statement = '''
+            SELECT f_table_name, f_geometry_column, srid
+            FROM geometry_columns
+            WHERE f_table_schema = {} '''.format(schema)
+        if table is not None:
+            statement += "AND f_table_name = {} ".format(table)
+        return statement + 'ORDER BY f_table_name, f_geometry_column;'
+
+    def find_srid(self, schema, table, geometry_column):
+        """
+        As for geometry_columns, the arguments are SQL values.
+        """
+        return 'SELECT Find_SRID({}, {}, {})'.format(schema, table,
+                                                     geometry_column)
+
+    def extent(self, geometry_column, source):
+        """
+        Returns SQL giving MinX, MinY, MaxX, MaxY of `source` as numbers.
+        """
+        return '''
+            SELECT {0}
+            FROM {1};'''.format(self.extent_columns(geometry_column), source)
+
+    def extent_columns(self, geometry_column):
+        return '''ST_XMin(ST_Extent("{0}")),
+                ST_YMin(ST_Extent("{0}")),
+                ST_XMax(ST_Extent("{0}")),
+                ST_YMax(ST_Extent("{0}"))'''.format(geometry_column)
+
+    def estimated_extent(self, schema, table, geometry_column):
+        """
+        Returns SQL giving an approximate MinX, MinY, MaxX, MaxY of a table
+        from its statistics, NULL if it hasn't been analysed.
+        """
+        return '''
+            SELECT ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e)
+            FROM (SELECT ST_EstimatedExtent('{}', '{}', '{}') AS e)
+                AS estimate'''.format(schema, table, geometry_column)
+
+    def is_polygon(self, geometry_column):
+        return ('ST_GeometryType({0}) IN (\'ST_Polygon\', '
+                '\'ST_MultiPolygon\')'.format(geometry_column))
+
+    def pi(self):
+        return 'pi()'
+
+    def floor(self, expression):
+        return 'floor({})'.format(expression)
+
+    def geometry_from_text(self, wkt, srid=None):
+        """
+        `wkt` must already be a quoted SQL literal.
+        """
+        if srid is None:
+            return 'ST_GeomFromText({})'.format(wkt)
+        return 'ST_GeomFromText({}, {})'.format(wkt, srid)
+
+    def geometry_from_wkb(self, wkb, srid=None):
+        """
+        `wkb` and `srid` are SQL values, used for bound parameters.
+        """
+        if srid is None:
+            return 'ST_GeomFromWKB({})'.format(wkb)
+        return 'ST_GeomFromWKB({}, {})'.format(wkb, srid)
+
+    def geometry_from_binary(self, geometry, srid=None):
+        expression = "ST_GeomFromEWKB(decode('{}', 'hex'))".format(
+                     geometry.hex())
+        if geometry.srid is None and srid is not None:
+            expression = self.set_srid(expression, srid)
+        return expression
+
+    def set_srid(self, geometry, srid):
+        return 'ST_SetSRID({}, {})'.format(geometry, srid)
+
+    def as_binary(self, geometry):
+        """
+        Returns SQL giving (EWKB, SRID) for a geometry expression.
+        """
+        return 'ST_AsEWKB({0}), ST_SRID({0})'.format(geometry)
+
+    def modification_signature(self, schema, table):
+        """
+        Returns SQL giving a row that changes when rows of a table are
+        inserted, updated or deleted.
+        """
+        # The statistics are updated shortly after changes are committed
+        return '''
+            SELECT n_tup_ins, n_tup_upd, n_tup_del
+            FROM pg_stat_all_tables
+            WHERE relid = '"{}"."{}"'::regclass;'''.format(schema, table)
+
+    def spatial_index(self, schema, table, geometry_column):
+        """
+        Returns SQL returning a row if a spatial index has to be named in
+        queries for it to be used, or None if the planner finds it itself.
+        """
+        return None
+
+    def index_filter(self, schema, table, geometry_column, geometry,
+                     alias=None):
+        return None
+
+    def bbox_intersects(self, geometryA, geometryB):
+        return '{} && {}'.format(geometryA, geometryB)
+
+    def envelope(self, xmin, ymin, xmax, ymax, srid=None):
+        bounds = ', '.join(repr(float(b)) for b in (xmin, ymin, xmax, ymax))
+        if srid is None:
+            return 'ST_MakeEnvelope({})'.format(bounds)
+        return 'ST_MakeEnvelope({}, {})'.format(bounds, srid)
+
+    def tile_filter(self, geometry_column, envelope, xmin, ymin, xmax, ymax,
+                    last_x=False, last_y=False, alias=None):
+        """
+        Returns a condition selecting geometries whose bounding box lower
+        left corner lies in a tile, so every geometry is in exactly one tile
+        of a grid. Upper bounds are only inclusive for the last column and
+        row of tiles.
+        """
+        column = _column(geometry_column, alias)
+        return '''{0} && {1}
+                AND {2}
+                AND {3}'''.format(
+            column, envelope,
+            _tile_range('ST_XMin({})'.format(column), xmin, xmax, last_x),
+            _tile_range('ST_YMin({})'.format(column), ymin, ymax, last_y))
+
+    def tablesample(self, method, percent, seed):
+        """
+        Returns the clause following a table to sample about `percent` of
+        its rows repeatably, or None if sampling isn't supported.
+        """
+        return 'TABLESAMPLE {} ({!r}) REPEATABLE ({})'.format(
+            method, float(percent), int(seed))
+
+    def row_hash(self, geometry_column, columns=()):
+        """
+        Returns SQL hashing the WKB of a row's geometry, and the already
+        quoted `columns` if any.
+        """
+        geometry = "coalesce(md5(ST_AsBinary(\"{}\")), '')".format(
+            geometry_column)
+        if not columns:
+            return geometry
+        return 'md5(ROW({})::text || {})'.format(', '.join(columns),
+                                                 geometry)
+
+    def chunk_hashes(self, source, key, geometry_column, size, columns=()):
+        """
+        Returns SQL giving (chunk, hash) rows for the geometries (and
+        `columns`) of `source` in each range of `size` values of the integer
+        `key` column.
+        """
+        return '''
+            SELECT
+                "{1}" / {3} AS chunk,
+                md5(string_agg(
+                    "{1}"::text || ':' || {2},
+                    ',' ORDER BY "{1}"
+                ))
+            FROM {0}
+            GROUP BY 1;'''.format(source, key,
+                                  self.row_hash(geometry_column, columns),
+                                  size)
+
+    def stage(self, table, statement, geometry_column):
+        """
+        Returns statements copying the results of `statement` into a
+        temporary `table` ready to be queried repeatedly.
+        """
+        return [
+            'CREATE TEMPORARY TABLE "{}" AS {}'.format(table, statement),
+            'CREATE INDEX ON pg_temp."{}" USING GIST ("{}")'.format(
+                table, geometry_column),
+            'ANALYZE pg_temp."{}"'.format(table),
+        ]
+
+    def statement_timeout(self, milliseconds):
+        return 'SET statement_timeout = {}'.format(int(milliseconds))
+
+    def reset_statement_timeout(self):
+        return 'RESET statement_timeout'
+
+    def explain(self, statement, analyze=False):
+        """
+        Returns SQL giving the plan of `statement`, run to time it if
+        `analyze` is true.
+        """
+        if analyze:
+            return 'EXPLAIN (ANALYZE, BUFFERS) {};'.format(statement)
+        return 'EXPLAIN {};'.format(statement)
+
+
+class SpatiaLiteDialect(PostGISDialect):
+    """
+    SQLite with the SpatiaLite extension loaded.
+
+    Schemas are SQLite database names, so the default 'public' is taken to
+    mean the main database.
+    """
+    name = 'spatialite'
+    server_side_cursors = False
+    derived_column_aliases = False
+    temporary_schema = 'temp'
+    row_id = 'ROWID'
+    # sqlite3 keeps the statements it has compiled itself
+    prepared_statements = False
+
+    def table(self, schema, table):
+        if schema in (None, '', 'public', 'main'):
+            return '"{}"'.format(table)
+        return '"{}"."{}"'.format(schema, table)
+
+    def parameter(self, n):
+        return '?{}'.format(n)
+
+    def unprepared(self, statement, parameters):
+        # sqlite3 wants exactly as many as the highest ?n, and the schema
+        # isn't always used
+        used = [int(n) for n in re.findall(r'\?(\d+)', statement)]
+        return statement, list(parameters)[:max(used or [0])]
+
+    def binary(self, data):
+        return sqlite3.Binary(data)
+
+    def geometry_columns(self, schema, table=None):
+        statement = '''
+            SELECT f_table_name, f_geometry_column, srid
+            FROM geometry_columns '''
+        if table is not None:
+            statement += "WHERE lower(f_table_name) = lower({}) ".format(
+                         table)
+        return statement + 'ORDER BY f_table_name, f_geometry_column;'
+
+    def find_srid(self, schema, table, geometry_column):
+        return '''
+            SELECT srid
+            FROM geometry_columns
+            WHERE lower(f_table_name) = lower({})
+            AND lower(f_geometry_column) = lower({});'''.format(
+            table, geometry_column)
+
+    def extent_columns(self, geometry_column):
+        return '''MbrMinX(Extent("{0}")),
+                MbrMinY(Extent("{0}")),
+                MbrMaxX(Extent("{0}")),
+                MbrMaxY(Extent("{0}"))'''.format(geometry_column)
+
+    def estimated_extent(self, schema, table, geometry_column):
+        # From the layer statistics, see UpdateLayerStatistics()
+        return '''
+            SELECT MbrMinX(e), MbrMinY(e), MbrMaxX(e), MbrMaxY(e)
+            FROM (SELECT GetLayerExtent('{}', '{}') AS e)
+                AS estimate'''.format(table, geometry_column)
+
+    def is_polygon(self, geometry_column):
+        return ("GeometryType({0}) IN ('POLYGON', 'MULTIPOLYGON', "
+                "'POLYGON Z', 'MULTIPOLYGON Z', 'POLYGON M', "
+                "'MULTIPOLYGON M', 'POLYGON ZM', 'MULTIPOLYGON ZM')".format(
+                geometry_column))
+
+    def pi(self):
+        # pi() is only available when SQLite is built with maths functions
+        return PI
+
+    def floor(self, expression):
+        # As for pi(), only used with values that aren't negative
+        return 'CAST({} AS INTEGER)'.format(expression)
+
+    def geometry_from_binary(self, geometry, srid=None):
+        if geometry.srid is not None:
+            srid = geometry.srid
+        if srid is None:
+            return "ST_GeomFromWKB(X'{}')".format(geometry.wkb_hex())
+        return "ST_GeomFromWKB(X'{}', {})".format(geometry.wkb_hex(), srid)
+
+    def set_srid(self, geometry, srid):
+        return 'SetSRID({}, {})'.format(geometry, srid)
+
+    def as_binary(self, geometry):
+        return 'AsBinary({0}), ST_SRID({0})'.format(geometry)
+
+    def modification_signature(self, schema, table):
+        # Changes made through this connection and commits by any other,
+        # to any table
+        return '''
+            SELECT total_changes(), data_version
+            FROM pragma_data_version;'''
+
+    def spatial_index(self, schema, table, geometry_column):
+        return '''
+            SELECT 1
+            FROM geometry_columns
+            WHERE lower(f_table_name) = lower('{}')
+            AND lower(f_geometry_column) = lower('{}')
+            AND spatial_index_enabled = 1;'''.format(table, geometry_column)
+
+    def index_filter(self, schema, table, geometry_column, geometry,
+                     alias=None):
+        return '''{} IN (
+                    SELECT ROWID
+                    FROM SpatialIndex
+                    WHERE f_table_name = '{}'
+                    AND f_geometry_column = '{}'
+                    AND search_frame = {}
+                )'''.format(_rowid(alias), table,
+                            geometry_column, geometry)
+
+    def envelope(self, xmin, ymin, xmax, ymax, srid=None):
+        bounds = ', '.join(repr(float(b)) for b in (xmin, ymin, xmax, ymax))
+        if srid is None:
+            return 'BuildMbr({})'.format(bounds)
+        return 'BuildMbr({}, {})'.format(bounds, srid)
+
+    def bbox_intersects(self, geometryA, geometryB):
+        return 'MbrIntersects({}, {})'.format(geometryA, geometryB)
+
+    def tile_filter(self, geometry_column, envelope, xmin, ymin, xmax, ymax,
+                    last_x=False, last_y=False, alias=None):
+        # The spatial index is added by the library, see index_filter
+        column = _column(geometry_column, alias)
+        return '''{0}
+                AND {1}'''.format(
+            _tile_range('MbrMinX({})'.format(column), xmin, xmax, last_x),
+            _tile_range('MbrMinY({})'.format(column), ymin, ymax, last_y))
+
+    def tablesample(self, method, percent, seed):
+        return None
+
+    def row_hash(self, geometry_column, columns=()):
+        geometry = "coalesce(MD5Checksum(AsBinary(\"{}\")), '')".format(
+            geometry_column)
+        if not columns:
+            return geometry
+        return "MD5Checksum(CAST({} || ',' || {} AS BLOB))".format(
+            " || ',' || ".join('quote({})'.format(c) for c in columns),
+            geometry)
+
+    def chunk_hashes(self, source, key, geometry_column, size, columns=()):
+        # group_concat follows the order of the subquery
+        return '''
+            SELECT chunk, MD5Checksum(CAST(group_concat(row, ',') AS BLOB))
+            FROM (
+                SELECT
+                    "{1}" / {3} AS chunk,
+                    "{1}" || ':' || {2} AS row
+                FROM {0}
+                ORDER BY "{1}"
+            ) AS rows
+            GROUP BY chunk;'''.format(source, key,
+                                      self.row_hash(geometry_column, columns),
+                                      size)
+
+    def stage(self, table, statement, geometry_column):
+        # Spatial indexes can only be added to registered geometry columns,
+        # which temporary tables can't have
+        return ['CREATE TEMP TABLE "{}" AS {}'.format(table, statement)]
+
+    def statement_timeout(self, milliseconds):
+        return None
+
+    def reset_statement_timeout(self):
+        return None
+
+    def explain(self, statement, analyze=False):
+        return None
+
+
+class GeoPackageDialect(SpatiaLiteDialect):
+    """
+    A GeoPackage opened through SpatiaLite in amphibious mode.
+
+    The GeoPackage R-tree indexes are used for intersection tests and the
+    bounds recorded in gpkg_contents for estimated table extents.
+    """
+    name = 'geopackage'
+
+    def geometry_columns(self, schema, table=None):
+        statement = '''
+            SELECT table_name, column_name, srs_id
+            FROM gpkg_geometry_columns '''
+        if table is not None:
+            statement += "WHERE lower(table_name) = lower({}) ".format(
+                         table)
+        return statement + 'ORDER BY table_name, column_name;'
+
+    def find_srid(self, schema, table, geometry_column):
+        return '''
+            SELECT srs_id
+            FROM gpkg_geometry_columns
+            WHERE lower(table_name) = lower({})
+            AND lower(column_name) = lower({});'''.format(
+            table, geometry_column)
+
+    def estimated_extent(self, schema, table, geometry_column):
+        # As recorded by whoever wrote the file
+        return '''
+            SELECT min_x, min_y, max_x, max_y
+            FROM gpkg_contents
+            WHERE lower(table_name) = lower('{}')'''.format(table)
+
+    def spatial_index(self, schema, table, geometry_column):
+        return '''
+            SELECT 1
+            FROM gpkg_extensions
+            WHERE lower(table_name) = lower('{}')
+            AND lower(column_name) = lower('{}')
+            AND extension_name = 'gpkg_rtree_index';'''.format(
+            table, geometry_column)
+
+    def index_filter(self, schema, table, geometry_column, geometry,
+                     alias=None):
+        # GeoPackage R-tree ids are the rowids of the feature table
+        return '''{3} IN (
+                    SELECT id
+                    FROM "rtree_{0}_{1}"
+                    WHERE minx <= MbrMaxX({2}) AND maxx >= MbrMinX({2})
+                    AND miny <= MbrMaxY({2}) AND maxy >= MbrMinY({2})
+                )'''.format(table, geometry_column, geometry,
+                            _rowid(alias))
@@ -0,0 +1,694 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+In-process handling of WKT/EWKT geometries.
+
+Only the simple feature types (points, lines, polygons, their multi
+versions and collections of them) are understood. Anything else raises
+UnsupportedGeometry so that callers can fall back to the database.
+"""
+
+import binascii
+import re
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+_TOKEN = re.compile(r'''
+    (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    | (?P<word>[A-Za-z]+)
+    | (?P<symbol>[(),])
+    ''', re.X)
+
+# Coordinates are reduced to (x, y), Z and M values play no part in the
+# 2D predicates
+Shape = namedtuple('Shape', 'points lines polygons')
+
+WKB_TYPES = {1: 'POINT', 2: 'LINESTRING', 3: 'POLYGON', 4: 'MULTIPOINT',
+             5: 'MULTILINESTRING', 6: 'MULTIPOLYGON',
+             7: 'GEOMETRYCOLLECTION'}
+
+_STRING_TYPES = (type(''), type(u''))
+
+
+class UnsupportedGeometry(ValueError):
+    """
+    Raised for geometries that can't be evaluated in-process.
+    """
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    for match in _TOKEN.finditer(text):
+        if text[position:match.start()].strip():
+            raise UnsupportedGeometry('Cannot parse WKT near: {}'.format(
+                                      text[position:match.start()][:20]))
+        position = match.end()
+        if match.group('number'):
+            tokens.append(float(match.group('number')))
+        else:
+            tokens.append((match.group('word') or
+                           match.group('symbol')).upper())
+    if text[position:].strip():
+        raise UnsupportedGeometry('Cannot parse WKT near: {}'.format(
+                                  text[position:][:20]))
+    return tokens
+
+
+class _Parser(object):
+    """
+    Recursive descent parser producing a flattened Shape.
+    """
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.position = 0
+        self.points = []
+        self.lines = []
+        self.polygons = []
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token != expected):
+            raise UnsupportedGeometry('Expected {} but found {}'.format(
+                                      expected or 'more WKT', token))
+        self.position += 1
+        return token
+
+    def parse(self):
+        self.geometry()
+        if self.peek() is not None:
+            raise UnsupportedGeometry('Unexpected trailing WKT')
+        return Shape(self.points, self.lines, self.polygons)
+
+    def geometry(self):
+        geometry_type = self.take()
+        if isinstance(geometry_type, float) or geometry_type in '(),':
+            raise UnsupportedGeometry('Expected a geometry type')
+        # Dimension markers, e.g. 'POINT Z' or 'POINTZM'
+        if self.peek() in ('Z', 'M', 'ZM'):
+            self.take()
+        geometry_type = re.sub('(ZM|Z|M)$', '', geometry_type)
+        if self.peek() == 'EMPTY':
+            self.take()
+            return
+        if geometry_type == 'POINT':
+            self.take('(')
+            self.points.append(self.coordinate())
+            self.take(')')
+        elif geometry_type == 'LINESTRING':
+            self.lines.append(self.coordinates())
+        elif geometry_type == 'POLYGON':
+            rings = self.rings()
+            if rings:
+                self.polygons.append(rings)
+        elif geometry_type == 'MULTIPOINT':
+            self.take('(')
+            while True:
+                # Both 'MULTIPOINT (1 2, 3 4)' and 'MULTIPOINT ((1 2))'
+                if self.peek() == '(':
+                    self.take('(')
+                    self.points.append(self.coordinate())
+                    self.take(')')
+                elif self.peek() == 'EMPTY':
+                    self.take()
+                else:
+                    self.points.append(self.coordinate())
+                if self.peek() != ',':
+                    break
+                self.take(',')
+            self.take(')')
+        elif geometry_type == 'MULTILINESTRING':
+            for line in self.members(self.coordinates):
+                self.lines.append(line)
+        elif geometry_type == 'MULTIPOLYGON':
+            for polygon in self.members(self.rings):
+                self.polygons.append(polygon)
+        elif geometry_type == 'GEOMETRYCOLLECTION':
+            self.members(self.geometry)
+        else:
+            raise UnsupportedGeometry('Unsupported geometry type: {}'.format(
+                                      geometry_type))
+
+    def members(self, parse_member):
+        self.take('(')
+        members = []
+        while True:
+            if self.peek() == 'EMPTY':
+                self.take()
+            else:
+                members.append(parse_member())
+            if self.peek() != ',':
+                break
+            self.take(',')
+        self.take(')')
+        return [m for m in members if m]
+
+    def coordinate(self):
+        values = []
+        while isinstance(self.peek(), float):
+            values.append(self.take())
+        if len(values) < 2:
+            raise UnsupportedGeometry('Coordinate needs at least X and Y')
+        return (values[0], values[1])
+
+    def coordinates(self):
+        self.take('(')
+        coordinates = [self.coordinate()]
+        while self.peek() == ',':
+            self.take(',')
+            coordinates.append(self.coordinate())
+        self.take(')')
+        return coordinates
+
+    def rings(self):
+        return self.members(self.coordinates)
+
+
+def parse_wkt(text):
+    """
+    Parses WKT or EWKT, returning (srid, shape).
+
+    `srid` is None unless `text` starts with 'SRID=n;'.
+    """
+    text = text.strip()
+    srid = None
+    if text[:5].upper() == 'SRID=':
+        prefix, _, text = text.partition(';')
+        try:
+            srid = int(prefix[5:])
+        except ValueError:
+            raise UnsupportedGeometry('Invalid SRID: {}'.format(prefix))
+    return srid, _Parser(text).parse()
+
+
+def _extend_bbox(bbox, coordinates):
+    for x, y in coordinates:
+        if bbox is None:
+            bbox = [x, y, x, y]
+        else:
+            if x < bbox[0]:
+                bbox[0] = x
+            if y < bbox[1]:
+                bbox[1] = y
+            if x > bbox[2]:
+                bbox[2] = x
+            if y > bbox[3]:
+                bbox[3] = y
+    return bbox
+
+
+def shape_bbox(shape):
+    """
+    Returns (MinX, MinY, MaxX, MaxY) of `shape`, or None if it is empty.
+    """
+    bbox = _extend_bbox(None, shape.points)
+    for line in shape.lines:
+        bbox = _extend_bbox(bbox, line)
+    for polygon in shape.polygons:
+        bbox = _extend_bbox(bbox, polygon[0])
+    return tuple(bbox) if bbox else None
+
+
+def bboxes_intersect(a, b):
+    return not (a[2] < b[0] or b[2] < a[0] or a[3] < b[1] or b[3] < a[1])
+
+
+def _orientation(p, q, r):
+    value = (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+    if value > 0:
+        return 1
+    if value < 0:
+        return -1
+    return 0
+
+
+def _on_segment(p, q, r):
+    """
+    For collinear p, q, r: is r within the bounds of segment pq?
+    """
+    return (min(p[0], q[0]) <= r[0] <= max(p[0], q[0]) and
+            min(p[1], q[1]) <= r[1] <= max(p[1], q[1]))
+
+
+def _segments_intersect(p1, p2, q1, q2):
+    o1 = _orientation(p1, p2, q1)
+    o2 = _orientation(p1, p2, q2)
+    o3 = _orientation(q1, q2, p1)
+    o4 = _orientation(q1, q2, p2)
+    if o1 != o2 and o3 != o4:
+        return True
+    return ((o1 == 0 and _on_segment(p1, p2, q1)) or
+            (o2 == 0 and _on_segment(p1, p2, q2)) or
+            (o3 == 0 and _on_segment(q1, q2, p1)) or
+            (o4 == 0 and _on_segment(q1, q2, p2)))
+
+
+def _segments(coordinates, bbox=None):
+    """
+    Yields the segments of `coordinates`, optionally only those whose
+    bounding box intersects `bbox`.
+    """
+    if len(coordinates) == 1:
+        coordinates = coordinates * 2
+    for i in range(len(coordinates) - 1):
+        p, q = coordinates[i], coordinates[i + 1]
+        if bbox is None or bboxes_intersect(
+                (min(p[0], q[0]), min(p[1], q[1]),
+                 max(p[0], q[0]), max(p[1], q[1])), bbox):
+            yield p, q
+
+
+def _paths_intersect(a, b):
+    bbox_a = tuple(_extend_bbox(None, a))
+    bbox_b = tuple(_extend_bbox(None, b))
+    if not bboxes_intersect(bbox_a, bbox_b):
+        return False
+    segments_b = list(_segments(b, bbox_a))
+    for p1, p2 in _segments(a, bbox_b):
+        for q1, q2 in segments_b:
+            if _segments_intersect(p1, p2, q1, q2):
+                return True
+    return False
+
+
+def _point_in_ring(point, ring):
+    """
+    Returns 1 if `point` is inside `ring`, 0 if on its boundary, else -1.
+    """
+    x, y = point
+    inside = False
+    for p, q in _segments(ring):
+        if _orientation(p, q, point) == 0 and _on_segment(p, q, point):
+            return 0
+        if (p[1] > y) != (q[1] > y):
+            cross = p[0] + (y - p[1]) * (q[0] - p[0]) / (q[1] - p[1])
+            if x < cross:
+                inside = not inside
+    return 1 if inside else -1
+
+
+def _point_in_polygon(point, polygon):
+    """
+    True if `point` is in the interior or on the boundary of `polygon`.
+    """
+    location = _point_in_ring(point, polygon[0])
+    if location < 0:
+        return False
+    if location == 0:
+        return True
+    for hole in polygon[1:]:
+        location = _point_in_ring(point, hole)
+        if location == 0:
+            return True
+        if location > 0:
+            return False
+    return True
+
+
+def _path_intersects_polygon(path, polygon):
+    for ring in polygon:
+        if _paths_intersect(path, ring):
+            return True
+    # No boundary crossings, so the path is either wholly inside or
+    # wholly outside the polygon
+    return _point_in_polygon(path[0], polygon)
+
+
+def _polygons_intersect(a, b):
+    for ring in a:
+        if _path_intersects_polygon(ring, b):
+            return True
+    return _point_in_polygon(b[0][0], a)
+
+
+def intersects(a, b):
+    """
+    Returns whether shapes `a` and `b` share at least one point.
+    """
+    bbox_a = shape_bbox(a)
+    bbox_b = shape_bbox(b)
+    if bbox_a is None or bbox_b is None:
+        return False
+    if not bboxes_intersect(bbox_a, bbox_b):
+        return False
+    for point in a.points:
+        for other in b.points:
+            if point == other:
+                return True
+        for line in b.lines:
+            if _paths_intersect([point], line):
+                return True
+        for polygon in b.polygons:
+            if _point_in_polygon(point, polygon):
+                return True
+    for line in a.lines:
+        for point in b.points:
+            if _paths_intersect(line, [point]):
+                return True
+        for other in b.lines:
+            if _paths_intersect(line, other):
+                return True
+        for polygon in b.polygons:
+            if _path_intersects_polygon(line, polygon):
+                return True
+    for polygon in a.polygons:
+        for point in b.points:
+            if _point_in_polygon(point, polygon):
+                return True
+        for line in b.lines:
+            if _path_intersects_polygon(line, polygon):
+                return True
+        for other in b.polygons:
+            if _polygons_intersect(polygon, other):
+                return True
+    return False
+
+
+def wkt_intersects(a, b):
+    """
+    Returns whether geometries `a` and `b` intersect.
+
+    Either may be WKT/EWKT or a Geometry. Two Geometry objects whose
+    bounding boxes don't meet are compared without being parsed.
+
+    Raises UnsupportedGeometry if either can't be handled in-process or
+    they have different SRIDs (which the database would reject).
+    """
+    if (isinstance(a, Geometry) and isinstance(b, Geometry) and
+            a.bbox is not None and b.bbox is not None and
+            (a.srid is None or b.srid is None or a.srid == b.srid) and
+            not bboxes_intersect(a.bbox, b.bbox)):
+        return False
+    srid_a, shape_a = geometry_parts(a)
+    srid_b, shape_b = geometry_parts(b)
+    if srid_a is not None and srid_b is not None and srid_a != srid_b:
+        raise UnsupportedGeometry('Mixed SRIDs: {} and {}'.format(srid_a,
+                                                                 srid_b))
+    return intersects(shape_a, shape_b)
+
+
+class _WkbReader(object):
+    """
+    Reads (E)WKB into a flattened Shape.
+
+    With `bbox_only` only the bounding box is found, no Shape is built.
+    """
+    def __init__(self, data, bbox_only=False):
+        self.data = data
+        self.offset = 0
+        self.srid = None
+        self.bbox_only = bbox_only
+        self.bbox = None
+        self.points = []
+        self.lines = []
+        self.polygons = []
+
+    def unpack(self, fmt, size):
+        values = struct.unpack_from(self.byte_order + fmt, self.data,
+                                    self.offset)
+        self.offset += size
+        return values
+
+    def header(self):
+        byte_order, = struct.unpack_from('B', self.data, self.offset)
+        self.byte_order = '<' if byte_order == 1 else '>'
+        self.offset += 1
+        geometry_type, = self.unpack('I', 4)
+        has_z = bool(geometry_type & 0x80000000)
+        has_m = bool(geometry_type & 0x40000000)
+        if geometry_type & 0x20000000:
+            self.srid, = self.unpack('i', 4)
+        geometry_type &= 0x0FFFFFFF
+        # ISO WKB uses 1000s for Z, 2000s for M and 3000s for ZM
+        has_z = has_z or geometry_type // 1000 in (1, 3)
+        has_m = has_m or geometry_type // 1000 in (2, 3)
+        self.ordinates = ('Z' if has_z else '') + ('M' if has_m else '')
+        return geometry_type % 1000, 2 + has_z + has_m
+
+    def values(self, count):
+        """
+        Returns the next `count` doubles as an array.
+        """
+        end = self.offset + 8 * count
+        if end > len(self.data):
+            raise struct.error('Truncated coordinates')
+        values = array('d')
+        if hasattr(values, 'frombytes'):
+            values.frombytes(self.data[self.offset:end])
+        else:
+            values.fromstring(self.data[self.offset:end])
+        if (self.byte_order == '<') != (sys.byteorder == 'little'):
+            values.byteswap()
+        self.offset = end
+        return values
+
+    def coordinates(self, dimensions, count=None):
+        if count is None:
+            count, = self.unpack('I', 4)
+        values = self.values(dimensions * count)
+        # An empty point is stored with NaN coordinates
+        if not count or (count == 1 and values[0] != values[0]):
+            return []
+        xs = values[0::dimensions]
+        ys = values[1::dimensions]
+        if self.bbox_only:
+            self.extend_bbox((min(xs), min(ys), max(xs), max(ys)))
+            return []
+        return list(zip(xs, ys))
+
+    def extend_bbox(self, bbox):
+        if self.bbox is None:
+            self.bbox = bbox
+        else:
+            self.bbox = (min(self.bbox[0], bbox[0]),
+                         min(self.bbox[1], bbox[1]),
+                         max(self.bbox[2], bbox[2]),
+                         max(self.bbox[3], bbox[3]))
+
+    def parse(self):
+        self.geometry()
+        return Shape(self.points, self.lines, self.polygons)
+
+    def geometry(self):
+        geometry_type, dimensions = self.header()
+        if geometry_type == 1:
+            point = self.coordinates(dimensions, 1)
+            if point:
+                self.points.append(point[0])
+        elif geometry_type == 2:
+            line = self.coordinates(dimensions)
+            if line:
+                self.lines.append(line)
+        elif geometry_type == 3:
+            rings, = self.unpack('I', 4)
+            polygon = [self.coordinates(dimensions) for _ in range(rings)]
+            if polygon:
+                self.polygons.append(polygon)
+        elif geometry_type in (4, 5, 6, 7):
+            members, = self.unpack('I', 4)
+            for _ in range(members):
+                self.geometry()
+        else:
+            raise UnsupportedGeometry('Unsupported WKB geometry type: {}'
+                                      .format(geometry_type))
+
+    def wkt(self, tagged=True):
+        """
+        Returns the next geometry as WKT, formatted as by ST_AsText.
+
+        Members of multi geometries aren't `tagged` with their type.
+        """
+        geometry_type, dimensions = self.header()
+        if geometry_type not in WKB_TYPES:
+            raise UnsupportedGeometry('Unsupported WKB geometry type: {}'
+                                      .format(geometry_type))
+        name = ''
+        if tagged:
+            name = WKB_TYPES[geometry_type]
+            if self.ordinates:
+                name += ' {} '.format(self.ordinates)
+        empty = '{} EMPTY'.format(name.rstrip()).lstrip()
+        if geometry_type == 1:
+            values = self.values(dimensions)
+            if values[0] != values[0]:
+                return empty
+            return '{}({})'.format(name, _format_coordinate(values))
+        count, = self.unpack('I', 4)
+        if not count:
+            return empty
+        if geometry_type == 2:
+            return name + self.path(dimensions, count)
+        if geometry_type == 3:
+            parts = [self.path(dimensions) for _ in range(count)]
+        else:
+            parts = [self.wkt(tagged=geometry_type == 7)
+                     for _ in range(count)]
+        return '{}({})'.format(name, ','.join(parts))
+
+    def path(self, dimensions, count=None):
+        if count is None:
+            count, = self.unpack('I', 4)
+        values = self.values(dimensions * count)
+        return '({})'.format(','.join(
+            _format_coordinate(values[n:n + dimensions])
+            for n in range(0, len(values), dimensions)))
+
+
+def _format_number(value):
+    text = repr(float(value))
+    if text.endswith('.0'):
+        text = text[:-2]
+    return text
+
+
+def _format_coordinate(values):
+    return ' '.join(_format_number(value) for value in values)
+
+
+def parse_ewkb(data):
+    """
+    Parses WKB or EWKB, returning (srid, shape).
+
+    `srid` is None unless `data` is EWKB with an SRID.
+    """
+    reader = _WkbReader(data)
+    try:
+        shape = reader.parse()
+    except struct.error:
+        raise UnsupportedGeometry('Truncated WKB')
+    return reader.srid, shape
+
+
+class Geometry(object):
+    """
+    A geometry held as EWKB, as returned by `Get Geometry`.
+
+    Keywords that take a geometry accept this in place of WKT, in which case
+    it is sent back to the database as binary with its SRID. Converted to a
+    string it is WKT, as given by ST_AsText, and it compares equal to that
+    text.
+
+    The bounding box (None if empty or of an unsupported type) is found when
+    created, coordinates are only read again when the geometry is compared
+    in-process.
+    """
+    __slots__ = ('ewkb', 'srid', 'bbox')
+
+    def __init__(self, ewkb):
+        self.ewkb = bytes(ewkb)
+        reader = _WkbReader(self.ewkb, bbox_only=True)
+        try:
+            reader.parse()
+            self.bbox = reader.bbox
+        except (UnsupportedGeometry, struct.error):
+            # Curves etc. are still passed to the database
+            self.bbox = None
+        self.srid = parse_ewkb_srid(self.ewkb)
+
+    @classmethod
+    def from_wkb(cls, wkb, srid=None):
+        """
+        Builds a Geometry from plain WKB and an SRID.
+        """
+        wkb = bytes(wkb)
+        if srid is None:
+            return cls(wkb)
+        byte_order = '<' if bytearray(wkb[:1])[0] == 1 else '>'
+        geometry_type, = struct.unpack_from(byte_order + 'I', wkb, 1)
+        return cls(wkb[:1] +
+                   struct.pack(byte_order + 'Ii', geometry_type | 0x20000000,
+                               int(srid)) +
+                   wkb[5:])
+
+    def wkb(self):
+        """
+        Returns the geometry as WKB, without the SRID.
+        """
+        if self.srid is None:
+            return self.ewkb
+        byte_order = '<' if bytearray(self.ewkb[:1])[0] == 1 else '>'
+        geometry_type, = struct.unpack_from(byte_order + 'I', self.ewkb, 1)
+        return (self.ewkb[:1] +
+                struct.pack(byte_order + 'I', geometry_type & ~0x20000000) +
+                self.ewkb[9:])
+
+    def hex(self):
+        return binascii.hexlify(self.ewkb).decode('ascii')
+
+    def wkb_hex(self):
+        return binascii.hexlify(self.wkb()).decode('ascii')
+
+    def shape(self):
+        return parse_ewkb(self.ewkb)[1]
+
+    def wkt(self):
+        try:
+            return _WkbReader(self.ewkb).wkt()
+        except struct.error:
+            raise UnsupportedGeometry('Truncated WKB')
+
+    def __str__(self):
+        return self.wkt()
+
+    def __eq__(self, other):
+        if isinstance(other, Geometry):
+            return self.ewkb == other.ewkb
+        if isinstance(other, _STRING_TYPES):
+            # As Get Geometry returned WKT text before
+            try:
+                return self.wkt() == other.strip()
+            except UnsupportedGeometry:
+                return False
+        return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        # Hashed as the WKT so equal to the hash of the text it equals
+        try:
+            return hash(self.wkt())
+        except UnsupportedGeometry:
+            return hash(self.ewkb)
+
+    def __repr__(self):
+        return 'Geometry(SRID={}, {} bytes)'.format(self.srid,
+                                                    len(self.ewkb))
+
+
+def parse_ewkb_srid(data):
+    """
+    Returns the SRID from the header of EWKB `data`, or None.
+    """
+    reader = _WkbReader(data)
+    try:
+        reader.header()
+    except struct.error:
+        raise UnsupportedGeometry('Truncated WKB')
+    return reader.srid
+
+
+def geometry_parts(geometry):
+    """
+    Returns (srid, shape) for WKT/EWKT strings or Geometry objects.
+    """
+    if isinstance(geometry, Geometry):
+        return geometry.srid, geometry.shape()
+    return parse_wkt(geometry)
@@ -0,0 +1,203 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Timing of the SQL statements issued by SpatialDataLibrary.
+"""
+
+import csv
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"])[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b')
+
+CSV_FIELDS = ('keyword', 'fingerprint', 'id', 'elapsed', 'rows', 'error',
+              'seq_scan', 'statement', 'plan')
+
+
+def fingerprint(statement):
+    """
+    Normalises `statement` so that runs differing only in literals match.
+    """
+    statement = _STRING.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    return _WHITESPACE.sub(' ', statement).strip().rstrip(';').strip()
+
+
+def _row_count(result):
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1 if result is not None else 0
+
+
+class StatementLog(object):
+    """
+    Records the keyword, fingerprint, time taken and rows of statements.
+
+    Only the outermost instrumented call in each thread is recorded, so
+    library methods that call each other aren't counted twice.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.explain_threshold = None
+        self.records = []
+        self.keywords = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def current_keyword(self):
+        return self.keywords[-1] if self.keywords else None
+
+    def run(self, statement, function, args=(), kwargs=None, explain=None):
+        """
+        Calls `function` and records how long `statement` took.
+
+        If `explain` is given and the statement took at least the explain
+        threshold it is called with the statement and its result kept as
+        the plan, unless it returns None as for statements that can't be
+        explained.
+        """
+        kwargs = kwargs or {}
+        if not self.enabled or getattr(self._local, 'active', False):
+            return function(*args, **kwargs)
+        self._local.active = True
+        error = None
+        start = time.time()
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+            raise
+        finally:
+            elapsed = time.time() - start
+            self._local.active = False
+            record = {
+                'keyword': self.current_keyword(),
+                'fingerprint': fingerprint(statement),
+                'elapsed': elapsed,
+                'rows': None,
+                'error': error,
+                'statement': statement,
+                'plan': None,
+                'seq_scan': None,
+            }
+            record['id'] = hashlib.md5(
+                record['fingerprint'].encode('utf-8')).hexdigest()[:12]
+            if error is None:
+                record['rows'] = _row_count(result)
+            if (error is None and explain is not None and
+                    self.explain_threshold is not None and
+                    elapsed >= self.explain_threshold):
+                self._local.active = True
+                try:
+                    plan = explain(statement)
+                    if plan is not None:
+                        record['plan'] = plan
+                        record['seq_scan'] = 'Seq Scan' in plan
+                except Exception as e:
+                    record['plan'] = 'EXPLAIN failed: {}'.format(e)
+                finally:
+                    self._local.active = False
+            with self._lock:
+                self.records.append(record)
+        return result
+
+    def reset(self):
+        with self._lock:
+            del self.records[:]
+
+    def summary(self):
+        """
+        Returns per fingerprint totals, slowest first.
+        """
+        totals = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            total = totals.setdefault(record['id'], {
+                'id': record['id'],
+                'fingerprint': record['fingerprint'],
+                'keywords': [],
+                'count': 0,
+                'elapsed': 0.0,
+                'max_elapsed': 0.0,
+                'rows': 0,
+                'errors': 0,
+                'seq_scan': False,
+            })
+            total['count'] += 1
+            total['elapsed'] += record['elapsed']
+            total['max_elapsed'] = max(total['max_elapsed'],
+                                       record['elapsed'])
+            total['rows'] += record['rows'] or 0
+            total['errors'] += 1 if record['error'] else 0
+            total['seq_scan'] = total['seq_scan'] or bool(record['seq_scan'])
+            if record['keyword'] not in total['keywords']:
+                total['keywords'].append(record['keyword'])
+        return sorted(totals.values(), key=lambda t: -t['elapsed'])
+
+    def export(self, path, format=None):
+        """
+        Writes every record to `path` as JSON or CSV.
+
+        The format is taken from the file extension unless given.
+        """
+        format = (format or path.rsplit('.', 1)[-1]).lower()
+        with self._lock:
+            records = list(self.records)
+        if format == 'json':
+            with open(path, 'w') as f:
+                json.dump({'statements': records,
+                           'summary': self.summary()}, f, indent=2)
+        elif format == 'csv':
+            if sys.version_info[0] < 3:
+                f = open(path, 'wb')
+            else:
+                f = open(path, 'w', newline='')
+            with f:
+                writer = csv.DictWriter(f, CSV_FIELDS)
+                writer.writeheader()
+                for record in records:
+                    writer.writerow(record)
+        else:
+            raise RuntimeError('Unknown statistics format: {}'.format(format))
+
+
+class KeywordListener(object):
+    """
+    Library listener that tells a StatementLog which keyword is running.
+
+    If `path` is set the log is exported there when the library goes out of
+    scope at the end of the run.
+    """
+    ROBOT_LISTENER_API_VERSION = 2
+
+    def __init__(self, statement_log, path=None):
+        self.statement_log = statement_log
+        self.path = path
+
+    def start_keyword(self, name, attrs):
+        self.statement_log.keywords.append(name)
+
+    def end_keyword(self, name, attrs):
+        if self.statement_log.keywords:
+            self.statement_log.keywords.pop()
+
+    def close(self):
+        if self.path and self.statement_log.records:
+            self.statement_log.export(self.path)
@@ -0,0 +1,78 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Statements prepared once per connection and run with bound parameters.
+"""
+
+from collections import OrderedDict
+
+
+class PreparedStatements(object):
+    """
+    Names of the statements prepared on a connection.
+
+    Once more than `limit` have been prepared the least recently used are
+    given back to be deallocated. Lookups are counted as hits and misses.
+    """
+    def __init__(self, limit):
+        self.limit = int(limit)
+        self._names = OrderedDict()
+        self._count = 0
+        self.reset()
+
+    def lookup(self, statement):
+        """
+        Returns (name, new, evicted): the name `statement` is prepared as,
+        whether it has still to be prepared and the names of statements to
+        deallocate first.
+        """
+        name = self._names.pop(statement, None)
+        if name is not None:
+            self._names[statement] = name
+            self.hits += 1
+            return name, False, []
+        self.misses += 1
+        self._count += 1
+        name = 'spatialdatalibrary_{}'.format(self._count)
+        evicted = []
+        while self._names and len(self._names) >= self.limit:
+            evicted.append(self._names.popitem(last=False)[1])
+            self.evictions += 1
+        self._names[statement] = name
+        return name, True, evicted
+
+    def forget(self, statement):
+        """
+        Forgets `statement`, e.g. if preparing it failed.
+        """
+        self._names.pop(statement, None)
+
+    def clear(self):
+        """
+        Forgets every statement, as when the connection is closed.
+        """
+        self._names.clear()
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def statistics(self):
+        return {
+            'prepared': len(self._names),
+            'limit': self.limit,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
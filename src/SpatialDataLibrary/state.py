@@ -0,0 +1,116 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+What was checked in earlier runs, so later runs only check what changed.
+"""
+
+import sqlite3
+import threading
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS watermarks (
+        source TEXT NOT NULL,
+        name TEXT NOT NULL,
+        watermark TEXT,
+        extent TEXT,
+        PRIMARY KEY (source, name)
+    );
+    CREATE TABLE IF NOT EXISTS chunks (
+        source TEXT NOT NULL,
+        name TEXT NOT NULL,
+        chunk INTEGER NOT NULL,
+        hash TEXT NOT NULL,
+        PRIMARY KEY (source, name, chunk)
+    );
+'''
+
+
+class ValidationState(object):
+    """
+    Watermarks and chunk hashes of tables kept in a SQLite file.
+
+    Entries are keyed by the table (`source`) and a `name` identifying the
+    check and its arguments.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+
+    def watermark(self, source, name):
+        """
+        Returns (watermark, extent) or None if nothing has been stored.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT watermark, extent FROM watermarks '
+                'WHERE source = ? AND name = ?', (source, name)).fetchone()
+        if row is None:
+            return None
+        extent = None
+        if row[1]:
+            extent = tuple(float(b) for b in row[1].split(','))
+        return row[0], extent
+
+    def set_watermark(self, source, name, watermark, extent=None):
+        if extent is not None:
+            extent = ','.join(repr(float(b)) for b in extent)
+        with self._lock:
+            with self._connection:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO watermarks '
+                    'VALUES (?, ?, ?, ?)', (source, name, watermark, extent))
+
+    def chunk_hashes(self, source, name):
+        """
+        Returns a dict of chunk number to hash.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT chunk, hash FROM chunks '
+                'WHERE source = ? AND name = ?', (source, name)).fetchall()
+        return dict(rows)
+
+    def set_chunk_hashes(self, source, name, hashes):
+        """
+        Replaces the stored hashes with the `hashes` dict.
+        """
+        with self._lock:
+            with self._connection:
+                self._connection.execute(
+                    'DELETE FROM chunks WHERE source = ? AND name = ?',
+                    (source, name))
+                self._connection.executemany(
+                    'INSERT INTO chunks VALUES (?, ?, ?, ?)',
+                    [(source, name, int(chunk), hashes[chunk])
+                     for chunk in hashes])
+
+    def forget(self, source=None):
+        """
+        Removes everything stored for `source`, or for all tables.
+        """
+        with self._lock:
+            with self._connection:
+                for table in ('watermarks', 'chunks'):
+                    if source is None:
+                        self._connection.execute('DELETE FROM {}'.format(
+                                                 table))
+                    else:
+                        self._connection.execute(
+                            'DELETE FROM {} WHERE source = ?'.format(table),
+                            (source,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
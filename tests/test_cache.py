@@ -0,0 +1,131 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import random
+import struct
+import unittest
+
+from SpatialDataLibrary.cache import (FEATURE_OVERHEAD, CachedTable,
+                                      GeometryCache, STRtree)
+from SpatialDataLibrary.geometry import (Geometry, UnsupportedGeometry,
+                                         bboxes_intersect)
+
+
+def point(x, y, srid=27700):
+    return Geometry(struct.pack('<BIidd', 1, 0x20000001, srid, x, y))
+
+
+def square(x, y, size, srid=27700):
+    data = struct.pack('<BIiII', 1, 0x20000003, srid, 1, 5)
+    for cx, cy in ((x, y), (x + size, y), (x + size, y + size),
+                   (x, y + size), (x, y)):
+        data += struct.pack('<dd', cx, cy)
+    return Geometry(data)
+
+
+class STRtreeTest(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        generator = random.Random(1)
+        entries = []
+        for n in range(1000):
+            x, y = generator.uniform(0, 1000), generator.uniform(0, 1000)
+            entries.append(((x, y, x + generator.uniform(0, 20),
+                             y + generator.uniform(0, 20)), n))
+        tree = STRtree(entries, capacity=4)
+        for _ in range(100):
+            x, y = generator.uniform(0, 1000), generator.uniform(0, 1000)
+            bbox = (x, y, x + 50, y + 50)
+            expected = sorted(n for box, n in entries
+                              if bboxes_intersect(box, bbox))
+            self.assertEqual(sorted(tree.query(bbox)), expected)
+
+    def test_small_and_empty(self):
+        self.assertEqual(STRtree([]).query((0, 0, 1, 1)), [])
+        tree = STRtree([((0, 0, 1, 1), 'a'), ((5, 5, 6, 6), 'b')])
+        self.assertEqual(tree.query((1, 1, 2, 2)), ['a'])
+        self.assertEqual(tree.query((2, 2, 3, 3)), [])
+
+
+class CachedTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = CachedTable([square(x * 10, 0, 5) for x in range(50)],
+                                 srid=27700)
+
+    def test_intersects(self):
+        self.assertTrue(self.table.intersects('POINT(12 2)'))
+        self.assertTrue(self.table.intersects('LINESTRING(6 6, 11 4)'))
+        self.assertFalse(self.table.intersects('POINT(17 2)'))
+        self.assertFalse(self.table.intersects('POINT EMPTY'))
+
+    def test_geometry(self):
+        self.assertTrue(self.table.intersects(point(12, 2)))
+        self.assertFalse(self.table.intersects(point(12, 7)))
+
+    def test_srid(self):
+        self.assertTrue(self.table.intersects('SRID=27700;POINT(12 2)'))
+        self.assertRaises(UnsupportedGeometry, self.table.intersects,
+                          'SRID=4326;POINT(12 2)')
+
+    def test_size(self):
+        self.assertEqual(self.table.count, 50)
+        self.assertEqual(self.table.size,
+                         50 * (len(square(0, 0, 5).ewkb) + FEATURE_OVERHEAD))
+
+    def test_incomplete(self):
+        curve = Geometry(struct.pack('<BII', 1, 8, 0))
+        table = CachedTable([point(1, 1), curve])
+        self.assertFalse(table.complete)
+        self.assertRaises(UnsupportedGeometry, table.intersects,
+                          'POINT(1 1)')
+
+    def test_empty_geometries_are_skipped(self):
+        empty = Geometry(struct.pack('<BII', 1, 2, 0))
+        table = CachedTable([point(1, 1), empty])
+        self.assertTrue(table.complete)
+        self.assertTrue(table.intersects('POINT(1 1)'))
+
+
+class GeometryCacheTest(unittest.TestCase):
+
+    def table(self, size):
+        table = CachedTable([])
+        table.size = size
+        return table
+
+    def test_least_recently_used_dropped(self):
+        cache = GeometryCache(100)
+        self.assertEqual(cache.put('a', self.table(40)), [])
+        self.assertEqual(cache.put('b', self.table(40)), [])
+        cache.get('a')
+        self.assertEqual(cache.put('c', self.table(40)), ['b'])
+        self.assertEqual(cache.keys(), ['a', 'c'])
+        self.assertEqual(cache.size, 80)
+
+    def test_replace_and_discard(self):
+        cache = GeometryCache(100)
+        cache.put('a', self.table(40))
+        cache.put('a', self.table(60))
+        self.assertEqual(cache.size, 60)
+        cache.discard('a')
+        cache.discard('missing')
+        self.assertEqual(cache.get('a'), None)
+
+    def test_too_big(self):
+        cache = GeometryCache(10)
+        self.assertEqual(cache.put('a', self.table(20)), ['a'])
+        self.assertEqual(cache.keys(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
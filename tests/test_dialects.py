@@ -0,0 +1,173 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import sqlite3
+import unittest
+
+from SpatialDataLibrary.dialects import (GeoPackageDialect, PostGISDialect,
+                                         SpatiaLiteDialect)
+
+
+def query(connection, dialect, statement, parameters):
+    """
+    Runs a statement with placeholders as the library does on SQLite.
+    """
+    return connection.execute(
+        *dialect.unprepared(statement, parameters)).fetchall()
+
+
+class PostGISDialectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dialect = PostGISDialect()
+
+    def test_prepared(self):
+        self.assertEqual(self.dialect.prepare('s1', ' SELECT $1; '),
+                         'PREPARE s1 AS SELECT $1')
+        self.assertEqual(self.dialect.execute_prepared('s1', 2),
+                         'EXECUTE s1 (%s, %s)')
+        self.assertEqual(self.dialect.execute_prepared('s1', 0),
+                         'EXECUTE s1')
+        self.assertEqual(self.dialect.deallocate('s1'), 'DEALLOCATE s1')
+
+    def test_unprepared(self):
+        statement = "SELECT $2 || '%' || $1 || $10"
+        self.assertEqual(
+            self.dialect.unprepared(statement, range(1, 11)),
+            ("SELECT %(p2)s || '%%' || %(p1)s || %(p10)s",
+             dict(('p{}'.format(n), n) for n in range(1, 11))))
+
+    def test_parameters_in_lookups(self):
+        parameter = self.dialect.parameter
+        self.assertIn('f_table_schema = $1',
+                      self.dialect.geometry_columns(parameter(1)))
+        statement = self.dialect.find_srid(parameter(1), parameter(2),
+                                           parameter(3))
+        for n in (1, 2, 3):
+            self.assertIn('$' + str(n), statement)
+
+    def test_explain(self):
+        self.assertEqual(self.dialect.explain('SELECT 1'),
+                         'EXPLAIN SELECT 1;')
+        self.assertEqual(self.dialect.explain('SELECT 1', analyze=True),
+                         'EXPLAIN (ANALYZE, BUFFERS) SELECT 1;')
+
+    def test_geometry_from_text(self):
+        self.assertEqual(self.dialect.geometry_from_text("'POINT(1 1)'"),
+                         "ST_GeomFromText('POINT(1 1)')")
+        self.assertEqual(self.dialect.geometry_from_text('$1', '$2'),
+                         'ST_GeomFromText($1, $2)')
+
+
+class SpatiaLiteDialectTest(unittest.TestCase):
+    """
+    Statements that don't need SpatiaLite functions are run with sqlite3.
+    """
+    def setUp(self):
+        self.dialect = SpatiaLiteDialect()
+        self.connection = sqlite3.connect(':memory:')
+
+    def tearDown(self):
+        self.connection.close()
+
+    def query(self, statement, parameters):
+        return query(self.connection, self.dialect, statement, parameters)
+
+    def test_table(self):
+        self.assertEqual(self.dialect.table('public', 'roads'), '"roads"')
+        self.assertEqual(self.dialect.table('temp', 'roads'),
+                         '"temp"."roads"')
+
+    def test_numbered_parameters(self):
+        statement, parameters = self.dialect.unprepared(
+            'SELECT {1}, {0}, {1}'.format(self.dialect.parameter(1),
+                                          self.dialect.parameter(2)),
+            ['a', self.dialect.binary(b'\x01\x02')])
+        row = self.connection.execute(statement, parameters).fetchone()
+        self.assertEqual((bytes(row[0]), row[1], bytes(row[2])),
+                         (b'\x01\x02', 'a', b'\x01\x02'))
+
+    def test_unused_parameters_dropped(self):
+        self.assertEqual(self.dialect.unprepared('SELECT ?2', [1, 2, 3]),
+                         ('SELECT ?2', [1, 2]))
+        self.assertEqual(self.dialect.unprepared('SELECT 1', [1]),
+                         ('SELECT 1', []))
+
+    def test_lookups(self):
+        self.connection.executescript('''
+            CREATE TABLE geometry_columns (f_table_name TEXT,
+                f_geometry_column TEXT, srid INTEGER);
+            INSERT INTO geometry_columns VALUES ('roads', 'geom', 27700);
+            INSERT INTO geometry_columns VALUES ('areas', 'shape', 4326);
+        ''')
+        parameter = self.dialect.parameter
+        rows = self.query(self.dialect.geometry_columns(parameter(1),
+                                                        parameter(2)),
+                          ['main', 'ROADS'])
+        self.assertEqual(rows, [('roads', 'geom', 27700)])
+        rows = self.query(self.dialect.geometry_columns(parameter(1)),
+                          ['main'])
+        self.assertEqual([r[0] for r in rows], ['areas', 'roads'])
+        rows = self.query(self.dialect.find_srid(parameter(1), parameter(2),
+                                                 parameter(3)),
+                          ['main', 'areas', 'SHAPE'])
+        self.assertEqual(rows, [(4326,)])
+
+    def test_floor(self):
+        row = self.connection.execute('SELECT {}, {}'.format(
+            self.dialect.floor('2.7'), self.dialect.pi())).fetchone()
+        self.assertEqual(row[0], 2)
+        self.assertAlmostEqual(row[1], 3.14159265)
+
+    def test_no_plans(self):
+        self.assertEqual(self.dialect.explain('SELECT 1', analyze=True),
+                         None)
+
+
+class GeoPackageDialectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dialect = GeoPackageDialect()
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.executescript('''
+            CREATE TABLE gpkg_contents (table_name TEXT, min_x REAL,
+                min_y REAL, max_x REAL, max_y REAL);
+            INSERT INTO gpkg_contents VALUES ('roads', 0, 1, 2, 3);
+            CREATE TABLE gpkg_geometry_columns (table_name TEXT,
+                column_name TEXT, srs_id INTEGER);
+            INSERT INTO gpkg_geometry_columns VALUES ('roads', 'geom', 27700);
+        ''')
+
+    def tearDown(self):
+        self.connection.close()
+
+    def test_estimated_extent(self):
+        row = self.connection.execute(self.dialect.estimated_extent(
+            'main', 'Roads', 'geom')).fetchone()
+        self.assertEqual(row, (0, 1, 2, 3))
+
+    def test_lookups(self):
+        parameter = self.dialect.parameter
+        for statement, expected in (
+                (self.dialect.geometry_columns(parameter(1)),
+                 [('roads', 'geom', 27700)]),
+                (self.dialect.geometry_columns(parameter(1), parameter(2)),
+                 [('roads', 'geom', 27700)]),
+                (self.dialect.find_srid(parameter(1), parameter(2),
+                                        parameter(3)),
+                 [(27700,)])):
+            self.assertEqual(query(self.connection, self.dialect, statement,
+                                   ['main', 'roads', 'geom']), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,335 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import struct
+import unittest
+
+from SpatialDataLibrary.geometry import (Geometry, UnsupportedGeometry,
+                                         bboxes_intersect, intersects,
+                                         parse_ewkb, parse_wkt, shape_bbox,
+                                         wkt_intersects)
+
+SQUARE = 'POLYGON((0 0, 10 0, 10 10, 0 10, 0 0))'
+SQUARE_WITH_HOLE = ('POLYGON((0 0, 10 0, 10 10, 0 10, 0 0), '
+                    '(2 2, 8 2, 8 8, 2 8, 2 2))')
+
+
+def ewkb_point(x, y, srid=None, byte_order='<'):
+    """
+    Returns the (E)WKB of a point, with an SRID if given.
+    """
+    if srid is None:
+        return struct.pack(byte_order + 'BIdd',
+                           1 if byte_order == '<' else 0, 1, x, y)
+    return struct.pack(byte_order + 'BIidd', 1 if byte_order == '<' else 0,
+                       0x20000001, srid, x, y)
+
+
+def ewkb_linestring(coordinates, srid=27700):
+    data = struct.pack('<BIiI', 1, 0x20000002, srid, len(coordinates))
+    for x, y in coordinates:
+        data += struct.pack('<dd', x, y)
+    return data
+
+
+def shape(wkt):
+    return parse_wkt(wkt)[1]
+
+
+class ParseWktTest(unittest.TestCase):
+
+    def test_point(self):
+        srid, parsed = parse_wkt('POINT (1 2)')
+        self.assertEqual(srid, None)
+        self.assertEqual(parsed.points, [(1, 2)])
+
+    def test_srid(self):
+        srid, parsed = parse_wkt('SRID=27700;POINT(1 2)')
+        self.assertEqual(srid, 27700)
+        self.assertEqual(parsed.points, [(1, 2)])
+
+    def test_invalid_srid(self):
+        self.assertRaises(UnsupportedGeometry, parse_wkt,
+                          'SRID=bng;POINT(1 2)')
+
+    def test_z_and_m_are_dropped(self):
+        self.assertEqual(shape('POINT Z (1 2 3)').points, [(1, 2)])
+        self.assertEqual(shape('POINTZM(1 2 3 4)').points, [(1, 2)])
+        self.assertEqual(shape('LINESTRING M (0 0 1, 1 1 2)').lines,
+                         [[(0, 0), (1, 1)]])
+
+    def test_case_insensitive(self):
+        self.assertEqual(shape('point(1 2)').points, [(1, 2)])
+
+    def test_multipoint_forms(self):
+        self.assertEqual(shape('MULTIPOINT(1 2, 3 4)').points,
+                         [(1, 2), (3, 4)])
+        self.assertEqual(shape('MULTIPOINT((1 2), EMPTY, (3 4))').points,
+                         [(1, 2), (3, 4)])
+
+    def test_polygon_with_hole(self):
+        polygon, = shape(SQUARE_WITH_HOLE).polygons
+        self.assertEqual(len(polygon), 2)
+        self.assertEqual(polygon[1][0], (2, 2))
+
+    def test_multi_and_collection(self):
+        parsed = shape('GEOMETRYCOLLECTION(POINT(1 1), '
+                       'MULTILINESTRING((0 0, 1 1), EMPTY, (2 2, 3 3)), '
+                       'MULTIPOLYGON(((0 0, 1 0, 1 1, 0 0))))')
+        self.assertEqual(parsed.points, [(1, 1)])
+        self.assertEqual(len(parsed.lines), 2)
+        self.assertEqual(len(parsed.polygons), 1)
+
+    def test_empty(self):
+        self.assertEqual(shape('POLYGON EMPTY'), ([], [], []))
+        self.assertEqual(shape('GEOMETRYCOLLECTION EMPTY'), ([], [], []))
+
+    def test_numbers(self):
+        self.assertEqual(shape('POINT(-1.5e3 .25)').points, [(-1500, 0.25)])
+
+    def test_unsupported(self):
+        for wkt in ('CIRCULARSTRING(0 0, 1 1, 2 0)', 'POINT(1)',
+                    'POINT(1 2', 'POINT(1 2) POINT(3 4)', 'POINT(1 2 x)',
+                    '(1 2)'):
+            self.assertRaises(UnsupportedGeometry, parse_wkt, wkt)
+
+
+class BboxTest(unittest.TestCase):
+
+    def test_shape_bbox(self):
+        self.assertEqual(shape_bbox(shape(SQUARE)), (0, 0, 10, 10))
+        self.assertEqual(
+            shape_bbox(shape('GEOMETRYCOLLECTION(POINT(-5 3), '
+                             'LINESTRING(0 0, 20 1))')),
+            (-5, 0, 20, 3))
+        self.assertEqual(shape_bbox(shape('POINT EMPTY')), None)
+
+    def test_bboxes_intersect(self):
+        self.assertTrue(bboxes_intersect((0, 0, 1, 1), (1, 1, 2, 2)))
+        self.assertTrue(bboxes_intersect((0, 0, 10, 10), (2, 2, 3, 3)))
+        self.assertFalse(bboxes_intersect((0, 0, 1, 1), (1.5, 0, 2, 1)))
+        self.assertFalse(bboxes_intersect((0, 0, 1, 1), (0, 2, 1, 3)))
+
+
+class IntersectsTest(unittest.TestCase):
+
+    def assertIntersects(self, a, b, expected=True):
+        # The predicate is symmetric, so check both ways round
+        self.assertEqual(intersects(shape(a), shape(b)), expected,
+                         '{} / {}'.format(a, b))
+        self.assertEqual(intersects(shape(b), shape(a)), expected,
+                         '{} / {}'.format(b, a))
+
+    def assertDisjoint(self, a, b):
+        self.assertIntersects(a, b, False)
+
+    def test_points(self):
+        self.assertIntersects('POINT(1 1)', 'POINT(1 1)')
+        self.assertDisjoint('POINT(1 1)', 'POINT(1 2)')
+        self.assertIntersects('MULTIPOINT(5 5, 1 1)', 'POINT(1 1)')
+
+    def test_point_and_line(self):
+        self.assertIntersects('POINT(1 1)', 'LINESTRING(0 0, 2 2)')
+        self.assertIntersects('POINT(0 0)', 'LINESTRING(0 0, 2 2)')
+        self.assertDisjoint('POINT(1 1.1)', 'LINESTRING(0 0, 2 2)')
+        self.assertDisjoint('POINT(3 3)', 'LINESTRING(0 0, 2 2)')
+
+    def test_point_and_polygon(self):
+        self.assertIntersects('POINT(5 5)', SQUARE)
+        self.assertIntersects('POINT(0 5)', SQUARE)
+        self.assertIntersects('POINT(10 10)', SQUARE)
+        self.assertDisjoint('POINT(11 5)', SQUARE)
+
+    def test_point_in_hole(self):
+        self.assertDisjoint('POINT(5 5)', SQUARE_WITH_HOLE)
+        self.assertIntersects('POINT(2 5)', SQUARE_WITH_HOLE)
+        self.assertIntersects('POINT(1 5)', SQUARE_WITH_HOLE)
+
+    def test_lines(self):
+        self.assertIntersects('LINESTRING(0 0, 2 2)', 'LINESTRING(0 2, 2 0)')
+        self.assertIntersects('LINESTRING(0 0, 2 2)', 'LINESTRING(2 2, 3 0)')
+        self.assertIntersects('LINESTRING(0 0, 4 0)', 'LINESTRING(2 0, 6 0)')
+        self.assertDisjoint('LINESTRING(0 0, 4 0)', 'LINESTRING(5 0, 6 0)')
+        self.assertDisjoint('LINESTRING(0 0, 2 2)', 'LINESTRING(0 1, 1 2)')
+
+    def test_line_and_polygon(self):
+        self.assertIntersects('LINESTRING(-5 5, 15 5)', SQUARE)
+        self.assertIntersects('LINESTRING(1 1, 2 2)', SQUARE)
+        self.assertIntersects('LINESTRING(10 0, 20 0)', SQUARE)
+        self.assertDisjoint('LINESTRING(11 0, 11 10)', SQUARE)
+        self.assertDisjoint('LINESTRING(3 3, 7 7)', SQUARE_WITH_HOLE)
+        self.assertIntersects('LINESTRING(3 3, 9 9)', SQUARE_WITH_HOLE)
+
+    def test_polygons(self):
+        self.assertIntersects(SQUARE, 'POLYGON((5 5, 15 5, 15 15, 5 5))')
+        self.assertIntersects(SQUARE, 'POLYGON((10 0, 20 0, 20 10, 10 0))')
+        self.assertIntersects(SQUARE,
+                              'POLYGON((10 10, 20 10, 20 20, 10 10))')
+        self.assertIntersects(SQUARE, 'POLYGON((2 2, 3 2, 3 3, 2 2))')
+        self.assertDisjoint(SQUARE, 'POLYGON((11 0, 20 0, 20 10, 11 0))')
+
+    def test_polygon_in_hole(self):
+        self.assertDisjoint(SQUARE_WITH_HOLE,
+                            'POLYGON((3 3, 7 3, 7 7, 3 7, 3 3))')
+        self.assertIntersects(SQUARE_WITH_HOLE,
+                              'POLYGON((2 2, 7 3, 7 7, 3 7, 2 2))')
+        self.assertIntersects(SQUARE_WITH_HOLE,
+                              'POLYGON((-1 -1, 11 -1, 11 11, -1 11, '
+                              '-1 -1))')
+
+    def test_empty(self):
+        self.assertDisjoint('POINT EMPTY', SQUARE)
+        self.assertDisjoint('GEOMETRYCOLLECTION EMPTY', 'POINT(0 0)')
+
+    def test_collections(self):
+        self.assertIntersects('GEOMETRYCOLLECTION(POINT(20 20), '
+                              'LINESTRING(9 9, 12 12))', SQUARE)
+        self.assertDisjoint('MULTIPOLYGON(((20 20, 21 20, 21 21, 20 20)), '
+                            '((30 30, 31 30, 31 31, 30 30)))', SQUARE)
+
+
+class WktIntersectsTest(unittest.TestCase):
+
+    def test_wkt(self):
+        self.assertTrue(wkt_intersects('POINT(5 5)', SQUARE))
+        self.assertFalse(wkt_intersects('POINT(15 5)', SQUARE))
+
+    def test_same_srid(self):
+        self.assertTrue(wkt_intersects('SRID=27700;POINT(5 5)',
+                                       'SRID=27700;' + SQUARE))
+
+    def test_one_srid(self):
+        self.assertTrue(wkt_intersects('SRID=27700;POINT(5 5)', SQUARE))
+
+    def test_mixed_srids(self):
+        self.assertRaises(UnsupportedGeometry, wkt_intersects,
+                          'SRID=27700;POINT(5 5)', 'SRID=4326;' + SQUARE)
+
+    def test_geometry_and_wkt(self):
+        point = Geometry(ewkb_point(5, 5, 27700))
+        self.assertTrue(wkt_intersects(point, SQUARE))
+        self.assertFalse(wkt_intersects(point, 'LINESTRING(0 0, 1 1)'))
+
+    def test_geometries(self):
+        line = Geometry(ewkb_linestring([(0, 0), (2, 2)]))
+        self.assertTrue(wkt_intersects(line,
+                                       Geometry(ewkb_point(1, 1, 27700))))
+        self.assertFalse(wkt_intersects(line,
+                                        Geometry(ewkb_point(5, 5, 27700))))
+        self.assertRaises(UnsupportedGeometry, wkt_intersects, line,
+                          Geometry(ewkb_point(1, 1, 4326)))
+
+
+class ParseEwkbTest(unittest.TestCase):
+
+    def test_point(self):
+        self.assertEqual(parse_ewkb(ewkb_point(1, 2)),
+                         (None, ([(1, 2)], [], [])))
+
+    def test_srid(self):
+        self.assertEqual(parse_ewkb(ewkb_point(1, 2, 27700))[0], 27700)
+
+    def test_big_endian(self):
+        self.assertEqual(parse_ewkb(ewkb_point(1, 2, 27700, '>')),
+                         (27700, ([(1, 2)], [], [])))
+
+    def test_iso_z(self):
+        data = struct.pack('<BIddd', 1, 1001, 1, 2, 3)
+        self.assertEqual(parse_ewkb(data)[1].points, [(1, 2)])
+
+    def test_empty_point(self):
+        nan = float('nan')
+        data = struct.pack('<BIdd', 1, 1, nan, nan)
+        self.assertEqual(parse_ewkb(data)[1], ([], [], []))
+
+    def test_collection(self):
+        data = (struct.pack('<BII', 1, 7, 2) + ewkb_point(1, 2) +
+                struct.pack('<BIIdddd', 1, 2, 2, 0, 0, 1, 1))
+        self.assertEqual(parse_ewkb(data)[1],
+                         ([(1, 2)], [[(0, 0), (1, 1)]], []))
+
+    def test_truncated(self):
+        self.assertRaises(UnsupportedGeometry, parse_ewkb,
+                          ewkb_point(1, 2)[:-4])
+
+    def test_unsupported(self):
+        # CircularString
+        data = struct.pack('<BII', 1, 8, 0)
+        self.assertRaises(UnsupportedGeometry, parse_ewkb, data)
+
+
+class GeometryTest(unittest.TestCase):
+
+    def test_srid_and_bbox(self):
+        line = Geometry(ewkb_linestring([(3, 1), (0, 4)]))
+        self.assertEqual(line.srid, 27700)
+        self.assertEqual(line.bbox, (0, 1, 3, 4))
+        self.assertEqual(Geometry(ewkb_point(1, 2)).srid, None)
+
+    def test_unsupported_has_no_bbox(self):
+        curve = Geometry(struct.pack('<BII', 1, 8, 0))
+        self.assertEqual(curve.bbox, None)
+        self.assertRaises(UnsupportedGeometry, curve.wkt)
+
+    def test_wkt(self):
+        self.assertEqual(Geometry(ewkb_point(1, 2.5, 27700)).wkt(),
+                         'POINT(1 2.5)')
+        self.assertEqual(str(Geometry(ewkb_linestring([(0, 0), (1, 1)]))),
+                         'LINESTRING(0 0,1 1)')
+
+    def test_wkt_polygon_and_multi(self):
+        polygon = struct.pack('<BIII', 1, 3, 1, 4)
+        for x, y in ((0, 0), (1, 0), (1, 1), (0, 0)):
+            polygon += struct.pack('<dd', x, y)
+        self.assertEqual(Geometry(polygon).wkt(),
+                         'POLYGON((0 0,1 0,1 1,0 0))')
+        nan = float('nan')
+        multipoint = (struct.pack('<BII', 1, 4, 2) + ewkb_point(1, 2) +
+                      struct.pack('<BIdd', 1, 1, nan, nan))
+        self.assertEqual(Geometry(multipoint).wkt(),
+                         'MULTIPOINT((1 2),EMPTY)')
+
+    def test_wkt_z(self):
+        data = struct.pack('<BIddd', 1, 0x80000001, 1, 2, 3)
+        self.assertEqual(Geometry(data).wkt(), 'POINT Z (1 2 3)')
+
+    def test_wkt_empty(self):
+        self.assertEqual(Geometry(struct.pack('<BII', 1, 2, 0)).wkt(),
+                         'LINESTRING EMPTY')
+        self.assertEqual(Geometry(struct.pack('<BII', 1, 7, 0)).wkt(),
+                         'GEOMETRYCOLLECTION EMPTY')
+
+    def test_wkb_round_trip(self):
+        geometry = Geometry(ewkb_point(1, 2, 27700))
+        self.assertEqual(geometry.wkb(), ewkb_point(1, 2))
+        self.assertEqual(Geometry.from_wkb(geometry.wkb(), 27700), geometry)
+        self.assertEqual(Geometry.from_wkb(geometry.wkb()).srid, None)
+
+    def test_equality(self):
+        geometry = Geometry(ewkb_point(1, 2, 27700))
+        self.assertEqual(geometry, Geometry(ewkb_point(1, 2, 27700)))
+        self.assertNotEqual(geometry, Geometry(ewkb_point(1, 2, 4326)))
+        self.assertNotEqual(geometry, Geometry(ewkb_point(2, 1, 27700)))
+        self.assertNotEqual(geometry, 1)
+
+    def test_equal_to_wkt(self):
+        geometry = Geometry(ewkb_point(1, 2, 27700))
+        self.assertTrue(geometry == 'POINT(1 2)')
+        self.assertTrue(geometry == u'POINT(1 2)')
+        self.assertFalse(geometry != 'POINT(1 2)')
+        self.assertFalse(geometry == 'POINT(1 3)')
+        self.assertEqual(hash(geometry), hash('POINT(1 2)'))
+        self.assertEqual(set([geometry, 'POINT(1 2)']), set([geometry]))
+
+
+if __name__ == '__main__':
+    unittest.main()
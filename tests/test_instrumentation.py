@@ -0,0 +1,161 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from SpatialDataLibrary.instrumentation import (KeywordListener, StatementLog,
+                                                fingerprint)
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 12 AND name = 'it''s'"),
+            'SELECT * FROM t WHERE id = ? AND name = ?')
+
+    def test_identifiers_kept(self):
+        self.assertEqual(fingerprint('SELECT "col2", t1.x FROM t1;'),
+                         'SELECT "col2", t1.x FROM t1')
+
+    def test_whitespace(self):
+        self.assertEqual(fingerprint('SELECT\n    1.5e3,\t-2 ;'),
+                         'SELECT ?, ?')
+
+
+class StatementLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.log = StatementLog()
+        self.log.enabled = True
+
+    def test_disabled(self):
+        self.log.enabled = False
+        self.assertEqual(self.log.run('SELECT 1', lambda: [(1,)]), [(1,)])
+        self.assertEqual(self.log.records, [])
+
+    def test_record(self):
+        self.log.keywords.append('My Keyword')
+        self.log.run('SELECT 1', lambda: [(1,), (2,)])
+        record, = self.log.records
+        self.assertEqual(record['keyword'], 'My Keyword')
+        self.assertEqual(record['fingerprint'], 'SELECT ?')
+        self.assertEqual(record['rows'], 2)
+        self.assertEqual(record['error'], None)
+        self.assertEqual(record['plan'], None)
+
+    def test_error(self):
+        def fail():
+            raise ValueError('bad SQL')
+        self.assertRaises(ValueError, self.log.run, 'SELECT x', fail)
+        self.assertEqual(self.log.records[0]['error'], 'bad SQL')
+
+    def test_nested_calls_recorded_once(self):
+        self.log.run('SELECT 1', lambda: self.log.run('SELECT 2', lambda: 2))
+        self.assertEqual([r['statement'] for r in self.log.records],
+                         ['SELECT 1'])
+
+    def test_explain(self):
+        self.log.explain_threshold = 0
+        self.log.run('SELECT 1', lambda: 1,
+                     explain=lambda s: 'Seq Scan on t\n' + s)
+        record, = self.log.records
+        self.assertEqual(record['plan'], 'Seq Scan on t\nSELECT 1')
+        self.assertTrue(record['seq_scan'])
+
+    def test_explain_below_threshold(self):
+        self.log.explain_threshold = 60
+        self.log.run('SELECT 1', lambda: 1, explain=lambda s: 'plan')
+        self.assertEqual(self.log.records[0]['plan'], None)
+
+    def test_nothing_to_explain(self):
+        self.log.explain_threshold = 0
+        self.log.run('CREATE TABLE t (id int)', lambda: None,
+                     explain=lambda s: None)
+        record, = self.log.records
+        self.assertEqual(record['plan'], None)
+        self.assertEqual(record['seq_scan'], None)
+
+    def test_explain_failure(self):
+        def explain(statement):
+            raise RuntimeError('no plan')
+        self.log.explain_threshold = 0
+        self.log.run('SELECT 1', lambda: 1, explain=explain)
+        self.assertEqual(self.log.records[0]['plan'],
+                         'EXPLAIN failed: no plan')
+
+    def test_summary(self):
+        for n in range(3):
+            self.log.run('SELECT {}'.format(n), lambda: [(1,)])
+        self.log.run('SELECT 1 FROM other', lambda: [])
+        summary = self.log.summary()
+        self.assertEqual(len(summary), 2)
+        select = [s for s in summary if s['fingerprint'] == 'SELECT ?'][0]
+        self.assertEqual(select['count'], 3)
+        self.assertEqual(select['rows'], 3)
+
+    def test_reset(self):
+        self.log.run('SELECT 1', lambda: 1)
+        self.log.reset()
+        self.assertEqual(self.log.records, [])
+
+
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log = StatementLog()
+        self.log.enabled = True
+        self.log.run('SELECT 1', lambda: [(1,)])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_json(self):
+        path = os.path.join(self.directory, 'sql.json')
+        self.log.export(path)
+        with open(path) as f:
+            exported = json.load(f)
+        self.assertEqual(len(exported['statements']), 1)
+        self.assertEqual(exported['summary'][0]['count'], 1)
+
+    def test_csv(self):
+        path = os.path.join(self.directory, 'sql.csv')
+        self.log.export(path)
+        with open(path) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(rows[0]['statement'], 'SELECT 1')
+
+    def test_unknown_format(self):
+        self.assertRaises(RuntimeError, self.log.export,
+                          os.path.join(self.directory, 'sql.txt'))
+
+    def test_listener(self):
+        path = os.path.join(self.directory, 'sql.json')
+        listener = KeywordListener(self.log, path)
+        listener.start_keyword('Outer', {})
+        listener.start_keyword('Inner', {})
+        self.assertEqual(self.log.current_keyword(), 'Inner')
+        listener.end_keyword('Inner', {})
+        self.assertEqual(self.log.current_keyword(), 'Outer')
+        listener.end_keyword('Outer', {})
+        listener.close()
+        self.assertTrue(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
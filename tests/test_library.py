@@ -0,0 +1,90 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Helpers of the library module that don't need a database connection.
+"""
+
+import unittest
+
+from SpatialDataLibrary import (CompactnessHistogram, _is_true,
+                                _normal_quantile, _sliver_factor,
+                                _upper_confidence_bound)
+
+
+class ArgumentTest(unittest.TestCase):
+
+    def test_is_true(self):
+        for value in ('True', 'yes', ' on ', '1', True, 1):
+            self.assertTrue(_is_true(value), value)
+        for value in ('False', 'no', 'OFF', '0', 'None', '', False, 0,
+                      None):
+            self.assertFalse(_is_true(value), value)
+
+    def test_sliver_factor(self):
+        self.assertEqual(_sliver_factor('0.02'), 0.02)
+        self.assertEqual(_sliver_factor(0.5), 0.5)
+        for value in ('1', '0', '-0.1', 2):
+            self.assertRaises(ValueError, _sliver_factor, value)
+        self.assertRaises(ValueError, _sliver_factor, 'sliver')
+
+
+class ConfidenceBoundTest(unittest.TestCase):
+
+    def test_normal_quantile(self):
+        self.assertAlmostEqual(_normal_quantile(0.5), 0, places=6)
+        self.assertAlmostEqual(_normal_quantile(0.95), 1.644854, places=5)
+        self.assertAlmostEqual(_normal_quantile(0.99), 2.326348, places=5)
+
+    def test_no_failures(self):
+        # The "rule of three" is close to the Wilson bound here
+        bound = _upper_confidence_bound(0, 1000, 0.95)
+        self.assertTrue(0.002 < bound < 0.003, bound)
+
+    def test_some_failures(self):
+        bound = _upper_confidence_bound(10, 1000, 0.95)
+        self.assertTrue(0.01 < bound < 0.02, bound)
+        self.assertTrue(_upper_confidence_bound(10, 1000, 0.99) > bound)
+        self.assertTrue(_upper_confidence_bound(100, 10000, 0.95) < bound)
+
+    def test_all_failures(self):
+        self.assertEqual(_upper_confidence_bound(10, 10, 0.95), 1.0)
+
+
+class CompactnessHistogramTest(unittest.TestCase):
+
+    def setUp(self):
+        self.histogram = CompactnessHistogram('query', 100)
+        for bucket, count in ((1, 2), (4, 3), (50, 5), (78, 10)):
+            self.histogram.add_bucket(bucket, count)
+
+    def test_counts(self):
+        self.assertEqual(self.histogram.polygon_count, 20)
+        self.assertEqual(self.histogram.count_below(0.02), 2)
+        self.assertEqual(self.histogram.count_below('0.05'), 5)
+        self.assertEqual(self.histogram.count_below(0.6), 10)
+
+    def test_circle_in_last_bucket(self):
+        self.histogram.add_bucket(100, 1)
+        self.assertEqual(self.histogram.counts[99], 1)
+
+    def test_percentile(self):
+        self.assertAlmostEqual(self.histogram.percentile(10), 0.02)
+        self.assertAlmostEqual(self.histogram.percentile(50), 0.51)
+        self.assertAlmostEqual(self.histogram.percentile(100), 0.79)
+
+    def test_empty(self):
+        self.assertEqual(CompactnessHistogram('t', 10).percentile(50), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Compares the in-process geometry code with PostGIS and runs keywords
+against it.
+
+Skipped unless psycopg2 is installed and SPATIALDATALIBRARY_TEST_DSN is a
+libpq connection string for a database with PostGIS, for example:
+
+    SPATIALDATALIBRARY_TEST_DSN="dbname=postgres user=postgres" \\
+        python -m unittest tests.test_postgis
+"""
+
+import os
+import random
+import unittest
+
+from SpatialDataLibrary import SpatialDataLibrary
+from SpatialDataLibrary.geometry import Geometry, parse_ewkb, wkt_intersects
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+DSN = os.environ.get('SPATIALDATALIBRARY_TEST_DSN')
+# Random geometries compared pairwise
+GEOMETRIES = 120
+# Coordinates are on a small grid so that touching and collinear cases,
+# where mistakes are likely, come up often
+GRID = 12
+
+
+def _coordinate(generator):
+    return (generator.randint(0, GRID) / 2.0, generator.randint(0, GRID) / 2.0)
+
+
+def _path(coordinates):
+    return '({})'.format(', '.join('{:g} {:g}'.format(x, y)
+                                   for x, y in coordinates))
+
+
+def _rectangle(generator):
+    x1, x2 = sorted(n / 2.0 for n in generator.sample(range(GRID + 1), 2))
+    y1, y2 = sorted(n / 2.0 for n in generator.sample(range(GRID + 1), 2))
+    return [(x1, y1), (x2, y1), (x2, y2), (x1, y2), (x1, y1)]
+
+
+def _triangle(generator):
+    while True:
+        a, b, c = [_coordinate(generator) for _ in range(3)]
+        area = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+        if area:
+            return [a, b, c, a]
+
+
+def _polygon(generator):
+    shell = generator.choice((_rectangle, _triangle))(generator)
+    rings = [shell]
+    xs = [x for x, _ in shell]
+    ys = [y for _, y in shell]
+    if (len(shell) == 5 and max(xs) - min(xs) > 2 and
+            max(ys) - min(ys) > 2 and generator.random() < 0.5):
+        # A hole strictly inside the rectangle
+        x1, y1 = min(xs) + 1, min(ys) + 1
+        x2, y2 = max(xs) - 1, max(ys) - 1
+        rings.append([(x1, y1), (x1, y2), (x2, y2), (x2, y1), (x1, y1)])
+    return '({})'.format(', '.join(_path(ring) for ring in rings))
+
+
+def random_wkt(generator):
+    """
+    Returns the WKT of a random point, line or polygon, or a multi or
+    collection of them.
+    """
+    kind = generator.choice(('POINT', 'LINESTRING', 'POLYGON', 'MULTIPOINT',
+                             'MULTILINESTRING', 'MULTIPOLYGON',
+                             'GEOMETRYCOLLECTION'))
+    lines = lambda: _path([_coordinate(generator)
+                           for _ in range(generator.randint(2, 4))])
+    if kind == 'POINT':
+        return 'POINT{}'.format(_path([_coordinate(generator)]))
+    if kind == 'LINESTRING':
+        return 'LINESTRING' + lines()
+    if kind == 'POLYGON':
+        return 'POLYGON' + _polygon(generator)
+    members = range(generator.randint(1, 3))
+    if kind == 'MULTIPOINT':
+        return 'MULTIPOINT({})'.format(', '.join(
+            _path([_coordinate(generator)]) for _ in members))
+    if kind == 'MULTILINESTRING':
+        return 'MULTILINESTRING({})'.format(', '.join(lines()
+                                                      for _ in members))
+    if kind == 'MULTIPOLYGON':
+        # Members may overlap, which ST_Intersects still handles
+        return 'MULTIPOLYGON({})'.format(', '.join(_polygon(generator)
+                                                   for _ in members))
+    return 'GEOMETRYCOLLECTION({})'.format(', '.join(
+        random_wkt(generator) for _ in members))
+
+
+@unittest.skipUnless(psycopg2 and DSN,
+                     'needs psycopg2 and SPATIALDATALIBRARY_TEST_DSN')
+class PostGISDifferentialTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.connection = psycopg2.connect(DSN)
+        generator = random.Random(5)
+        cls.geometries = [random_wkt(generator) for _ in range(GEOMETRIES)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.connection.close()
+
+    def setUp(self):
+        self.cursor = self.connection.cursor()
+
+    def tearDown(self):
+        self.cursor.close()
+        self.connection.rollback()
+
+    def test_intersects(self):
+        pairs = [(a, b) for n, a in enumerate(self.geometries)
+                 for b in self.geometries[n:]]
+        self.cursor.execute('''
+            SELECT ST_Intersects(ST_GeomFromText(a), ST_GeomFromText(b))
+            FROM unnest(%s, %s) WITH ORDINALITY AS pairs(a, b, n)
+            ORDER BY n''', ([a for a, _ in pairs], [b for _, b in pairs]))
+        expected = [row[0] for row in self.cursor.fetchall()]
+        differences = ['{} / {}: PostGIS {}'.format(a, b, postgis)
+                       for (a, b), postgis in zip(pairs, expected)
+                       if wkt_intersects(a, b) != postgis]
+        self.assertEqual(differences, [])
+
+    def test_ewkb(self):
+        for wkt in self.geometries:
+            self.cursor.execute('''
+                SELECT ST_AsEWKB(g), ST_AsText(g),
+                    ST_XMin(g), ST_YMin(g), ST_XMax(g), ST_YMax(g)
+                FROM (SELECT ST_GeomFromText(%s, 27700) AS g) AS geometry''',
+                (wkt,))
+            ewkb, text, xmin, ymin, xmax, ymax = self.cursor.fetchone()
+            geometry = Geometry(bytes(ewkb))
+            self.assertEqual(geometry.srid, 27700)
+            self.assertEqual(geometry.wkt(), text)
+            self.assertEqual(geometry.bbox, (xmin, ymin, xmax, ymax))
+            self.assertEqual(parse_ewkb(geometry.ewkb)[1],
+                             parse_ewkb(geometry.wkb())[1])
+
+
+@unittest.skipUnless(psycopg2 and DSN,
+                     'needs psycopg2 and SPATIALDATALIBRARY_TEST_DSN')
+class PostGISKeywordTest(unittest.TestCase):
+    """
+    Tables are only created as temporary ones, so nothing is left behind.
+    """
+    def setUp(self):
+        self.library = SpatialDataLibrary()
+        self.library.connect_to_database_using_custom_params('psycopg2',
+                                                             repr(DSN))
+
+    def tearDown(self):
+        self.library.disconnect_from_database()
+
+    def test_statements_given_are_explained_not_run_again(self):
+        self.library.execute_sql_string('CREATE TEMP SEQUENCE runs')
+        self.library.set_sql_instrumentation(explain_threshold=0)
+        self.library.query("SELECT nextval('runs')")
+        self.library.set_sql_instrumentation(False)
+        self.assertEqual(self.library.query("SELECT nextval('runs')"),
+                         [(2,)])
+        record, = [r for r in self.library._statement_log.records
+                   if r['statement'] == "SELECT nextval('runs')"]
+        plan = record['plan']
+        self.assertFalse(plan.startswith('EXPLAIN failed'), plan)
+
+    def test_srid_of_staged_query(self):
+        # Find_SRID fails for temporary tables, which must not leave the
+        # transaction aborted for the lookup from the rows that follows
+        staged = self.library.stage_query(
+            "SELECT 1 AS id, ST_GeomFromText('POINT(1 1)', 27700) AS geom",
+            geometry_column='geom')
+        self.assertEqual(self.library.get_table_SRID(
+            staged, geometry_column='geom'), 27700)
+        self.library.should_intersect_table('POINT(1 1)', staged,
+                                            geometry_column='geom')
+        self.assertEqual(self.library._dbconnection.get_transaction_status(),
+                         psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def test_get_geometry_ends_transaction(self):
+        geometry = self.library.get_geometry(
+            "SELECT ST_GeomFromText('POINT(1 2)', 27700)")
+        self.assertEqual(geometry.wkt(), 'POINT(1 2)')
+        self.assertEqual(self.library._dbconnection.get_transaction_status(),
+                         psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def test_coverage_uses_target_index(self):
+        for statement in (
+                'CREATE TEMP TABLE parcels (id int, '
+                'geom geometry(Polygon, 27700))',
+                'INSERT INTO parcels SELECT n, '
+                'ST_MakeEnvelope(n, 0, n + 1, 1, 27700) '
+                'FROM generate_series(0, 999) AS n',
+                'CREATE INDEX parcels_geom ON parcels USING GIST (geom)',
+                # Without an SRID, so given that of the parcels
+                'CREATE TEMP TABLE points (id int, geom geometry(Point))',
+                'INSERT INTO points SELECT n, ST_MakePoint(n + 0.5, 0.5) '
+                'FROM generate_series(0, 99) AS n',
+                'ANALYZE parcels',
+                'ANALYZE points',
+                'SET enable_seqscan = off'):
+            self.library.execute_sql_string(statement)
+        self.library.set_sql_instrumentation(explain_threshold=0)
+        self.library.every_feature_should_intersect(
+            'points', 'parcels', schema='pg_temp', geometry_column='geom',
+            target_geometry_column='geom', key_column='id')
+        plans = [record['plan'] for record in
+                 self.library._statement_log.records if record['plan']]
+        self.assertTrue(any('Index Cond' in plan and 'parcels_geom' in plan
+                            for plan in plans), plans)
+
+
+if __name__ == '__main__':
+    unittest.main()
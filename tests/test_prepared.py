@@ -0,0 +1,73 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import unittest
+
+from SpatialDataLibrary.prepared import PreparedStatements
+
+
+class PreparedStatementsTest(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        statements = PreparedStatements(10)
+        name, new, evicted = statements.lookup('SELECT 1')
+        self.assertTrue(new)
+        self.assertEqual(evicted, [])
+        self.assertEqual(statements.lookup('SELECT 1'), (name, False, []))
+        self.assertNotEqual(statements.lookup('SELECT 2')[0], name)
+        self.assertEqual(statements.statistics(),
+                         {'prepared': 2, 'limit': 10, 'hits': 1,
+                          'misses': 2, 'evictions': 0})
+
+    def test_least_recently_used_evicted(self):
+        statements = PreparedStatements(2)
+        first = statements.lookup('a')[0]
+        second = statements.lookup('b')[0]
+        statements.lookup('a')
+        name, new, evicted = statements.lookup('c')
+        self.assertTrue(new)
+        self.assertEqual(evicted, [second])
+        self.assertFalse(statements.lookup('a')[1])
+        self.assertTrue(statements.lookup('b')[1])
+        self.assertEqual(statements.statistics()['evictions'], 2)
+        self.assertNotIn(first, (second, name))
+
+    def test_names_not_reused(self):
+        statements = PreparedStatements(1)
+        names = set(statements.lookup(s)[0] for s in ('a', 'b', 'a'))
+        self.assertEqual(len(names), 3)
+
+    def test_forget(self):
+        statements = PreparedStatements(10)
+        statements.lookup('a')
+        statements.forget('a')
+        statements.forget('missing')
+        self.assertTrue(statements.lookup('a')[1])
+
+    def test_clear_and_reset(self):
+        statements = PreparedStatements(10)
+        statements.lookup('a')
+        statements.lookup('a')
+        statements.clear()
+        self.assertEqual(statements.statistics()['prepared'], 0)
+        self.assertEqual(statements.statistics()['hits'], 1)
+        statements.reset()
+        self.assertEqual(statements.statistics(),
+                         {'prepared': 0, 'limit': 10, 'hits': 0,
+                          'misses': 0, 'evictions': 0})
+
+    def test_limit_from_robot(self):
+        self.assertEqual(PreparedStatements('5').limit, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,258 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Runs the keywords against a SpatiaLite database.
+
+Skipped unless SQLite can load the mod_spatialite extension.
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from SpatialDataLibrary import SpatialDataLibrary
+
+EXTENSION = 'mod_spatialite'
+
+# Two parcels side by side with a building in each, a strip along their
+# southern edge that is a sliver, and a copy of the buildings that isn't
+# registered as a spatial table
+DATA = '''
+    SELECT InitSpatialMetadata(1);
+
+    CREATE TABLE parcels (id INTEGER PRIMARY KEY, name TEXT);
+    SELECT AddGeometryColumn('parcels', 'geom', 27700, 'POLYGON', 'XY');
+    SELECT CreateSpatialIndex('parcels', 'geom');
+    INSERT INTO parcels VALUES (1, 'west', GeomFromText(
+        'POLYGON((0 0, 10 0, 10 10, 0 10, 0 0))', 27700));
+    INSERT INTO parcels VALUES (2, 'east', GeomFromText(
+        'POLYGON((10 0, 20 0, 20 10, 10 10, 10 0))', 27700));
+
+    CREATE TABLE buildings (id INTEGER PRIMARY KEY);
+    SELECT AddGeometryColumn('buildings', 'geom', 27700, 'POLYGON', 'XY');
+    SELECT CreateSpatialIndex('buildings', 'geom');
+    INSERT INTO buildings VALUES (1, GeomFromText(
+        'POLYGON((2 2, 4 2, 4 4, 2 4, 2 2))', 27700));
+    INSERT INTO buildings VALUES (2, GeomFromText(
+        'POLYGON((12 2, 14 2, 14 4, 12 4, 12 2))', 27700));
+
+    CREATE TABLE strips (id INTEGER PRIMARY KEY);
+    SELECT AddGeometryColumn('strips', 'geom', 27700, 'POLYGON', 'XY');
+    INSERT INTO strips VALUES (1, GeomFromText(
+        'POLYGON((0 0, 20 0, 20 0.01, 0 0.01, 0 0))', 27700));
+
+    CREATE TABLE loose AS SELECT id, geom FROM buildings;
+'''
+
+
+def _spatialite_available():
+    connection = sqlite3.connect(':memory:')
+    try:
+        connection.enable_load_extension(True)
+        connection.load_extension(EXTENSION)
+        return True
+    except (AttributeError, sqlite3.Error):
+        # Python built without extension loading, or no SpatiaLite
+        return False
+    finally:
+        connection.close()
+
+
+@unittest.skipUnless(_spatialite_available(),
+                     'needs the {} SQLite extension'.format(EXTENSION))
+class SpatiaLiteTestCase(unittest.TestCase):
+    """
+    Connects a library to a new SpatiaLite file holding DATA.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.sqlite')
+        connection = sqlite3.connect(self.path)
+        connection.enable_load_extension(True)
+        connection.load_extension(EXTENSION)
+        connection.executescript(DATA)
+        connection.close()
+        self.library = SpatialDataLibrary()
+        self.library.connect_to_spatial_file(self.path, EXTENSION)
+
+    def tearDown(self):
+        self.library.disconnect_from_database()
+        shutil.rmtree(self.directory)
+
+
+class MetadataTest(SpatiaLiteTestCase):
+
+    def test_geometry_column(self):
+        self.assertEqual(self.library.get_geometry_column('parcels'), 'geom')
+        self.assertEqual(self.library.get_geometry_column('missing'),
+                         'wkb_geometry')
+
+    def test_table_srid(self):
+        self.assertEqual(self.library.get_table_SRID(
+            'parcels', geometry_column='geom'), 27700)
+
+    def test_srid_of_unregistered_table(self):
+        # Not in geometry_columns, so found from the rows
+        self.assertEqual(self.library.get_table_SRID(
+            'loose', geometry_column='geom'), 27700)
+        self.library.should_intersect_table('POINT(3 3)', 'loose',
+                                            geometry_column='geom')
+
+    def test_prefetch(self):
+        self.library.prefetch_spatial_metadata()
+        self.assertEqual(self.library.get_geometry_column('buildings'),
+                         'geom')
+
+
+class ExtentTest(SpatiaLiteTestCase):
+
+    def test_table_extent(self):
+        self.library.table_extent_should_equal('parcels', '0,0,20,10')
+        self.assertRaises(AssertionError,
+                          self.library.table_extent_should_equal, 'parcels',
+                          '0,0,20,11')
+
+    def test_query_extent(self):
+        self.library.data_extent_should_equal(
+            'SELECT geom FROM buildings', '2,2,14,4', geometry_column='geom')
+
+
+class SliverTest(SpatiaLiteTestCase):
+
+    def test_no_slivers(self):
+        self.library.table_contains_no_slivers('parcels')
+
+    def test_slivers(self):
+        self.assertRaises(AssertionError,
+                          self.library.table_contains_no_slivers, 'strips')
+        self.library.table_contains_no_slivers('strips', factor=0.001)
+
+
+class IntersectTest(SpatiaLiteTestCase):
+
+    def test_should_intersect_table(self):
+        self.library.should_intersect_table('POINT(5 5)', 'parcels')
+        # On the shared edge
+        self.library.should_intersect_table('POINT(10 5)', 'parcels')
+        self.assertRaises(AssertionError, self.library.should_intersect_table,
+                          'POINT(50 50)', 'parcels')
+
+    def test_should_intersect_query(self):
+        self.library.should_intersect_query(
+            'POINT(3 3)', 'SELECT * FROM buildings', geometry_column='geom')
+        self.assertRaises(AssertionError, self.library.should_intersect_query,
+                          'POINT(5 5)', 'SELECT * FROM buildings',
+                          geometry_column='geom')
+
+    def test_should_not_intersect_table(self):
+        self.library.should_not_intersect_table('POINT(8 8)', 'buildings')
+        self.assertRaises(AssertionError,
+                          self.library.should_not_intersect_table,
+                          'LINESTRING(0 3, 20 3)', 'buildings')
+
+    def test_should_intersect_whole_table(self):
+        self.library.should_intersect_whole_table(
+            'POLYGON((0 0, 20 0, 20 10, 0 10, 0 0))', 'buildings')
+        self.assertRaises(AssertionError,
+                          self.library.should_intersect_whole_table,
+                          'POLYGON((0 0, 10 0, 10 10, 0 10, 0 0))',
+                          'buildings')
+
+
+class FeatureTest(SpatiaLiteTestCase):
+
+    def test_every_feature_should_intersect(self):
+        self.library.every_feature_should_intersect('buildings', 'parcels')
+        self.assertRaises(AssertionError,
+                          self.library.every_feature_should_intersect,
+                          'strips', 'buildings', key_column='id')
+
+    def test_source_without_srid(self):
+        # Given the SRID of the parcels
+        self.library.every_feature_should_be_within(
+            'SELECT id, SetSRID(geom, 0) AS geom FROM buildings', 'parcels',
+            geometry_column='geom', key_column='id')
+
+    def test_no_feature_should_intersect(self):
+        self.library.no_feature_should_intersect('buildings', 'strips')
+        self.assertRaises(AssertionError,
+                          self.library.no_feature_should_intersect,
+                          'parcels', 'strips')
+
+    def test_every_feature_should_be_within(self):
+        self.library.every_feature_should_be_within('buildings', 'parcels')
+        self.assertRaises(AssertionError,
+                          self.library.every_feature_should_be_within,
+                          'strips', 'parcels')
+
+
+class GeometryTest(SpatiaLiteTestCase):
+
+    def test_get_geometry(self):
+        geometry = self.library.get_geometry(
+            'SELECT geom FROM buildings WHERE id = 1')
+        self.assertEqual(geometry.srid, 27700)
+        self.assertEqual(geometry.wkt(), 'POLYGON((2 2,4 2,4 4,2 4,2 2))')
+
+
+class SchemaTest(SpatiaLiteTestCase):
+
+    def test_sweep(self):
+        with self.assertRaises(AssertionError) as raised:
+            self.library.schema_should_pass_spatial_checks(workers=2)
+        self.assertIn('strips slivers', str(raised.exception))
+        self.assertNotIn('parcels', str(raised.exception))
+
+    def test_failed_worker_connection(self):
+        worker, = self.library._get_workers(1)
+        worker._dbconnection.close()
+        with self.assertRaises(AssertionError) as raised:
+            self.library.schema_should_pass_spatial_checks(workers=1)
+        # The table being checked, then those left
+        for table in ('buildings', 'parcels', 'strips'):
+            self.assertIn(table, str(raised.exception))
+        self.assertIn('not checked', str(raised.exception))
+        self.assertNotIn(worker, self.library._workers)
+
+
+class WorkerTest(SpatiaLiteTestCase):
+
+    def setUp(self):
+        SpatiaLiteTestCase.setUp(self)
+        self.library.disconnect_from_database()
+        self.library = SpatialDataLibrary(sample_size=7,
+                                          geometry_cache_size=100,
+                                          statement_cache_size=3)
+        self.library.connect_to_spatial_file(self.path, EXTENSION)
+
+    def test_import_arguments(self):
+        worker, = self.library._get_workers(1)
+        self.assertEqual(worker._sample_size, 7)
+        self.assertEqual(worker._geometry_cache.max_size, 100)
+        self.assertEqual(worker._statements.limit, 3)
+        self.assertIs(worker._statement_log, self.library._statement_log)
+
+    def test_sampling_set_after_opening(self):
+        self.library._get_workers(1)
+        self.library.set_sampling(10, seed=1)
+        worker, = self.library._get_workers(1)
+        self.assertEqual(worker._sampling, self.library._sampling)
+        self.library.set_sampling()
+        worker, = self.library._get_workers(1)
+        self.assertIsNone(worker._sampling)
+
+
+if __name__ == '__main__':
+    unittest.main()
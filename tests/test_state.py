@@ -0,0 +1,76 @@
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from SpatialDataLibrary.state import ValidationState
+
+
+class ValidationStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'state.db')
+        self.state = ValidationState(self.path)
+
+    def tearDown(self):
+        self.state.close()
+        shutil.rmtree(self.directory)
+
+    def test_watermark(self):
+        self.assertEqual(self.state.watermark('public.a', 'slivers'), None)
+        self.state.set_watermark('public.a', 'slivers', '42')
+        self.assertEqual(self.state.watermark('public.a', 'slivers'),
+                         ('42', None))
+        self.assertEqual(self.state.watermark('public.a', 'extent'), None)
+
+    def test_watermark_extent(self):
+        self.state.set_watermark('public.a', 'extent', '7',
+                                 (0, -1.5, 100000.25, 2))
+        self.assertEqual(self.state.watermark('public.a', 'extent'),
+                         ('7', (0, -1.5, 100000.25, 2)))
+
+    def test_chunk_hashes_replaced(self):
+        self.state.set_chunk_hashes('public.a', 'slivers', {0: 'x', 1: 'y'})
+        self.state.set_chunk_hashes('public.a', 'slivers', {1: 'z'})
+        self.assertEqual(self.state.chunk_hashes('public.a', 'slivers'),
+                         {1: 'z'})
+        self.assertEqual(self.state.chunk_hashes('public.b', 'slivers'), {})
+
+    def test_kept_between_runs(self):
+        self.state.set_watermark('public.a', 'slivers', '42')
+        self.state.set_chunk_hashes('public.a', 'slivers', {3: 'x'})
+        self.state.close()
+        self.state = ValidationState(self.path)
+        self.assertEqual(self.state.watermark('public.a', 'slivers'),
+                         ('42', None))
+        self.assertEqual(self.state.chunk_hashes('public.a', 'slivers'),
+                         {3: 'x'})
+
+    def test_forget(self):
+        for source in ('public.a', 'public.b'):
+            self.state.set_watermark(source, 'slivers', '1')
+            self.state.set_chunk_hashes(source, 'slivers', {0: 'x'})
+        self.state.forget('public.a')
+        self.assertEqual(self.state.watermark('public.a', 'slivers'), None)
+        self.assertEqual(self.state.chunk_hashes('public.a', 'slivers'), {})
+        self.assertEqual(self.state.watermark('public.b', 'slivers'),
+                         ('1', None))
+        self.state.forget()
+        self.assertEqual(self.state.watermark('public.b', 'slivers'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()